@@ -0,0 +1,223 @@
+"""
+Контроль допуска запросов к API.
+
+- Token bucket на IP и на telegram_id (из пути /api/users/{telegram_id}/...):
+  при превышении — 429 с Retry-After. Записи стоят WRITE_COST токенов.
+- Ограничение одновременных запросов к базе: не больше ёмкости пула
+  (DB_POOL_SIZE + DB_MAX_OVERFLOW) на процесс, поэтому запросы ждут не пул,
+  а очередь допуска. Если место не освободилось за ADMISSION_MAX_WAIT_MS
+  или очередь длиннее ADMISSION_MAX_QUEUE — быстрый 503 с Retry-After.
+- Полосы: /health, /metrics и статика не ограничиваются вовсе; тяжёлые
+  чтения (колода, списки слов, медиа, поиск, квиз) занимают не больше ёмкости минус
+  резерв, поэтому профиль и learn-words не голодают.
+
+Лимиты действуют в пределах процесса; скорость делится на WEB_CONCURRENCY
+(число воркеров run_production.py). ADMISSION_ENABLED=0 отключает контроль
+целиком (бенчмарки шлют всё с одного адреса 127.0.0.1). Настройки читаются
+при сборке middleware (в том числе из .env), а не при импорте модуля.
+"""
+import asyncio
+import math
+import re
+import time
+from collections import OrderedDict, deque
+from typing import Optional, Tuple
+
+from env import getenv
+from metrics import registry, Counter
+
+WRITE_COST = 2.0
+MAX_BUCKETS = 100000
+OVERLOAD_RETRY_AFTER = 1
+
+LANE_LIGHT, LANE_BULK, LANE_DEFAULT = "light", "bulk", "default"
+LIGHT_PATHS = re.compile(r"^/(health|metrics|check-static)?$|^/static/")
+BULK_PATHS = re.compile(
+    r"^/api/(words(/page|/changes|/search|/random/.*|/by-ids|/\d+/(image|sound))?"
+    r"|exercises.*|users/-?\d+/(deck|quiz))$"
+)
+USER_PATH = re.compile(r"^/api/users/(-?\d+)")
+WRITE_METHODS = {"POST", "PUT", "PATCH", "DELETE"}
+
+rejected_requests = registry.register(Counter(
+    "http_requests_rejected_total", "Отклонённые контролем допуска запросы", ("reason", "lane")))
+
+
+def default_capacity() -> int:
+    """Ёмкость пула процесса; по умолчанию как у QueuePool SQLAlchemy (5 + 10)"""
+    if getenv("ADMISSION_MAX_CONCURRENCY"):
+        return int(getenv("ADMISSION_MAX_CONCURRENCY"))
+    return int(getenv("DB_POOL_SIZE", "5")) + int(getenv("DB_MAX_OVERFLOW", "10"))
+
+
+def rate_limit(name: str, default: str) -> float:
+    """Лимит на весь сервис, делённый между воркерами (WEB_CONCURRENCY)"""
+    return float(getenv(name, default)) / max(1, int(getenv("WEB_CONCURRENCY", "1")))
+
+
+class TokenBucket:
+    __slots__ = ("rate", "burst", "tokens", "updated")
+
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+
+    def take(self, cost: float = 1.0) -> float:
+        """0, если токены есть; иначе сколько секунд ждать"""
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= cost:
+            self.tokens -= cost
+            return 0.0
+        return (cost - self.tokens) / self.rate
+
+
+class RateLimiter:
+    """Корзины по ключу; самые давние вытесняются при превышении max_keys"""
+
+    def __init__(self, rate: float, burst: float, max_keys: int = MAX_BUCKETS):
+        self.rate = rate
+        self.burst = max(burst, WRITE_COST)
+        self.max_keys = max_keys
+        self.buckets: "OrderedDict[object, TokenBucket]" = OrderedDict()
+
+    def take(self, key, cost: float = 1.0) -> float:
+        bucket = self.buckets.get(key)
+        if bucket is None:
+            bucket = self.buckets[key] = TokenBucket(self.rate, self.burst)
+            if len(self.buckets) > self.max_keys:
+                self.buckets.popitem(last=False)
+        else:
+            self.buckets.move_to_end(key)
+        return bucket.take(cost)
+
+
+class ConcurrencyLimiter:
+    """Слоты ёмкости пула; полоса bulk может занять не больше capacity - reserve.
+
+    Ожидающие будятся в порядке очереди; кто не дождался за max_wait — получает отказ.
+    """
+
+    def __init__(self, capacity: int, reserve: Optional[int] = None, max_queue: int = 100):
+        self.capacity = max(1, capacity)
+        self.max_queue = max_queue
+        self.limits = {
+            LANE_DEFAULT: self.capacity,
+            LANE_BULK: max(1, self.capacity - (reserve if reserve is not None else max(1, self.capacity // 4))),
+        }
+        self.active = {LANE_DEFAULT: 0, LANE_BULK: 0}
+        self.waiters: deque = deque()
+
+    def _can_enter(self, lane: str) -> bool:
+        total = self.active[LANE_DEFAULT] + self.active[LANE_BULK]
+        if total >= self.capacity:
+            return False
+        return lane == LANE_DEFAULT or self.active[LANE_BULK] < self.limits[LANE_BULK]
+
+    async def acquire(self, lane: str, max_wait: float) -> bool:
+        if not self.waiters and self._can_enter(lane):
+            self.active[lane] += 1
+            return True
+        if len(self.waiters) >= self.max_queue:
+            return False
+
+        future = asyncio.get_running_loop().create_future()
+        waiter = (lane, future)
+        self.waiters.append(waiter)
+        try:
+            await asyncio.wait_for(asyncio.shield(future), max_wait)
+            return True
+        except asyncio.TimeoutError:
+            if future.done() and not future.cancelled():
+                return True  # слот выдан одновременно с таймаутом
+            future.cancel()
+            return False
+        finally:
+            if waiter in self.waiters:
+                self.waiters.remove(waiter)
+
+    def release(self, lane: str):
+        self.active[lane] -= 1
+        self._wake()
+
+    def _wake(self):
+        for waiter in list(self.waiters):
+            lane, future = waiter
+            if future.done():
+                self.waiters.remove(waiter)
+                continue
+            if self._can_enter(lane):
+                self.active[lane] += 1
+                future.set_result(None)
+                self.waiters.remove(waiter)
+
+
+def classify(path: str) -> str:
+    if LIGHT_PATHS.match(path):
+        return LANE_LIGHT
+    if BULK_PATHS.match(path):
+        return LANE_BULK
+    return LANE_DEFAULT
+
+
+def client_keys(scope) -> Tuple[Optional[str], Optional[int]]:
+    client = scope.get("client")
+    match = USER_PATH.match(scope["path"])
+    return (client[0] if client else None), (int(match.group(1)) if match else None)
+
+
+class AdmissionMiddleware:
+    """ASGI middleware: rate limit, ограничение конкуренции и полосы приоритета"""
+
+    def __init__(self, app, capacity: Optional[int] = None):
+        self.app = app
+        self.enabled = getenv("ADMISSION_ENABLED", "1") != "0"
+        self.ip_limiter = RateLimiter(rate_limit("RATE_LIMIT_IP_RPS", "50"), rate_limit("RATE_LIMIT_IP_BURST", "100"))
+        self.user_limiter = RateLimiter(rate_limit("RATE_LIMIT_USER_RPS", "10"),
+                                        rate_limit("RATE_LIMIT_USER_BURST", "30"))
+        self.max_wait = float(getenv("ADMISSION_MAX_WAIT_MS", "200")) / 1000
+        self.concurrency = ConcurrencyLimiter(capacity or default_capacity(),
+                                              max_queue=int(getenv("ADMISSION_MAX_QUEUE", "100")))
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not self.enabled:
+            return await self.app(scope, receive, send)
+
+        lane = classify(scope["path"])
+        if lane == LANE_LIGHT:
+            return await self.app(scope, receive, send)
+
+        cost = WRITE_COST if scope["method"] in WRITE_METHODS else 1.0
+        ip, telegram_id = client_keys(scope)
+        wait = self.ip_limiter.take(ip, cost) if ip else 0.0
+        if not wait and telegram_id is not None:
+            wait = self.user_limiter.take(telegram_id, cost)
+        if wait:
+            rejected_requests.inc("rate_limit", lane)
+            return await self.reject(send, 429, "Too many requests", math.ceil(wait))
+
+        if not await self.concurrency.acquire(lane, self.max_wait):
+            rejected_requests.inc("overload", lane)
+            return await self.reject(send, 503, "Server is busy", OVERLOAD_RETRY_AFTER)
+
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.concurrency.release(lane)
+
+    @staticmethod
+    async def reject(send, status: int, detail: str, retry_after: int):
+        body = ('{"detail":"%s"}' % detail).encode()
+        await send({
+            "type": "http.response.start",
+            "status": status,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(body)).encode()),
+                (b"retry-after", str(max(1, retry_after)).encode()),
+            ],
+        })
+        await send({"type": "http.response.body", "body": body})
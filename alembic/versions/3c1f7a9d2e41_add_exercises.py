@@ -0,0 +1,43 @@
+"""Add exercises
+
+Revision ID: 3c1f7a9d2e41
+Revises: bf22438c2f29
+Create Date: 2026-10-19 10:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3c1f7a9d2e41'
+down_revision: Union[str, Sequence[str], None] = 'bf22438c2f29'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        'exercises',
+        sa.Column('id', sa.Integer(), autoincrement=True, nullable=False),
+        sa.Column('name', sa.String(length=255), nullable=False),
+        sa.Column('gender', sa.String(length=16), nullable=False),
+        sa.Column('muscle_group', sa.String(length=32), nullable=False),
+        sa.Column('gif_url', sa.Text(), nullable=True),
+        sa.Column('description', sa.Text(), nullable=True),
+        sa.Column('url', sa.Text(), nullable=False),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('url', 'gender', 'muscle_group', name='uq_exercises_url_gender_muscle_group'),
+    )
+    op.create_index('ix_exercises_gender_muscle_group', 'exercises', ['gender', 'muscle_group', 'id'])
+    op.create_index('ix_exercises_muscle_group_gender', 'exercises', ['muscle_group', 'gender'])
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_exercises_muscle_group_gender', table_name='exercises')
+    op.drop_index('ix_exercises_gender_muscle_group', table_name='exercises')
+    op.drop_table('exercises')
@@ -0,0 +1,32 @@
+"""Daily tasks: task_key and (telegram_id, date) index
+
+Revision ID: 7a2d5e8b1c93
+Revises: 3c1f7a9d2e41
+Create Date: 2026-10-19 11:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '7a2d5e8b1c93'
+down_revision: Union[str, Sequence[str], None] = '3c1f7a9d2e41'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('tasks', sa.Column('task_key', sa.String(length=32), nullable=True))
+    op.create_index('ix_tasks_telegram_id_date_task_key', 'tasks', ['telegram_id', 'date', 'task_key'], unique=True)
+    op.create_index('ix_users_time_line', 'users', ['time_line'])
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_users_time_line', table_name='users')
+    op.drop_index('ix_tasks_telegram_id_date_task_key', table_name='tasks')
+    op.drop_column('tasks', 'task_key')
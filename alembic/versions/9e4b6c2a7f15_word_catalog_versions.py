@@ -0,0 +1,54 @@
+"""Word catalog versions and tombstones
+
+Revision ID: 9e4b6c2a7f15
+Revises: 7a2d5e8b1c93
+Create Date: 2026-10-19 12:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '9e4b6c2a7f15'
+down_revision: Union[str, Sequence[str], None] = '7a2d5e8b1c93'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('eng_words', sa.Column('version', sa.BigInteger(), server_default='0', nullable=False))
+    op.add_column('eng_words', sa.Column('updated_at', sa.DateTime(), server_default=sa.func.now(), nullable=True))
+    op.create_index('ix_eng_words_version', 'eng_words', ['version'])
+
+    op.create_table(
+        'catalog_versions',
+        sa.Column('name', sa.String(length=32), nullable=False),
+        sa.Column('version', sa.BigInteger(), nullable=False),
+        sa.PrimaryKeyConstraint('name'),
+    )
+    # Существующие слова попадают в версию 1
+    op.execute("INSERT INTO catalog_versions (name, version) VALUES ('eng_words', 1)")
+    op.execute("UPDATE eng_words SET version = 1")
+
+    op.create_table(
+        'eng_word_tombstones',
+        sa.Column('word_id', sa.Integer(), nullable=False),
+        sa.Column('version', sa.BigInteger(), nullable=False),
+        sa.Column('deleted_at', sa.DateTime(), server_default=sa.func.now(), nullable=True),
+        sa.PrimaryKeyConstraint('word_id'),
+    )
+    op.create_index('ix_eng_word_tombstones_version', 'eng_word_tombstones', ['version'])
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_eng_word_tombstones_version', table_name='eng_word_tombstones')
+    op.drop_table('eng_word_tombstones')
+    op.drop_table('catalog_versions')
+    op.drop_index('ix_eng_words_version', table_name='eng_words')
+    op.drop_column('eng_words', 'updated_at')
+    op.drop_column('eng_words', 'version')
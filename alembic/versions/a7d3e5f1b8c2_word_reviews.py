@@ -0,0 +1,64 @@
+"""Spaced repetition review queue
+
+Revision ID: a7d3e5f1b8c2
+Revises: f4c1a8d2e6b9
+Create Date: 2026-10-19 18:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a7d3e5f1b8c2'
+down_revision: Union[str, Sequence[str], None] = 'f4c1a8d2e6b9'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Уже изученные слова ставятся в очередь сразу
+BACKFILL = {
+    'postgresql': """
+        INSERT INTO word_reviews (telegram_id, word_id, repetitions, interval_days, ease, lapses, due_at)
+        SELECT u.telegram_id, w.value::integer, 0, 0, 2.5, 0, timezone('utc', now())
+        FROM users u, json_array_elements_text(u.eng_learned_words) AS w
+        WHERE json_typeof(u.eng_learned_words) = 'array'
+        ON CONFLICT DO NOTHING
+    """,
+    'sqlite': """
+        INSERT INTO word_reviews (telegram_id, word_id, repetitions, interval_days, ease, lapses, due_at)
+        SELECT u.telegram_id, CAST(w.value AS INTEGER), 0, 0, 2.5, 0, datetime('now')
+        FROM users u, json_each(u.eng_learned_words) AS w
+        WHERE json_type(u.eng_learned_words) = 'array'
+        ON CONFLICT DO NOTHING
+    """,
+}
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        'word_reviews',
+        sa.Column('telegram_id', sa.BigInteger(), nullable=False),
+        sa.Column('word_id', sa.Integer(), nullable=False),
+        sa.Column('repetitions', sa.Integer(), nullable=False),
+        sa.Column('interval_days', sa.Integer(), nullable=False),
+        sa.Column('ease', sa.Float(), nullable=False),
+        sa.Column('lapses', sa.Integer(), nullable=False),
+        sa.Column('due_at', sa.DateTime(), nullable=False),
+        sa.Column('last_reviewed_at', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['telegram_id'], ['users.telegram_id']),
+        sa.PrimaryKeyConstraint('telegram_id', 'word_id'),
+    )
+    op.create_index('ix_word_reviews_telegram_id_due_at', 'word_reviews', ['telegram_id', 'due_at'])
+
+    backfill = BACKFILL.get(op.get_bind().dialect.name)
+    if backfill:
+        op.execute(backfill)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_word_reviews_telegram_id_due_at', table_name='word_reviews')
+    op.drop_table('word_reviews')
@@ -0,0 +1,27 @@
+"""Index users.exp for the leaderboard
+
+Revision ID: b5f3d1e9a2c7
+Revises: 9e4b6c2a7f15
+Create Date: 2026-10-19 13:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b5f3d1e9a2c7'
+down_revision: Union[str, Sequence[str], None] = '9e4b6c2a7f15'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_index('ix_users_exp', 'users', ['exp'])
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_users_exp', table_name='users')
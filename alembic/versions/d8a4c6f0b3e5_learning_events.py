@@ -0,0 +1,53 @@
+"""Learning event log and daily stats rollup
+
+Revision ID: d8a4c6f0b3e5
+Revises: b5f3d1e9a2c7
+Create Date: 2026-10-19 15:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd8a4c6f0b3e5'
+down_revision: Union[str, Sequence[str], None] = 'b5f3d1e9a2c7'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        'learning_events',
+        sa.Column('id', sa.BigInteger().with_variant(sa.Integer(), 'sqlite'), autoincrement=True, nullable=False),
+        sa.Column('telegram_id', sa.BigInteger(), nullable=False),
+        sa.Column('word_id', sa.Integer(), nullable=False),
+        sa.Column('event_type', sa.String(length=16), nullable=False),
+        sa.Column('exp', sa.Integer(), nullable=False),
+        sa.Column('local_date', sa.Date(), nullable=False),
+        sa.Column('created_at', sa.DateTime(), server_default=sa.func.now(), nullable=True),
+        sa.ForeignKeyConstraint(['telegram_id'], ['users.telegram_id']),
+        sa.PrimaryKeyConstraint('id'),
+    )
+    op.create_index('ix_learning_events_telegram_id_local_date', 'learning_events', ['telegram_id', 'local_date'])
+
+    op.create_table(
+        'user_daily_stats',
+        sa.Column('telegram_id', sa.BigInteger(), nullable=False),
+        sa.Column('local_date', sa.Date(), nullable=False),
+        sa.Column('words_learned', sa.Integer(), nullable=False),
+        sa.Column('exp_gained', sa.Integer(), nullable=False),
+        sa.Column('trainings', sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(['telegram_id'], ['users.telegram_id']),
+        sa.PrimaryKeyConstraint('telegram_id', 'local_date'),
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('user_daily_stats')
+    op.drop_index('ix_learning_events_telegram_id_local_date', table_name='learning_events')
+    op.drop_table('learning_events')
@@ -0,0 +1,37 @@
+"""Trigram indexes for word search
+
+Revision ID: f4c1a8d2e6b9
+Revises: e2b7f9a1c4d6
+Create Date: 2026-10-19 17:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f4c1a8d2e6b9'
+down_revision: Union[str, Sequence[str], None] = 'e2b7f9a1c4d6'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+    op.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    op.create_index('ix_eng_words_eng_trgm', 'eng_words', [sa.text('lower(eng) gin_trgm_ops')],
+                    postgresql_using='gin')
+    op.create_index('ix_eng_words_rus_trgm', 'eng_words', [sa.text('lower(rus) gin_trgm_ops')],
+                    postgresql_using='gin')
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+    op.drop_index('ix_eng_words_rus_trgm', table_name='eng_words')
+    op.drop_index('ix_eng_words_eng_trgm', table_name='eng_words')
@@ -0,0 +1,152 @@
+"""
+Бенчмарк и проверка users_backup.py: экспорт прерывается (SIGKILL после первой
+готовой части), продолжается с --resume, затем выгрузка восстанавливается в
+пустую базу и сверяется с исходной построчно (хэш всех колонок).
+
+Пример:
+    python benchmarks/bench_backup.py --users 300000
+"""
+import argparse
+import asyncio
+import glob
+import hashlib
+import json
+import os
+import signal
+import subprocess
+import sys
+import tempfile
+import time
+
+from common import setup_path, save_results, ROOT
+
+setup_path()
+
+TMP = tempfile.gettempdir()
+DEFAULT_DB_URL = "sqlite+aiosqlite:///" + os.path.join(TMP, "vloya_bench_backup.db")
+DEFAULT_RESTORE_URL = "sqlite+aiosqlite:///" + os.path.join(TMP, "vloya_bench_backup_restore.db")
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Экспорт с прерыванием, продолжение и восстановление users")
+    parser.add_argument("--db-url", default=os.getenv("BENCH_DATABASE_URL", DEFAULT_DB_URL))
+    parser.add_argument("--restore-db-url", default=os.getenv("BENCH_RESTORE_DATABASE_URL", DEFAULT_RESTORE_URL))
+    parser.add_argument("--users", type=int, default=200000)
+    parser.add_argument("--part-rows", type=int, default=20000)
+    parser.add_argument("--chunk-size", type=int, default=5000)
+    parser.add_argument("--output")
+    return parser.parse_args()
+
+
+async def create_schema(db_url: str, users: int = 0):
+    from datetime import date
+    from sqlalchemy import insert
+    from sqlalchemy.ext.asyncio import create_async_engine
+
+    from models import Base, User
+
+    engine = create_async_engine(db_url)
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.drop_all)
+        await conn.run_sync(Base.metadata.create_all)
+        for start in range(1, users + 1, 5000):
+            await conn.execute(insert(User), [
+                {"telegram_id": i, "first_name": f"user{i}", "username": f"u{i}" if i % 3 else None,
+                 "exp": i % 1000, "time_line": "UTC+3:00", "words_per_day": 10,
+                 "eng_learned_words": list(range(i % 60)), "eng_skipped_words": [i % 7],
+                 "last_learning_date": date(2026, 1, 1 + i % 28) if i % 2 else None,
+                 "current_streak": i % 30, "version": 1 + i % 5}
+                for i in range(start, min(start + 5000, users + 1))
+            ])
+    await engine.dispose()
+
+
+async def table_digest(db_url: str):
+    """Число строк и хэш всех колонок users в порядке telegram_id"""
+    from sqlalchemy import select
+    from sqlalchemy.ext.asyncio import create_async_engine
+
+    from models import User
+
+    engine = create_async_engine(db_url)
+    digest, rows = hashlib.sha256(), 0
+    async with engine.connect() as conn:
+        result = await conn.stream(select(*User.__table__.columns).order_by(User.telegram_id))
+        async for partition in result.partitions(5000):
+            for row in partition:
+                digest.update(json.dumps(list(row), default=str).encode())
+                rows += 1
+    await engine.dispose()
+    return rows, digest.hexdigest()
+
+
+def backup_command(db_url: str, *args: str):
+    env = dict(os.environ, DATABASE_URL=db_url)
+    return [sys.executable, os.path.join(ROOT, "users_backup.py"), *args], env
+
+
+def interrupted_export(args, path: str) -> float:
+    """Запускает экспорт и убивает его после первой готовой части"""
+    command, env = backup_command(args.db_url, "export", path, "--part-rows", str(args.part_rows),
+                                  "--chunk-size", str(args.chunk_size))
+    started = time.perf_counter()
+    process = subprocess.Popen(command, env=env, stdout=subprocess.DEVNULL)
+    while not glob.glob(path + ".part0001"):
+        if process.poll() is not None:
+            raise SystemExit("❌ Экспорт завершился до прерывания — увеличьте --users или уменьшите --part-rows")
+        time.sleep(0.01)
+    process.send_signal(signal.SIGKILL)
+    process.wait()
+    return time.perf_counter() - started
+
+
+def run(db_url: str, *args: str) -> float:
+    command, env = backup_command(db_url, *args)
+    started = time.perf_counter()
+    subprocess.run(command, env=env, check=True, stdout=subprocess.DEVNULL)
+    return time.perf_counter() - started
+
+
+async def main():
+    args = parse_args()
+    path = os.path.join(TMP, "vloya_bench_backup.ndjson.gz")
+    for stale in glob.glob(path + ".part*"):
+        os.unlink(stale)
+
+    await create_schema(args.db_url, args.users)
+    await create_schema(args.restore_db_url)
+    print(f"🌱 База заполнена: {args.users} пользователей")
+
+    interrupted = interrupted_export(args, path)
+    parts_before = len(glob.glob(path + ".part[0-9][0-9][0-9][0-9]"))
+    print(f"✂️  Экспорт прерван через {interrupted:.1f} с, готовых частей: {parts_before}")
+
+    # Неполный набор частей восстанавливать нельзя
+    command, env = backup_command(args.restore_db_url, "restore", path)
+    if subprocess.run(command, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL).returncode == 0:
+        raise SystemExit("❌ Незавершённый экспорт восстановился")
+
+    resumed = run(args.db_url, "export", path, "--resume", "--part-rows", str(args.part_rows),
+                  "--chunk-size", str(args.chunk_size))
+    parts = len(glob.glob(path + ".part[0-9][0-9][0-9][0-9]"))
+    print(f"▶️  Экспорт продолжен за {resumed:.1f} с, всего частей: {parts}")
+
+    restored = run(args.restore_db_url, "restore", path)
+    print(f"♻️  Восстановление за {restored:.1f} с")
+
+    source, target = await table_digest(args.db_url), await table_digest(args.restore_db_url)
+    if source != target:
+        raise SystemExit(f"❌ Восстановленная таблица отличается: {source} != {target}")
+    print(f"✅ Восстановлено {target[0]} строк, совпадают с исходными")
+
+    results = {"backup": {
+        "export": {"rows": args.users, "seconds": round(interrupted + resumed, 2), "parts": parts},
+        "restore": {"rows": target[0], "seconds": round(restored, 2)},
+    }}
+    output = save_results("backup", results, {"users": args.users, "part_rows": args.part_rows,
+                                               "chunk_size": args.chunk_size}, args.output)
+    print(f"\n💾 Результаты сохранены: {output}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
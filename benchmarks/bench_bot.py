@@ -0,0 +1,320 @@
+"""
+Офлайн-бенчмарк пропускной способности бота (handlers/start.py) без Telegram.
+
+Синтетические Update (/start, произвольный текст, колбэк check_subscription,
+ответ с часовым поясом) прогоняются через диспетчер из dispatcher.py — тот же,
+что в main.py, со всеми middleware (сессия БД, метрики, бюджет запросов). Вместо сети используется FakeSession: она записывает
+исходящие вызовы и умеет добавлять задержку и ответы 429.
+
+Перед замерами проверяется бюджет SQL-запросов главного меню (assert_max_queries
+из query_stats.py): лидерборд — не больше 2 запросов с холодным кэшем, статистика
+пользователя — не больше 1. Регрессия (например, N+1) прерывает прогон.
+
+Примеры:
+    python benchmarks/bench_bot.py --users 5000 --updates 2000
+    python benchmarks/bench_bot.py --api-latency 30 --rate-limit-every 50
+"""
+import argparse
+import asyncio
+import bisect
+import contextvars
+import os
+import random
+import tempfile
+import time
+from collections import Counter
+from datetime import datetime
+
+from common import setup_path, summarize, save_results, print_table, compare_results
+
+setup_path()
+
+DEFAULT_DB_URL = "sqlite+aiosqlite:///" + os.path.join(tempfile.gettempdir(), "vloya_bench_bot.db")
+HISTOGRAM_BUCKETS_MS = [1, 2, 5, 10, 25, 50, 100, 250, 500, 1000]
+BOT_TOKEN = "123456:BENCHMARK"
+QUERY_LIMITS = {"get_leaderboard_text": 2, "get_user_stats_text": 1}
+
+# Счётчик SQL-запросов текущего апдейта
+current_queries: contextvars.ContextVar = contextvars.ContextVar("current_queries", default=None)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Офлайн-бенчмарк бота")
+    parser.add_argument("--db-url", default=os.getenv("BENCH_DATABASE_URL", DEFAULT_DB_URL))
+    parser.add_argument("--users", type=int, default=1000, help="зарегистрированных пользователей в базе")
+    parser.add_argument("--updates", type=int, default=1000, help="апдейтов на сценарий")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--api-latency", type=float, default=0.0, help="задержка вызова Bot API, мс")
+    parser.add_argument("--rate-limit-every", type=int, default=0, help="каждый N-й вызов Bot API отвечает 429")
+    parser.add_argument("--no-seed", action="store_true")
+    parser.add_argument("--output")
+    parser.add_argument("--compare")
+    return parser.parse_args()
+
+
+def make_fake_session(api_latency_ms: float, rate_limit_every: int):
+    from aiogram.client.session.base import BaseSession
+    from aiogram.exceptions import TelegramRetryAfter
+    from aiogram.methods import GetChatMember, SendMessage, EditMessageText
+    from aiogram.types import Chat, ChatMemberMember, Message, User as TgUser
+
+    class FakeSession(BaseSession):
+        """Сессия Bot API без сети: записывает вызовы, имитирует задержку и 429"""
+
+        def __init__(self):
+            super().__init__()
+            self.calls = Counter()
+            self.errors = Counter()
+            self._total = 0
+
+        async def make_request(self, bot, method, timeout=None):
+            name = type(method).__name__
+            self.calls[name] += 1
+            self._total += 1
+
+            if api_latency_ms:
+                await asyncio.sleep(api_latency_ms / 1000)
+
+            if rate_limit_every and self._total % rate_limit_every == 0:
+                self.errors[name] += 1
+                raise TelegramRetryAfter(method=method, message="Too Many Requests", retry_after=1)
+
+            if isinstance(method, GetChatMember):
+                return ChatMemberMember(user=TgUser(id=method.user_id, is_bot=False, first_name="User"))
+            if isinstance(method, (SendMessage, EditMessageText)):
+                return Message(
+                    message_id=random.randint(1, 10 ** 9),
+                    date=datetime.now(),
+                    chat=Chat(id=method.chat_id or 0, type="private"),
+                    text=method.text,
+                )
+            return True
+
+        async def stream_content(self, url, headers=None, timeout=30, chunk_size=65536, raise_for_status=True):
+            yield b""
+
+        async def close(self):
+            pass
+
+    return FakeSession()
+
+
+async def seed_database(args):
+    """Пересоздаёт таблицы и добавляет пользователей для лидерборда"""
+    from sqlalchemy import insert
+    from sqlalchemy.ext.asyncio import create_async_engine
+
+    from models import Base, User
+
+    engine = create_async_engine(args.db_url)
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.drop_all)
+        await conn.run_sync(Base.metadata.create_all)
+
+        batch = []
+        for i in range(1, args.users + 1):
+            batch.append({
+                "telegram_id": i,
+                "first_name": f"User{i}",
+                "time_line": "UTC+03:00",
+                "exp": random.randint(0, 10000),
+                "words_per_day": 10,
+                "eng_learned_words": [],
+                "eng_skipped_words": [],
+                "current_streak": 0,
+            })
+            if len(batch) == 1000:
+                await conn.execute(insert(User), batch)
+                batch = []
+        if batch:
+            await conn.execute(insert(User), batch)
+
+    await engine.dispose()
+    print(f"🌱 База заполнена: {args.users} пользователей")
+
+
+class UpdateFactory:
+    """Синтетические апдейты Telegram"""
+
+    def __init__(self, bot):
+        self.bot = bot
+        self.update_id = 0
+
+    def _user(self, user_id):
+        return {"id": user_id, "is_bot": False, "first_name": f"User{user_id}"}
+
+    def _message(self, user_id, text):
+        return {
+            "message_id": random.randint(1, 10 ** 9),
+            "date": int(time.time()),
+            "chat": {"id": user_id, "type": "private"},
+            "from": self._user(user_id),
+            "text": text,
+        }
+
+    def _update(self, payload):
+        from aiogram.types import Update
+
+        self.update_id += 1
+        return Update.model_validate({"update_id": self.update_id, **payload}, context={"bot": self.bot})
+
+    def message(self, user_id, text):
+        return self._update({"message": self._message(user_id, text)})
+
+    def callback(self, user_id, data):
+        return self._update({
+            "callback_query": {
+                "id": str(random.randint(1, 10 ** 9)),
+                "from": self._user(user_id),
+                "chat_instance": str(user_id),
+                "message": self._message(user_id, "menu"),
+                "data": data,
+            }
+        })
+
+
+def build_scenarios(args, factory):
+    """Сценарии: имя -> функция user_id -> список апдейтов (последний измеряется)"""
+    existing = lambda: random.randint(1, args.users)
+    new_user = lambda: args.users + random.randint(1, 10 ** 6)
+
+    return {
+        "start": lambda: [factory.message(existing(), "/start")],
+        "free_text": lambda: [factory.message(existing(), "привет")],
+        "check_subscription": lambda: [factory.callback(new_user(), "check_subscription")],
+        "timezone_reply": lambda: (
+            lambda uid: [factory.callback(uid, "check_subscription"), factory.message(uid, "14:30")]
+        )(new_user()),
+    }
+
+
+def histogram(latencies):
+    counts = [0] * (len(HISTOGRAM_BUCKETS_MS) + 1)
+    for value in latencies:
+        counts[bisect.bisect_left(HISTOGRAM_BUCKETS_MS, value * 1000)] += 1
+    labels = [f"<={b}ms" for b in HISTOGRAM_BUCKETS_MS] + ["+Inf"]
+    return dict(zip(labels, counts))
+
+
+async def check_query_budgets(session_pool, user_id: int):
+    """Число запросов текстов главного меню; превышение — ошибка, результаты не сохраняются"""
+    from caches import leaderboard_cache
+    from handlers.start import get_leaderboard_text, get_user_stats_text
+    from models import User
+    from query_stats import assert_max_queries
+
+    async with session_pool() as session:
+        user = await session.get(User, user_id)
+        if user is None:
+            raise SystemExit(f"❌ Пользователь {user_id} не найден — запустите без --no-seed")
+
+        leaderboard_cache.invalidate()  # худший случай: топ читается из базы
+        try:
+            with assert_max_queries(QUERY_LIMITS["get_leaderboard_text"], "get_leaderboard_text"):
+                await get_leaderboard_text(session, user_id)
+            with assert_max_queries(QUERY_LIMITS["get_user_stats_text"], "get_user_stats_text"):
+                await get_user_stats_text(session, user)
+        except AssertionError as e:
+            raise SystemExit(f"❌ {e}")
+    print("✅ Бюджет запросов: " + ", ".join(f"{name} ≤ {limit}" for name, limit in QUERY_LIMITS.items()))
+
+
+async def run_scenario(dp, bot, make_updates, total, concurrency):
+    latencies = []
+    queries = []
+    errors = 0
+    remaining = total
+
+    async def worker():
+        nonlocal remaining, errors
+        while remaining > 0:
+            remaining -= 1
+            *prepare, update = make_updates()
+            try:
+                for prev in prepare:
+                    await dp.feed_update(bot, prev)
+            except Exception:
+                errors += 1
+                continue
+
+            counter = [0]
+            token = current_queries.set(counter)
+            started = time.perf_counter()
+            try:
+                await dp.feed_update(bot, update)
+            except Exception:
+                errors += 1
+            finally:
+                latencies.append(time.perf_counter() - started)
+                current_queries.reset(token)
+            queries.append(counter[0])
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    summary = summarize(latencies, time.perf_counter() - started, errors)
+    summary["queries_per_update"] = round(sum(queries) / len(queries), 2) if queries else 0.0
+    summary["max_queries"] = max(queries, default=0)
+    summary["histogram"] = histogram(latencies)
+    return summary
+
+
+async def main():
+    args = parse_args()
+    os.environ["DATABASE_URL"] = args.db_url
+
+    if not args.no_seed:
+        await seed_database(args)
+
+    from aiogram import Bot
+    from sqlalchemy import event
+
+    from db import AsyncSessionLocal, async_engine
+    from dispatcher import build_dispatcher, instrument_bot
+
+    @event.listens_for(async_engine.sync_engine, "before_cursor_execute")
+    def count_query(conn, cursor, statement, parameters, context, executemany):
+        counter = current_queries.get()
+        if counter is not None:
+            counter[0] += 1
+
+    # Та же сборка диспетчера, что и в main.py
+    session = make_fake_session(args.api_latency, args.rate_limit_every)
+    bot = instrument_bot(Bot(token=BOT_TOKEN, session=session))
+    dp = build_dispatcher(AsyncSessionLocal)
+
+    await check_query_budgets(AsyncSessionLocal, random.randint(1, args.users))
+
+    factory = UpdateFactory(bot)
+    results = {"bot": {}}
+    for name, make_updates in build_scenarios(args, factory).items():
+        await run_scenario(dp, bot, make_updates, min(20, args.updates), args.concurrency)
+        summary = await run_scenario(dp, bot, make_updates, args.updates, args.concurrency)
+        results["bot"][name] = summary
+        print(f"  {name}: {summary['rps']} upd/s, p95 {summary['p95_ms']} ms, "
+              f"{summary['queries_per_update']} SQL/upd")
+
+    await async_engine.dispose()
+
+    print()
+    print_table(results)
+    print("\nГистограммы задержек обработчиков:")
+    for name, summary in results["bot"].items():
+        print(f"  {name}: " + ", ".join(f"{k}: {v}" for k, v in summary["histogram"].items() if v))
+    print(f"\nВызовы Bot API: {dict(session.calls)}")
+    if session.errors:
+        print(f"Ответы 429: {dict(session.errors)}")
+
+    from sqlalchemy.engine import make_url
+
+    params = {k: v for k, v in vars(args).items() if k not in ("output", "compare")}
+    params["db_url"] = make_url(args.db_url).render_as_string(hide_password=True)
+    results_meta = {"api_calls": dict(session.calls), "api_errors": dict(session.errors)}
+    path = save_results("bot", results, {**params, **results_meta}, args.output)
+    print(f"\n💾 Результаты сохранены: {path}")
+
+    if args.compare and not compare_results(args.compare, results):
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
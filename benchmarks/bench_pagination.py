@@ -0,0 +1,115 @@
+"""
+Бенчмарк пагинации каталога слов: offset (/api/words?skip=) против
+keyset-курсора (/api/words/page?cursor=) на разной глубине.
+
+Пример:
+    python benchmarks/bench_pagination.py --words 100000 --depths 0,1000,10000,50000,99000
+"""
+import argparse
+import asyncio
+import base64
+import os
+import tempfile
+import time
+
+from common import setup_path, summarize, assert_not_throttled, save_results, print_table, compare_results
+
+setup_path()
+
+DEFAULT_DB_URL = "sqlite+aiosqlite:///" + os.path.join(tempfile.gettempdir(), "vloya_bench_pagination.db")
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Бенчмарк пагинации /api/words")
+    parser.add_argument("--db-url", default=os.getenv("BENCH_DATABASE_URL", DEFAULT_DB_URL))
+    parser.add_argument("--words", type=int, default=50000)
+    parser.add_argument("--blob-size", type=int, default=2048)
+    parser.add_argument("--depths", default="0,1000,10000,40000")
+    parser.add_argument("--page-size", type=int, default=50)
+    parser.add_argument("--requests", type=int, default=50, help="запросов на каждую глубину")
+    parser.add_argument("--no-seed", action="store_true")
+    parser.add_argument("--output")
+    parser.add_argument("--compare")
+    return parser.parse_args()
+
+
+async def seed_database(args):
+    from sqlalchemy.ext.asyncio import create_async_engine
+
+    from models import Base, insert_words
+
+    engine = create_async_engine(args.db_url)
+    blob = base64.b64encode(os.urandom(args.blob_size * 3 // 4)).decode()
+
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.drop_all)
+        await conn.run_sync(Base.metadata.create_all)
+        for start in range(1, args.words + 1, 1000):
+            await conn.run_sync(insert_words, [
+                {"id": i, "eng": f"word{i}", "rus": f"слово{i}", "transcript": None,
+                 "image_data": blob, "sound_data": {"voice": blob}}
+                for i in range(start, min(start + 1000, args.words + 1))
+            ])
+
+    await engine.dispose()
+    print(f"🌱 База заполнена: {args.words} слов")
+
+
+async def measure(client, url, total):
+    latencies = []
+    errors = 0
+    started = time.perf_counter()
+    for _ in range(total):
+        request_started = time.perf_counter()
+        response = await client.get(url)
+        latencies.append(time.perf_counter() - request_started)
+        assert_not_throttled(response)
+        if response.status_code != 200:
+            errors += 1
+    return summarize(latencies, time.perf_counter() - started, errors)
+
+
+async def main():
+    args = parse_args()
+    os.environ["DATABASE_URL"] = args.db_url
+
+    if not args.no_seed:
+        await seed_database(args)
+
+    import httpx
+    import ma
+
+    depths = [int(d) for d in args.depths.split(",")]
+    results = {"offset": {}, "cursor": {}}
+
+    async with ma.lifespan(ma.app):
+        transport = httpx.ASGITransport(app=ma.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            for depth in depths:
+                offset_url = f"/api/words?skip={depth}&limit={args.page_size}"
+                # Слова засеяны с id 1..N, поэтому курсор "после id=depth" — та же страница
+                cursor_url = f"/api/words/page?limit={args.page_size}"
+                if depth:
+                    cursor_url += f"&cursor={ma.encode_cursor(depth)}"
+
+                results["offset"][f"depth_{depth}"] = await measure(client, offset_url, args.requests)
+                results["cursor"][f"depth_{depth}"] = await measure(client, cursor_url, args.requests)
+                print(f"  depth {depth}: offset p50 {results['offset'][f'depth_{depth}']['p50_ms']} ms, "
+                      f"cursor p50 {results['cursor'][f'depth_{depth}']['p50_ms']} ms")
+
+    print()
+    print_table(results)
+
+    from sqlalchemy.engine import make_url
+
+    params = {k: v for k, v in vars(args).items() if k not in ("output", "compare")}
+    params["db_url"] = make_url(args.db_url).render_as_string(hide_password=True)
+    path = save_results("pagination", results, params, args.output)
+    print(f"\n💾 Результаты сохранены: {path}")
+
+    if args.compare and not compare_results(args.compare, results):
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,148 @@
+"""
+Бенчмарк поиска /api/words/search: точные слова, префиксы и слова с опечаткой.
+
+Замеряется и эндпоинт целиком (ASGI в процессе), и сам индекс в памяти
+(для SQLite). С Postgres (--db-url postgresql+asyncpg://...) поиск идёт через
+триграммные индексы pg_trgm.
+
+Пример:
+    python benchmarks/bench_search.py --words 1000000 --requests 2000
+"""
+import argparse
+import asyncio
+import os
+import random
+import string
+import tempfile
+import time
+
+from common import setup_path, summarize, assert_not_throttled, save_results, print_table, compare_results
+
+setup_path()
+
+DEFAULT_DB_URL = "sqlite+aiosqlite:///" + os.path.join(tempfile.gettempdir(), "vloya_bench_search.db")
+RUS_LETTERS = "абвгдеёжзийклмнопрстуфхцчшщыэюя"
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Бенчмарк поиска по словам")
+    parser.add_argument("--db-url", default=os.getenv("BENCH_DATABASE_URL", DEFAULT_DB_URL))
+    parser.add_argument("--words", type=int, default=200000)
+    parser.add_argument("--requests", type=int, default=1000, help="запросов на каждый сценарий")
+    parser.add_argument("--limit", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--no-seed", action="store_true")
+    parser.add_argument("--output")
+    parser.add_argument("--compare")
+    return parser.parse_args()
+
+
+def make_word(rng: random.Random, letters: str) -> str:
+    return "".join(rng.choice(letters) for _ in range(rng.randint(3, 10)))
+
+
+def make_typo(rng: random.Random, word: str) -> str:
+    position = rng.randrange(len(word))
+    return word[:position] + rng.choice(string.ascii_lowercase) + word[position + 1:]
+
+
+async def seed_database(args, words):
+    from sqlalchemy import insert
+    from sqlalchemy.ext.asyncio import create_async_engine
+
+    from models import Base, Word, CatalogVersion
+
+    engine = create_async_engine(args.db_url)
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.drop_all)
+        await conn.run_sync(Base.metadata.create_all)
+        for start in range(0, len(words), 5000):
+            await conn.execute(insert(Word), [
+                {"id": i + 1, "eng": eng, "rus": rus, "version": 1}
+                for i, (eng, rus) in enumerate(words[start:start + 5000], start)
+            ])
+        await conn.execute(insert(CatalogVersion).values(name="eng_words", version=1))
+    await engine.dispose()
+    print(f"🌱 База заполнена: {len(words)} слов")
+
+
+def make_queries(rng: random.Random, words, total):
+    sample = [words[rng.randrange(len(words))] for _ in range(total)]
+    return {
+        "exact": [eng for eng, _ in sample],
+        "prefix": [eng[:3] for eng, _ in sample],
+        "rus_prefix": [rus[:4] for _, rus in sample],
+        "typo": [make_typo(rng, eng) for eng, _ in sample],
+    }
+
+
+async def main():
+    args = parse_args()
+    os.environ["DATABASE_URL"] = args.db_url
+
+    rng = random.Random(args.seed)
+    words = [(make_word(rng, string.ascii_lowercase), make_word(rng, RUS_LETTERS)) for _ in range(args.words)]
+    if not args.no_seed:
+        await seed_database(args, words)
+
+    import httpx
+    import ma
+    from database import get_sessionmaker
+    from word_search import word_search_index
+    from distractors import distractor_index
+
+    queries = make_queries(rng, words, args.requests)
+    results = {"endpoint": {}}
+
+    async with ma.lifespan(ma.app):
+        # Фоновая сборка индекса дистракторов не должна конкурировать с замерами за CPU
+        await distractor_index.stop()
+
+        if not args.db_url.startswith("postgresql"):
+            started = time.perf_counter()
+            async with get_sessionmaker()() as session:
+                await word_search_index.get(session)
+            print(f"🔎 Индекс в памяти собран за {time.perf_counter() - started:.1f} с")
+
+            results["index"] = {}
+            for scenario, values in queries.items():
+                latencies = []
+                started = time.perf_counter()
+                for q in values:
+                    request_started = time.perf_counter()
+                    word_search_index.search(q, args.limit)
+                    latencies.append(time.perf_counter() - request_started)
+                results["index"][scenario] = summarize(latencies, time.perf_counter() - started)
+
+        transport = httpx.ASGITransport(app=ma.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            for scenario, values in queries.items():
+                latencies = []
+                errors = 0
+                started = time.perf_counter()
+                for q in values:
+                    request_started = time.perf_counter()
+                    response = await client.get("/api/words/search", params={"q": q, "limit": args.limit})
+                    latencies.append(time.perf_counter() - request_started)
+                    assert_not_throttled(response)
+                    if response.status_code != 200:
+                        errors += 1
+                results["endpoint"][scenario] = summarize(latencies, time.perf_counter() - started, errors)
+                print(f"  {scenario}: p95 {results['endpoint'][scenario]['p95_ms']} ms")
+
+    print()
+    print_table(results)
+
+    from sqlalchemy.engine import make_url
+
+    params = {k: v for k, v in vars(args).items() if k not in ("output", "compare")}
+    params["db_url"] = make_url(args.db_url).render_as_string(hide_password=True)
+    path = save_results("search", results, params, args.output)
+    print(f"\n💾 Результаты сохранены: {path}")
+
+    if args.compare and not compare_results(args.compare, results):
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
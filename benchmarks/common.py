@@ -0,0 +1,112 @@
+"""Общие функции для бенчмарков: статистика задержек, сохранение и сравнение результатов"""
+import json
+import math
+import os
+import subprocess
+import sys
+from datetime import datetime
+from typing import Dict, List, Optional
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+RESULTS_DIR = os.path.join(ROOT, "benchmarks", "results")
+
+
+def setup_path():
+    """Добавляет корень репозитория в sys.path и делает его рабочей директорией"""
+    if ROOT not in sys.path:
+        sys.path.insert(0, ROOT)
+    os.chdir(ROOT)
+    # Весь трафик бенчмарков идёт с 127.0.0.1: лимиты admission.py исказили бы замеры
+    os.environ.setdefault("ADMISSION_ENABLED", "0")
+
+
+def assert_not_throttled(response):
+    """429 — замер упёрся в rate limit, а не в код; такие результаты не сохраняем"""
+    if response.status_code == 429:
+        raise SystemExit(f"❌ {response.request.method} {response.request.url.path}: 429 Too Many Requests — "
+                         "бенчмарк должен запускаться с ADMISSION_ENABLED=0")
+
+
+def percentile(sorted_values: List[float], p: float) -> float:
+    """Перцентиль (nearest-rank) по отсортированному списку"""
+    if not sorted_values:
+        return 0.0
+    k = max(0, min(len(sorted_values) - 1, math.ceil(p / 100 * len(sorted_values)) - 1))
+    return sorted_values[k]
+
+
+def summarize(latencies: List[float], elapsed: float, errors: int = 0) -> Dict[str, float]:
+    """Сводка по задержкам (в миллисекундах) и пропускной способности"""
+    values = sorted(latencies)
+    return {
+        "count": len(values),
+        "errors": errors,
+        "rps": round(len(values) / elapsed, 2) if elapsed > 0 else 0.0,
+        "p50_ms": round(percentile(values, 50) * 1000, 3),
+        "p95_ms": round(percentile(values, 95) * 1000, 3),
+        "p99_ms": round(percentile(values, 99) * 1000, 3),
+        "max_ms": round(values[-1] * 1000, 3) if values else 0.0,
+    }
+
+
+def git_revision() -> Optional[str]:
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, stderr=subprocess.DEVNULL
+        ).decode().strip()
+    except Exception:
+        return None
+
+
+def save_results(name: str, results: dict, params: dict, output: Optional[str] = None) -> str:
+    """Сохраняет результаты в JSON для сравнения между коммитами"""
+    revision = git_revision()
+    payload = {
+        "benchmark": name,
+        "revision": revision,
+        "timestamp": datetime.utcnow().isoformat(timespec="seconds"),
+        "params": params,
+        "results": results,
+    }
+
+    if output is None:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        output = os.path.join(RESULTS_DIR, f"{name}-{revision or 'local'}.json")
+
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(payload, f, ensure_ascii=False, indent=2)
+    return output
+
+
+def print_table(results: Dict[str, Dict[str, dict]]):
+    """Печатает результаты в виде таблицы: группа -> сценарий -> сводка"""
+    print(f"{'scenario':<32} {'rps':>10} {'p50 ms':>10} {'p95 ms':>10} {'p99 ms':>10} {'errors':>7}")
+    for group, scenarios in results.items():
+        for scenario, s in scenarios.items():
+            label = f"{group}/{scenario}"
+            print(f"{label:<32} {s['rps']:>10} {s['p50_ms']:>10} {s['p95_ms']:>10} {s['p99_ms']:>10} {s['errors']:>7}")
+
+
+def compare_results(baseline_path: str, results: Dict[str, Dict[str, dict]], threshold: float = 0.10) -> bool:
+    """Сравнивает с сохранённым прогоном; возвращает False, если есть регрессия больше threshold"""
+    with open(baseline_path, encoding="utf-8") as f:
+        baseline = json.load(f)
+
+    print(f"\nСравнение с {baseline_path} (ревизия {baseline.get('revision')}):")
+    ok = True
+    for group, scenarios in results.items():
+        for scenario, current in scenarios.items():
+            old = baseline.get("results", {}).get(group, {}).get(scenario)
+            if not old:
+                continue
+            for metric in ("p50_ms", "p95_ms", "p99_ms"):
+                if old[metric] and current[metric] > old[metric] * (1 + threshold):
+                    ok = False
+                    print(f"❌ {group}/{scenario} {metric}: {old[metric]} -> {current[metric]}")
+            if old["rps"] and current["rps"] < old["rps"] * (1 - threshold):
+                ok = False
+                print(f"❌ {group}/{scenario} rps: {old['rps']} -> {current['rps']}")
+
+    if ok:
+        print("✅ Регрессий не найдено")
+    return ok
@@ -0,0 +1,71 @@
+"""Метрики бота: задержка обработчиков и вызовы Telegram Bot API"""
+import time
+
+from aiogram import BaseMiddleware
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware
+from aiohttp import web
+
+from query_stats import track_queries
+from metrics import (
+    registry, bot_update_duration, bot_update_errors, telegram_api_calls, telegram_api_errors,
+    metrics_response_body,
+)
+
+
+class BotMetricsMiddleware(BaseMiddleware):
+    """Гистограмма задержки по имени обработчика"""
+
+    async def __call__(self, handler, event, data):
+        handler_object = data.get("handler")
+        name = getattr(getattr(handler_object, "callback", None), "__name__", "unknown")
+
+        started = time.perf_counter()
+        try:
+            return await handler(event, data)
+        except Exception:
+            bot_update_errors.inc(name)
+            raise
+        finally:
+            bot_update_duration.observe(time.perf_counter() - started, name)
+            registry.flush()
+
+
+class TelegramApiMetricsMiddleware(BaseRequestMiddleware):
+    """Счётчики вызовов и ошибок Telegram Bot API"""
+
+    async def __call__(self, make_request, bot, method):
+        name = type(method).__name__
+        telegram_api_calls.inc(name)
+        try:
+            return await make_request(bot, method)
+        except Exception as e:
+            telegram_api_errors.inc(name, type(e).__name__)
+            raise
+
+
+class BotQueryBudgetMiddleware(BaseMiddleware):
+    """Статистика SQL-запросов на каждый обработчик бота"""
+
+    async def __call__(self, handler, event, data):
+        handler_object = data.get("handler")
+        name = getattr(getattr(handler_object, "callback", None), "__name__", "unknown")
+
+        with track_queries(f"bot:{name}") as stats:
+            try:
+                return await handler(event, data)
+            finally:
+                stats.report()
+
+
+async def start_metrics_server(port: int, host: str = "0.0.0.0") -> web.AppRunner:
+    """HTTP сервер /metrics для процесса бота"""
+    async def handle(request):
+        body, content_type = metrics_response_body()
+        return web.Response(body=body, headers={"Content-Type": content_type})
+
+    app = web.Application()
+    app.router.add_get("/metrics", handle)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    return runner
@@ -0,0 +1,244 @@
+"""Горячие кэши процесса: индекс id слов, JSON слов и топ лидерборда"""
+import json
+import random
+import time
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import select, func, union
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from env import getenv
+from metrics import registry, Counter, Gauge
+from models import User, Word, WordTombstone
+from models.eng_words import current_catalog_version_query
+
+DEFAULT_WORD_CACHE_BYTES = 64 * 1024 * 1024
+
+word_cache_requests = registry.register(Counter(
+    "word_cache_requests_total", "Обращения к кэшу слов", ("result",)))
+word_cache_evictions = registry.register(Counter(
+    "word_cache_evictions_total", "Вытеснения из кэша слов"))
+word_cache_bytes = registry.register(Gauge("word_cache_bytes", "Объём кэша слов в байтах"))
+word_cache_entries = registry.register(Gauge("word_cache_entries", "Слов в кэше"))
+
+
+class WordIdIndex:
+    """Все id слов в памяти: случайные слова выбираются без ORDER BY random() по таблице.
+
+    Версия каталога проверяется не чаще check_interval; полная перезагрузка —
+    при смене версии или раз в max_age (на случай массовых вставок в обход ORM).
+    """
+
+    def __init__(self, check_interval: float = 30.0, max_age: float = 600.0):
+        self.check_interval = check_interval
+        self.max_age = max_age
+        self.ids: List[int] = []
+        self.version: Optional[int] = None
+        self._checked_at = 0.0
+        self._loaded_at = 0.0
+
+    async def get(self, session: AsyncSession) -> List[int]:
+        now = time.monotonic()
+        if self.version is not None and now - self._checked_at < self.check_interval:
+            return self.ids
+
+        version = (await session.execute(current_catalog_version_query())).scalar_one_or_none() or 0
+        self._checked_at = now
+        if version != self.version or now - self._loaded_at > self.max_age:
+            result = await session.execute(select(Word.id).order_by(Word.id))
+            self.ids = list(result.scalars().all())
+            self.version = version
+            self._loaded_at = now
+        return self.ids
+
+    async def sample(self, session: AsyncSession, count: int, exclude: Iterable[int] = ()) -> List[int]:
+        ids = await self.get(session)
+        exclude = set(exclude)
+        available = len(ids) - len(exclude)
+        if available <= 0:
+            return []
+
+        # Мало исключений — выбираем с отбраковкой, иначе фильтруем список
+        if len(exclude) * 2 < len(ids):
+            picked = set()
+            while len(picked) < min(count, available):
+                candidate = ids[random.randrange(len(ids))]
+                if candidate not in exclude:
+                    picked.add(candidate)
+            return list(picked)
+
+        candidates = [i for i in ids if i not in exclude]
+        return random.sample(candidates, min(count, len(candidates)))
+
+    def invalidate(self):
+        self.version = None
+
+
+class WordPayloadCache:
+    """LRU готовых JSON слов (как WordResponse), ограниченный суммарным объёмом в байтах.
+
+    Размер записи — от сотен байт до сотен килобайт (base64 медиа), поэтому
+    лимит по байтам, а не по числу записей. Записи крупнее max_entry_bytes не
+    кэшируются, чтобы одно слово не вытесняло весь кэш. При смене версии
+    каталога удаляются только изменённые и удалённые слова.
+    """
+
+    def __init__(self, max_bytes: Optional[int] = None, check_interval: float = 30.0,
+                 max_invalidations: int = 10000):
+        # None — WORD_CACHE_MAX_BYTES при первом обращении (после загрузки .env)
+        self.max_bytes = max_bytes
+        self.max_entry_bytes = max_bytes // 8 if max_bytes is not None else 0
+        self.check_interval = check_interval
+        self.max_invalidations = max_invalidations
+        self.entries: "OrderedDict[int, bytes]" = OrderedDict()
+        self.size = 0
+        self.version: Optional[int] = None
+        self._checked_at = 0.0
+
+    @staticmethod
+    def serialize(word: Word) -> bytes:
+        # Тот же формат, что у JSONResponse FastAPI: ensure_ascii=False, компактные разделители
+        return json.dumps({
+            "id": word.id,
+            "eng": word.eng,
+            "rus": word.rus,
+            "transcript": word.transcript,
+            "image_data": word.image_data,
+            "sound_data": word.sound_data,
+        }, ensure_ascii=False, separators=(",", ":")).encode()
+
+    async def _sync_version(self, session: AsyncSession):
+        now = time.monotonic()
+        if self.version is not None and now - self._checked_at < self.check_interval:
+            return
+        self._checked_at = now
+
+        version = (await session.execute(current_catalog_version_query())).scalar_one_or_none() or 0
+        if self.version is not None and version != self.version and self.entries:
+            result = await session.execute(
+                union(
+                    select(Word.id).where(Word.version > self.version),
+                    select(WordTombstone.word_id).where(WordTombstone.version > self.version),
+                ).limit(self.max_invalidations + 1)
+            )
+            changed = list(result.scalars().all())
+            if len(changed) > self.max_invalidations:
+                self.clear()
+            else:
+                for word_id in changed:
+                    self._discard(word_id)
+        self.version = version
+
+    def _discard(self, word_id: int):
+        payload = self.entries.pop(word_id, None)
+        if payload is not None:
+            self.size -= len(payload)
+
+    def _put(self, word_id: int, payload: bytes):
+        if len(payload) > self.max_entry_bytes:
+            return
+        self._discard(word_id)
+        self.entries[word_id] = payload
+        self.size += len(payload)
+        while self.size > self.max_bytes:
+            _, evicted = self.entries.popitem(last=False)
+            self.size -= len(evicted)
+            word_cache_evictions.inc()
+
+    def _update_gauges(self):
+        word_cache_bytes.set(value=float(self.size))
+        word_cache_entries.set(value=float(len(self.entries)))
+
+    async def get_many(self, session: AsyncSession, ids: Iterable[int]) -> Dict[int, bytes]:
+        """JSON слов по id; из базы одним запросом догружаются только промахи"""
+        if self.max_bytes is None:
+            self.max_bytes = int(getenv("WORD_CACHE_MAX_BYTES", str(DEFAULT_WORD_CACHE_BYTES)))
+            self.max_entry_bytes = self.max_bytes // 8
+        await self._sync_version(session)
+
+        found: Dict[int, bytes] = {}
+        misses = []
+        for word_id in dict.fromkeys(ids):
+            payload = self.entries.get(word_id)
+            if payload is None:
+                misses.append(word_id)
+            else:
+                self.entries.move_to_end(word_id)
+                found[word_id] = payload
+
+        word_cache_requests.inc("hit", amount=len(found))
+        if misses:
+            word_cache_requests.inc("miss", amount=len(misses))
+            result = await session.execute(select(Word).where(Word.id.in_(misses)))
+            for word in result.scalars():
+                payload = self.serialize(word)
+                found[word.id] = payload
+                self._put(word.id, payload)
+            self._update_gauges()
+
+        return found
+
+    async def get(self, session: AsyncSession, word_id: int) -> Optional[bytes]:
+        return (await self.get_many(session, [word_id])).get(word_id)
+
+    def clear(self):
+        self.entries.clear()
+        self.size = 0
+        self._update_gauges()
+
+    def invalidate(self):
+        self.clear()
+        self.version = None
+
+
+def json_array(payloads: Iterable[bytes]) -> bytes:
+    """Склеивает готовые JSON-фрагменты в массив без повторной сериализации"""
+    return b"[" + b",".join(payloads) + b"]"
+
+
+class LeaderboardCache:
+    """Топ пользователей по опыту; место конкретного пользователя считается отдельно по индексу"""
+
+    def __init__(self, ttl: float = 30.0):
+        self.ttl = ttl
+        self._rows: List[Tuple[int, str, Optional[str], int]] = []
+        self._limit = 0
+        self._loaded_at = 0.0
+
+    async def top(self, session: AsyncSession, limit: int = 15) -> List[Tuple[int, str, Optional[str], int]]:
+        """(telegram_id, first_name, last_name, exp) первых limit пользователей"""
+        if limit <= self._limit and time.monotonic() - self._loaded_at < self.ttl:
+            return self._rows[:limit]
+
+        result = await session.execute(
+            select(User.telegram_id, User.first_name, User.last_name, func.coalesce(User.exp, 0))
+            .order_by(User.exp.desc())
+            .limit(limit)
+        )
+        self._rows = [tuple(row) for row in result]
+        self._limit = limit
+        self._loaded_at = time.monotonic()
+        return self._rows
+
+    def invalidate(self):
+        self._loaded_at = 0.0
+
+
+async def get_user_place(session: AsyncSession, telegram_id: int) -> Optional[int]:
+    """Место в рейтинге одним запросом: число пользователей с большим опытом + 1"""
+    me = select(func.coalesce(User.exp, 0).label("exp")).where(User.telegram_id == telegram_id).subquery()
+    result = await session.execute(
+        select(
+            select(func.count()).select_from(User)
+            .where(User.exp > me.c.exp)
+            .scalar_subquery()
+        ).select_from(me)
+    )
+    ahead = result.scalar_one_or_none()
+    return None if ahead is None else ahead + 1
+
+
+word_id_index = WordIdIndex()
+word_cache = WordPayloadCache()
+leaderboard_cache = LeaderboardCache()
@@ -0,0 +1,160 @@
+"""
+Ежедневные задачи пользователей на основе модели Task.
+
+Общие задачи (COMMON_TASKS) материализуются для всех пользователей одного
+часового пояса одним INSERT ... SELECT в локальную полночь этого пояса.
+Экран задач читается одним запросом по индексу (telegram_id, date, task_key),
+отметка выполнения — один UPDATE по первичному ключу.
+"""
+import asyncio
+import logging
+from datetime import date, datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import select, update, literal, union_all, Boolean, Date, String, Text
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from local_time import local_date
+from models import Task, User
+
+logger = logging.getLogger("daily_tasks")
+
+COMMON_TASKS = [
+    {"id": "wake_up", "text": "⏰ Подъём до 7:00"},
+    {"id": "learn_words", "text": "📘 Учить 5 слов"},
+    {"id": "workout", "text": "🏋️ Тренировка"},
+]
+
+SCHEDULER_INTERVAL = 60  # секунд
+TIMEZONES_REFRESH_INTERVAL = 30 * 60  # список поясов меняется редко
+MAX_TASK_LENGTH = 200
+
+
+def _insert(dialect_name: str):
+    return sqlite_insert if dialect_name == "sqlite" else pg_insert
+
+
+def _materialize_statement(dialect_name: str, for_date: date, time_line: Optional[str] = None,
+                           telegram_id: Optional[int] = None):
+    """INSERT ... SELECT общих задач для пояса или одного пользователя"""
+    selects = []
+    for task in COMMON_TASKS:
+        query = select(
+            User.telegram_id,
+            literal(task["id"], String),
+            literal(task["text"], Text),
+            literal(for_date, Date),
+            literal(False, Boolean),
+        )
+        if time_line is not None:
+            query = query.where(User.time_line == time_line)
+        if telegram_id is not None:
+            query = query.where(User.telegram_id == telegram_id)
+        selects.append(query)
+
+    return _insert(dialect_name)(Task).from_select(
+        ["telegram_id", "task_key", "text", "date", "is_done"],
+        union_all(*selects),
+    ).on_conflict_do_nothing(index_elements=["telegram_id", "date", "task_key"])
+
+
+async def materialize_timezone(session: AsyncSession, time_line: str, for_date: date):
+    """Создаёт общие задачи на день для всех пользователей часового пояса"""
+    await session.execute(_materialize_statement(session.bind.dialect.name, for_date, time_line=time_line))
+    await session.commit()
+
+
+async def materialize_user(session: AsyncSession, telegram_id: int, for_date: date):
+    """Создаёт общие задачи на день для одного пользователя (новые пользователи)"""
+    await session.execute(_materialize_statement(session.bind.dialect.name, for_date, telegram_id=telegram_id))
+    await session.commit()
+
+
+async def get_user_tasks(session: AsyncSession, telegram_id: int) -> Tuple[Optional[date], List[Task]]:
+    """Задачи пользователя на его локальную дату.
+
+    Локальная дата всегда в пределах суток от даты UTC, поэтому читаем диапазон
+    дат по индексу вместе с часовым поясом пользователя и фильтруем в памяти —
+    один запрос на отрисовку.
+    """
+    utc_today = datetime.utcnow().date()
+    result = await session.execute(
+        select(Task, User.time_line)
+        .join(User, User.telegram_id == Task.telegram_id)
+        .where(
+            Task.telegram_id == telegram_id,
+            Task.date.between(utc_today - timedelta(days=1), utc_today + timedelta(days=1)),
+        )
+        .order_by(Task.id)
+    )
+    rows = result.all()
+    if not rows:
+        return None, []
+
+    today = local_date(rows[0].time_line)
+    return today, [row.Task for row in rows if row.Task.date == today]
+
+
+async def ensure_user_tasks(session: AsyncSession, telegram_id: int) -> List[Task]:
+    """Задачи на сегодня; если их ещё нет (пользователь зарегистрировался после полуночи) — создаёт"""
+    today, tasks = await get_user_tasks(session, telegram_id)
+    if tasks:
+        return tasks
+
+    user = await session.get(User, telegram_id)
+    if not user:
+        return []
+
+    await materialize_user(session, telegram_id, local_date(user.time_line))
+    _, tasks = await get_user_tasks(session, telegram_id)
+    return tasks
+
+
+async def toggle_task(session: AsyncSession, telegram_id: int, task_id: int) -> bool:
+    """Переключает отметку выполнения одним UPDATE; False, если задача не найдена"""
+    result = await session.execute(
+        update(Task)
+        .where(Task.id == task_id, Task.telegram_id == telegram_id)
+        .values(is_done=~Task.is_done)
+    )
+    await session.commit()
+    return result.rowcount > 0
+
+
+async def add_custom_task(session: AsyncSession, telegram_id: int, text: str, for_date: date) -> Task:
+    task = Task(telegram_id=telegram_id, task_key=None, text=text[:MAX_TASK_LENGTH], date=for_date, is_done=False)
+    session.add(task)
+    await session.commit()
+    return task
+
+
+async def run_daily_tasks_scheduler(session_pool: async_sessionmaker, interval: float = SCHEDULER_INTERVAL):
+    """Фоновая задача: в локальную полночь каждого часового пояса создаёт задачи на новый день"""
+    materialized: Dict[str, date] = {}
+    time_lines: List[str] = []
+    refreshed_at = None
+
+    while True:
+        try:
+            async with session_pool() as session:
+                now = datetime.utcnow()
+                if refreshed_at is None or (now - refreshed_at).total_seconds() > TIMEZONES_REFRESH_INTERVAL:
+                    result = await session.execute(select(User.time_line).distinct())
+                    time_lines = [row[0] for row in result]
+                    refreshed_at = now
+
+                for time_line in time_lines:
+                    today = local_date(time_line)
+                    if materialized.get(time_line) == today:
+                        continue
+                    await materialize_timezone(session, time_line, today)
+                    materialized[time_line] = today
+                    logger.info("Задачи на %s созданы для пояса %s", today, time_line)
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            logger.exception("Не удалось создать ежедневные задачи")
+
+        await asyncio.sleep(interval)
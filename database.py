@@ -0,0 +1,119 @@
+"""
+Ленивое создание движка и фабрики сессий.
+
+Импорт модуля ничего не подключает и не читает .env: движок создаётся при
+первом обращении (get_engine() / get_sessionmaker()). Для совместимости
+атрибуты async_engine и AsyncSessionLocal тоже доступны и создаются лениво.
+
+Если задан REPLICA_DATABASE_URL, get_replica_engine() / get_replica_sessionmaker()
+возвращают движок реплики для чтения (маршрутизация — в replica.py).
+"""
+import os
+from typing import Optional
+
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncEngine, async_sessionmaker, create_async_engine
+
+from env import load_env
+from query_stats import instrument_engine
+
+_engine: Optional[AsyncEngine] = None
+_sessionmaker: Optional[async_sessionmaker] = None
+_replica_engine: Optional[AsyncEngine] = None
+_replica_sessionmaker: Optional[async_sessionmaker] = None
+
+
+def get_database_url() -> str:
+    load_env()
+    database_url = os.getenv("DATABASE_URL")
+    if not database_url:
+        raise ValueError("DATABASE_URL not set in environment variables")
+    return database_url
+
+
+def engine_options() -> dict:
+    """Параметры пула из окружения (DB_POOL_SIZE, DB_MAX_OVERFLOW)"""
+    options = {"echo": False}
+    if os.getenv("DB_POOL_SIZE"):
+        options["pool_size"] = int(os.getenv("DB_POOL_SIZE"))
+    if os.getenv("DB_MAX_OVERFLOW"):
+        options["max_overflow"] = int(os.getenv("DB_MAX_OVERFLOW"))
+    return options
+
+
+def get_replica_url() -> Optional[str]:
+    load_env()
+    return os.getenv("REPLICA_DATABASE_URL") or None
+
+
+def _sqlite_lock_for_update(conn, cursor, statement, parameters, context, executemany):
+    """SQLite не знает SELECT ... FOR UPDATE: такой запрос начинает транзакцию
+    с BEGIN IMMEDIATE, и параллельные изменения строки ждут commit, как в Postgres"""
+    compiled = getattr(context, "compiled", None)
+    if compiled is None or getattr(compiled.statement, "_for_update_arg", None) is None:
+        return
+    if not conn.connection.driver_connection.in_transaction:
+        cursor.execute("BEGIN IMMEDIATE")
+
+
+def _create_engine(url: str) -> AsyncEngine:
+    options = engine_options()
+    if url.startswith("sqlite"):
+        # У SQLite свой пул без pool_size / max_overflow
+        options.pop("pool_size", None)
+        options.pop("max_overflow", None)
+    engine = create_async_engine(url, **options)
+    if url.startswith("sqlite"):
+        event.listen(engine.sync_engine, "before_cursor_execute", _sqlite_lock_for_update)
+    instrument_engine(engine)
+    return engine
+
+
+def get_engine() -> AsyncEngine:
+    global _engine
+    if _engine is None:
+        _engine = _create_engine(get_database_url())
+    return _engine
+
+
+def get_sessionmaker() -> async_sessionmaker:
+    global _sessionmaker
+    if _sessionmaker is None:
+        _sessionmaker = async_sessionmaker(bind=get_engine(), expire_on_commit=False)
+    return _sessionmaker
+
+
+def get_replica_engine() -> Optional[AsyncEngine]:
+    """Движок реплики или None, если REPLICA_DATABASE_URL не задан"""
+    global _replica_engine
+    if _replica_engine is None:
+        url = get_replica_url()
+        if url:
+            _replica_engine = _create_engine(url)
+    return _replica_engine
+
+
+def get_replica_sessionmaker() -> Optional[async_sessionmaker]:
+    global _replica_sessionmaker
+    if _replica_sessionmaker is None and get_replica_engine() is not None:
+        _replica_sessionmaker = async_sessionmaker(bind=get_replica_engine(), expire_on_commit=False)
+    return _replica_sessionmaker
+
+
+async def dispose_engine():
+    global _engine, _sessionmaker, _replica_engine, _replica_sessionmaker
+    for engine in (_engine, _replica_engine):
+        if engine is not None:
+            await engine.dispose()
+    _engine = None
+    _sessionmaker = None
+    _replica_engine = None
+    _replica_sessionmaker = None
+
+
+def __getattr__(name):
+    if name == "async_engine":
+        return get_engine()
+    if name == "AsyncSessionLocal":
+        return get_sessionmaker()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
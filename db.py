@@ -1,51 +1,43 @@
-import os
-import asyncio
 from contextlib import asynccontextmanager
+from typing import Optional
 
 from aiogram import BaseMiddleware
-from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine, async_sessionmaker
-from sqlalchemy.orm import sessionmaker
-from dotenv import load_dotenv
+from sqlalchemy.ext.asyncio import async_sessionmaker
 
 from models import Base
+from database import get_engine, get_sessionmaker
 
-# Загрузка переменных окружения
-basedir = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
-load_dotenv()
+# Движок и фабрика сессий создаются лениво в database.py при первом обращении;
+# db.async_engine и db.AsyncSessionLocal оставлены для совместимости
+def __getattr__(name):
+    if name in ("async_engine", "AsyncSessionLocal"):
+        import database
+        return getattr(database, name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
-DATABASE_URL = os.getenv("DATABASE_URL")
-if not DATABASE_URL:
-    raise ValueError("DATABASE_URL not set in environment variables")
-
-# Настройка асинхронного движка и фабрики сессий
-async_engine = create_async_engine(DATABASE_URL, echo=False)
-
-AsyncSessionLocal = async_sessionmaker(
-    bind=async_engine,
-    expire_on_commit=False,
-)
 
 class DbSessionMiddleware(BaseMiddleware):
-    def __init__(self, session_pool: async_sessionmaker):
+    def __init__(self, session_pool: Optional[async_sessionmaker] = None):
         super().__init__()
         self.session_pool = session_pool
 
     async def __call__(self, handler, event, data):
-        async with self.session_pool() as session:
+        session_pool = self.session_pool or get_sessionmaker()
+        async with session_pool() as session:
             data["session"] = session
             return await handler(event, data)
 
 # Контекстный менеджер для асинхронной сессии
 @asynccontextmanager
 async def get_async_session():
-    async with AsyncSessionLocal() as session:
+    async with get_sessionmaker()() as session:
         try:
             yield session
         finally:
             await session.close()
 
-# Инициализация базы данных
+# Инициализация базы данных (для разработки; в production схему ведёт Alembic)
 async def init_db():
-    async with async_engine.begin() as conn:
+    async with get_engine().begin() as conn:
         await conn.run_sync(Base.metadata.create_all)
-    print("✅ База данных создана.")
\ No newline at end of file
+    print("✅ База данных создана.")
@@ -0,0 +1,32 @@
+"""
+Сборка диспетчера бота.
+
+Одна и та же для main.py и benchmarks/bench_bot.py, чтобы бенчмарк мерил
+тот же набор middleware (сессия БД, метрики, бюджет SQL-запросов), что и
+работающий бот.
+"""
+from typing import Optional
+
+from aiogram import Bot, Dispatcher
+from sqlalchemy.ext.asyncio import async_sessionmaker
+
+from db import DbSessionMiddleware
+from bot_metrics import BotMetricsMiddleware, BotQueryBudgetMiddleware, TelegramApiMetricsMiddleware
+from handlers import start
+
+
+def build_dispatcher(session_pool: Optional[async_sessionmaker] = None) -> Dispatcher:
+    """Диспетчер с middleware и роутерами; session_pool по умолчанию — ленивый из database.py"""
+    dp = Dispatcher()
+    for observer in (dp.message, dp.callback_query):
+        observer.middleware(DbSessionMiddleware(session_pool))
+        observer.middleware(BotMetricsMiddleware())
+        observer.middleware(BotQueryBudgetMiddleware())
+    dp.include_router(start.router)
+    return dp
+
+
+def instrument_bot(bot: Bot) -> Bot:
+    """Метрики вызовов Telegram Bot API"""
+    bot.session.middleware(TelegramApiMetricsMiddleware())
+    return bot
@@ -0,0 +1,342 @@
+"""
+Индекс «соседей» слов для неправильных вариантов ответа в квизе.
+
+Для каждого слова заранее хранится NEIGHBOURS ближайших слов отдельно по
+Word.eng и Word.rus: похожие по расстоянию Левенштейна, общему префиксу и
+длине. Кандидаты — соседи слова в отсортированном списке текстов (общий
+префикс) и в списке перевёрнутых текстов (общее окончание), поэтому сборка
+O(n log n) и не сравнивает все пары слов.
+
+Полная сборка (и отсортированные списки, и соседи) выполняется в отдельном
+процессе (ProcessPoolExecutor), чтобы не блокировать event loop. При смене
+версии каталога пересчитываются только изменённые слова и слова рядом с ними
+в отсортированных списках — в потоке executor, по представлению «индекс после
+изменений» поверх текущих структур (_ChangedTexts), без их копирования:
+передавать индекс в другой процесс дороже самого пересчёта. Затем изменения
+и новые соседи применяются на месте без await — работа пропорциональна числу
+изменений, а квиз не видит индекс наполовину обновлённым. Генерация квиза —
+O(k) обращений к словарям в памяти.
+"""
+import asyncio
+import bisect
+import logging
+import multiprocessing
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Iterable, List, Optional, Sequence, Set, Tuple
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from models import Word, WordTombstone
+from models.eng_words import current_catalog_version_query
+
+logger = logging.getLogger("distractors")
+
+NEIGHBOURS = 8
+MAX_DISTANCE = 3  # дальше — уже не «похожее» слово, сравниваем по префиксу и длине
+WINDOW = 6  # кандидатов с каждой стороны в каждом отсортированном списке
+MAX_INCREMENTAL = 2000  # больше изменений — полная пересборка
+FIELDS = ("eng", "rus")
+
+WordRow = Tuple[int, str, str]
+
+
+def edit_distance(a: str, b: str, limit: int) -> int:
+    """Левенштейн в полосе ширины limit: расстояние больше limit возвращается как limit + 1"""
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    too_far = limit + 1
+    previous = [j if j <= limit else too_far for j in range(len(b) + 1)]
+    for i, char_a in enumerate(a, 1):
+        low, high = max(1, i - limit), min(len(b), i + limit)
+        current = [too_far] * (len(b) + 1)
+        current[0] = i if i <= limit else too_far
+        best = current[0]
+        for j in range(low, high + 1):
+            value = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (char_a != b[j - 1]))
+            current[j] = value
+            if value < best:
+                best = value
+        if best > limit:
+            return too_far
+        previous = current
+    return min(previous[-1], too_far)
+
+
+def common_prefix(a: str, b: str) -> int:
+    length = 0
+    for char_a, char_b in zip(a, b):
+        if char_a != char_b:
+            break
+        length += 1
+    return length
+
+
+def normalize(text: Optional[str]) -> str:
+    return (text or "").strip().lower()
+
+
+class _SortedTexts:
+    """Тексты одного поля, отсортированные по началу и по окончанию слова"""
+
+    def __init__(self, items: Iterable[Tuple[int, str]] = ()):
+        self.texts: Dict[int, str] = {word_id: normalize(text) for word_id, text in items}
+        self.forward = sorted((text, word_id) for word_id, text in self.texts.items())
+        self.backward = sorted((text[::-1], word_id) for word_id, text in self.texts.items())
+
+    def add(self, word_id: int, text: str):
+        self.remove(word_id)
+        text = normalize(text)
+        self.texts[word_id] = text
+        bisect.insort(self.forward, (text, word_id))
+        bisect.insort(self.backward, (text[::-1], word_id))
+
+    def remove(self, word_id: int):
+        text = self.texts.pop(word_id, None)
+        if text is None:
+            return
+        for keys, key in ((self.forward, (text, word_id)), (self.backward, (text[::-1], word_id))):
+            position = bisect.bisect_left(keys, key)
+            if position < len(keys) and keys[position] == key:
+                del keys[position]
+
+    def text(self, word_id: int) -> Optional[str]:
+        return self.texts.get(word_id)
+
+    def around(self, backward: bool, key: Tuple[str, int]) -> List[Tuple[str, int]]:
+        """Ключи списка рядом с key: WINDOW до него и WINDOW + 1 начиная с него"""
+        keys = self.backward if backward else self.forward
+        position = bisect.bisect_left(keys, key)
+        return keys[max(0, position - WINDOW):position + WINDOW + 1]
+
+    def window(self, word_id: int) -> Set[int]:
+        """Слова рядом в обоих отсортированных списках"""
+        text = self.text(word_id)
+        if text is None:
+            return set()
+        result = set()
+        for backward, key in ((False, (text, word_id)), (True, (text[::-1], word_id))):
+            for _, candidate in self.around(backward, key):
+                result.add(candidate)
+        result.discard(word_id)
+        return result
+
+    def neighbours(self, word_id: int) -> Tuple[int, ...]:
+        text = self.text(word_id)
+        limit = min(MAX_DISTANCE, max(1, len(text) // 2))
+        scored = []
+        for candidate in self.window(word_id):
+            other = self.text(candidate)
+            if other == text:
+                continue  # одинаковый текст — неоднозначный ответ
+            scored.append((
+                edit_distance(text, other, limit),
+                -min(common_prefix(text, other), 4),
+                abs(len(text) - len(other)),
+                candidate,
+            ))
+        scored.sort()
+        return tuple(candidate for *_, candidate in scored[:NEIGHBOURS])
+
+
+class _ChangedTexts(_SortedTexts):
+    """Тексты поля после изменений поверх исходных _SortedTexts, которые не меняются и не копируются.
+
+    Свои списки — только у новых текстов; старые ключи изменённых и удалённых слов
+    скрыты (hidden). Окно совпадает с окном в списке, где изменения уже применены.
+    """
+
+    def __init__(self, base: _SortedTexts, changed: Dict[int, str], deleted_ids: Iterable[int]):
+        super().__init__(changed.items())
+        self.base = base
+        self.hidden = set(deleted_ids) | set(changed)
+
+    def text(self, word_id: int) -> Optional[str]:
+        if word_id in self.texts:
+            return self.texts[word_id]
+        return None if word_id in self.hidden else self.base.texts.get(word_id)
+
+    def around(self, backward: bool, key: Tuple[str, int]) -> List[Tuple[str, int]]:
+        keys = self.base.backward if backward else self.base.forward
+        position = bisect.bisect_left(keys, key)
+        before, after = [], []
+        index = position - 1
+        while index >= 0 and len(before) < WINDOW:
+            if keys[index][1] not in self.hidden:
+                before.append(keys[index])
+            index -= 1
+        index = position
+        while index < len(keys) and len(after) < WINDOW + 1:
+            if keys[index][1] not in self.hidden:
+                after.append(keys[index])
+            index += 1
+        merged = sorted(before + after + super().around(backward, key))
+        position = bisect.bisect_left(merged, key)
+        return merged[max(0, position - WINDOW):position + WINDOW + 1]
+
+
+Texts = Dict[str, _SortedTexts]
+Neighbours = Dict[str, Dict[int, Tuple[int, ...]]]
+
+
+def build_index(rows: Sequence[WordRow]) -> Tuple[Texts, Neighbours]:
+    """Полная сборка; чистая функция — выполняется в отдельном процессе"""
+    texts, neighbours = {}, {}
+    for position, field in enumerate(FIELDS, 1):
+        texts[field] = _SortedTexts((row[0], row[position]) for row in rows)
+        neighbours[field] = {row[0]: texts[field].neighbours(row[0]) for row in rows}
+    return texts, neighbours
+
+
+def apply_changes(texts: Texts, rows: Sequence[WordRow], changed_ids: Sequence[int],
+                  deleted_ids: Sequence[int]) -> Neighbours:
+    """Новые соседи изменённых слов и слов рядом со старым и новым текстом (выполняется в потоке).
+
+    Индекс не меняется и не копируется: пересчёт идёт по _ChangedTexts поверх него.
+    """
+    updates = {}
+    for position, field in enumerate(FIELDS, 1):
+        changed = _ChangedTexts(texts[field], {row[0]: row[position] for row in rows}, deleted_ids)
+        affected: Set[int] = set(changed_ids)
+        for word_id in list(deleted_ids) + list(changed_ids):
+            affected |= texts[field].window(word_id)
+            affected |= changed.window(word_id)
+        updates[field] = {
+            word_id: changed.neighbours(word_id) for word_id in affected if changed.text(word_id) is not None
+        }
+    return updates
+
+
+class DistractorIndex:
+    def __init__(self, check_interval: float = 60.0):
+        self.check_interval = check_interval
+        self.version: Optional[int] = None
+        self.words: Dict[int, Tuple[str, str]] = {}
+        self.neighbours: Neighbours = {field: {} for field in FIELDS}
+        self.texts: Texts = {field: _SortedTexts() for field in FIELDS}
+        self._checked_at = 0.0
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def ready(self) -> bool:
+        return self.version is not None
+
+    async def _load_rows(self, session: AsyncSession, ids: Optional[List[int]] = None) -> List[WordRow]:
+        query = select(Word.id, Word.eng, Word.rus)
+        if ids is not None:
+            query = query.where(Word.id.in_(ids))
+        return [tuple(row) for row in await session.execute(query)]
+
+    async def rebuild(self, session: AsyncSession):
+        """Полная сборка в отдельном процессе"""
+        started = time.perf_counter()
+        version = (await session.execute(current_catalog_version_query())).scalar_one_or_none() or 0
+        rows = await self._load_rows(session)
+
+        loop = asyncio.get_running_loop()
+        with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("spawn")) as pool:
+            texts, neighbours = await loop.run_in_executor(pool, build_index, rows)
+
+        self._swap(version, {row[0]: (row[1], row[2]) for row in rows}, texts, neighbours)
+        logger.info("Индекс дистракторов: %d слов за %.1f с", len(rows), time.perf_counter() - started)
+
+    async def update(self, session: AsyncSession, since_version: int):
+        """Пересчёт изменённых с since_version слов и слов рядом с ними"""
+        version = (await session.execute(current_catalog_version_query())).scalar_one_or_none() or 0
+        changed_ids = list((await session.execute(
+            select(Word.id).where(Word.version > since_version).limit(MAX_INCREMENTAL + 1)
+        )).scalars())
+        deleted_ids = list((await session.execute(
+            select(WordTombstone.word_id).where(WordTombstone.version > since_version).limit(MAX_INCREMENTAL + 1)
+        )).scalars())
+        if len(changed_ids) + len(deleted_ids) > MAX_INCREMENTAL:
+            await self.rebuild(session)
+            return
+
+        rows = await self._load_rows(session, changed_ids) if changed_ids else []
+        # Обновления выполняются по одному (self._task), поэтому структуры индекса
+        # во время пересчёта меняет только _apply ниже
+        updates = await asyncio.get_running_loop().run_in_executor(
+            None, apply_changes, self.texts, rows, changed_ids, deleted_ids
+        )
+        self._apply(version, rows, deleted_ids, updates)
+
+    def _swap(self, version: int, words, texts: Texts, neighbours: Neighbours):
+        """Подмена индекса целиком — без await, квиз видит либо старую, либо новую версию"""
+        self.words, self.texts, self.neighbours, self.version = words, texts, neighbours, version
+
+    def _apply(self, version: int, rows: Sequence[WordRow], deleted_ids: Sequence[int], updates: Neighbours):
+        """Изменения на месте — тоже без await, поэтому так же атомарны для квиза"""
+        for word_id in deleted_ids:
+            self.words.pop(word_id, None)
+            for field in FIELDS:
+                self.texts[field].remove(word_id)
+                self.neighbours[field].pop(word_id, None)
+        for word_id, eng, rus in rows:
+            self.words[word_id] = (eng, rus)
+            self.texts["eng"].add(word_id, eng)
+            self.texts["rus"].add(word_id, rus)
+        for field in FIELDS:
+            self.neighbours[field].update(updates[field])
+        self.version = version
+
+    async def _refresh(self, session_factory):
+        try:
+            async with session_factory() as session:
+                if self.version is None:
+                    await self.rebuild(session)
+                else:
+                    await self.update(session, self.version)
+        except Exception:
+            logger.exception("Не удалось обновить индекс дистракторов")
+
+    async def check(self, session: AsyncSession, session_factory):
+        """Не блокирует запрос: при смене версии каталога обновление идёт в фоне"""
+        now = time.monotonic()
+        if self._task is not None and not self._task.done():
+            return
+        if self.version is not None and now - self._checked_at < self.check_interval:
+            return
+        self._checked_at = now
+
+        version = (await session.execute(current_catalog_version_query())).scalar_one_or_none() or 0
+        if version != self.version:
+            self._task = asyncio.create_task(self._refresh(session_factory))
+
+    async def stop(self):
+        if self._task is not None and not self._task.done():
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+
+    def text(self, word_id: int, field: str, extra: Dict[int, Tuple[str, str]]) -> Optional[str]:
+        texts = self.words.get(word_id) or extra.get(word_id)
+        return None if texts is None else texts[FIELDS.index(field)]
+
+    def distractors(self, word_id: int, field: str, count: int, fallback: Sequence[int] = (),
+                    extra: Optional[Dict[int, Tuple[str, str]]] = None) -> List[int]:
+        """count неправильных вариантов: соседи из индекса, затем fallback (случайные id).
+
+        extra — тексты слов, которых ещё нет в индексе (id -> (eng, rus)).
+        """
+        extra = extra or {}
+        picked: List[int] = []
+        seen = {(self.text(word_id, field, extra) or "").strip().lower()}
+        for candidate in list(self.neighbours[field].get(word_id, ())) + list(fallback):
+            text = self.text(candidate, field, extra)
+            if candidate == word_id or text is None:
+                continue
+            text = text.strip().lower()
+            if text in seen:
+                continue
+            seen.add(text)
+            picked.append(candidate)
+            if len(picked) == count:
+                break
+        return picked
+
+
+distractor_index = DistractorIndex()
@@ -0,0 +1,30 @@
+"""
+Настройки из окружения и .env.
+
+.env читается один раз при первом обращении, а не при импорте модулей:
+настройки, которые модули раньше читали в константы при импорте, теперь
+берутся через getenv() в момент использования (старт процесса, первая
+сборка кэша), когда .env уже загружен. Модуль ничего не импортирует из
+проекта, поэтому его можно использовать откуда угодно без циклических
+импортов.
+"""
+import os
+from typing import Optional
+
+_dotenv_loaded = False
+
+
+def load_env():
+    """Читает .env один раз; настройки из него нужно брать из os.environ после этого вызова"""
+    global _dotenv_loaded
+    if not _dotenv_loaded:
+        from dotenv import load_dotenv
+
+        load_dotenv()
+        _dotenv_loaded = True
+
+
+def getenv(name: str, default: Optional[str] = None) -> Optional[str]:
+    """os.getenv после загрузки .env"""
+    load_env()
+    return os.getenv(name, default)
@@ -0,0 +1,157 @@
+"""
+Каталог упражнений: потоковая загрузка результата testpars.py в таблицу exercises
+и кэш каталога в памяти процесса.
+
+Запуск загрузки:
+    python exercise_catalog.py [musclewiki_exercises.json]
+"""
+import asyncio
+import json
+import sys
+import time
+from collections import OrderedDict
+from typing import Iterator, List, Optional, Tuple
+
+from sqlalchemy import select
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from models import Exercise
+
+DEFAULT_PATH = "musclewiki_exercises.json"
+CHUNK_SIZE = 64 * 1024
+BATCH_SIZE = 500
+
+EXERCISE_FIELDS = ("name", "gender", "muscle_group", "gif_url", "description", "url")
+
+# Значения фильтров — те, что собирает testpars.py (в нижнем регистре)
+GENDERS = frozenset({"male", "female"})
+MUSCLE_GROUPS = frozenset({
+    "abs", "biceps", "chest", "back", "quads", "hamstrings", "shoulder", "triceps",
+    "calves", "forearms", "glutes", "obliques",
+})
+
+
+def iter_exercises(path: str = DEFAULT_PATH, chunk_size: int = CHUNK_SIZE) -> Iterator[dict]:
+    """Потоково читает упражнения из JSON-массива (или NDJSON), не загружая файл целиком"""
+    decoder = json.JSONDecoder()
+    buf = ""
+    eof = False
+
+    with open(path, encoding="utf-8") as f:
+        while True:
+            # Пропускаем скобки массива, запятые и пробелы между объектами
+            buf = buf.lstrip(" \t\r\n[,]")
+            if buf:
+                try:
+                    obj, end = decoder.raw_decode(buf)
+                except json.JSONDecodeError:
+                    if eof:
+                        raise
+                else:
+                    yield obj
+                    buf = buf[end:]
+                    continue
+            elif eof:
+                return
+
+            chunk = f.read(chunk_size)
+            if not chunk:
+                eof = True
+            buf += chunk
+
+
+def normalize_exercise(raw: dict) -> Optional[dict]:
+    """Приводит запись парсера к строке таблицы exercises"""
+    if not raw.get("name") or not raw.get("url"):
+        return None
+
+    row = {field: raw.get(field) for field in EXERCISE_FIELDS}
+    row["name"] = row["name"].strip()[:255]
+    row["gender"] = (row["gender"] or "").lower()
+    row["muscle_group"] = (row["muscle_group"] or "").lower()
+    return row
+
+
+def _insert_ignore_duplicates(dialect_name: str):
+    """INSERT ... ON CONFLICT DO NOTHING для повторных запусков загрузки"""
+    insert = sqlite_insert if dialect_name == "sqlite" else pg_insert
+    return insert(Exercise).on_conflict_do_nothing(
+        index_elements=["url", "gender", "muscle_group"]
+    )
+
+
+async def load_exercises(session: AsyncSession, path: str = DEFAULT_PATH, batch_size: int = BATCH_SIZE) -> int:
+    """Загружает упражнения пачками; повторная загрузка не создаёт дублей"""
+    stmt = _insert_ignore_duplicates(session.bind.dialect.name)
+    batch: List[dict] = []
+    total = 0
+
+    for raw in iter_exercises(path):
+        row = normalize_exercise(raw)
+        if row is None:
+            continue
+        batch.append(row)
+
+        if len(batch) >= batch_size:
+            await session.execute(stmt, batch)
+            total += len(batch)
+            batch = []
+
+    if batch:
+        await session.execute(stmt, batch)
+        total += len(batch)
+
+    await session.commit()
+    return total
+
+
+class ExerciseCatalogCache:
+    """Кэш каталога упражнений в памяти процесса с ключом (gender, muscle_group).
+
+    Загрузка идёт отдельным процессом (main ниже), поэтому свежесть держит ttl.
+    Ключи проверяются по GENDERS / MUSCLE_GROUPS до обращения к кэшу; max_entries —
+    страховка: самые давние записи вытесняются.
+    """
+
+    def __init__(self, ttl: float = 300.0, max_entries: int = (len(GENDERS) + 1) * (len(MUSCLE_GROUPS) + 1)):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._items: "OrderedDict[Tuple[Optional[str], Optional[str]], Tuple[float, List[dict]]]" = OrderedDict()
+
+    async def get(self, session: AsyncSession, gender: Optional[str] = None,
+                  muscle_group: Optional[str] = None) -> List[dict]:
+        key = (gender, muscle_group)
+        cached = self._items.get(key)
+        if cached and time.monotonic() - cached[0] < self.ttl:
+            self._items.move_to_end(key)
+            return cached[1]
+
+        # Один запрос по составному индексу
+        query = select(*(getattr(Exercise, field) for field in ("id",) + EXERCISE_FIELDS))
+        if gender:
+            query = query.where(Exercise.gender == gender)
+        if muscle_group:
+            query = query.where(Exercise.muscle_group == muscle_group)
+        result = await session.execute(query.order_by(Exercise.id))
+        rows = [dict(row._mapping) for row in result]
+
+        self._items[key] = (time.monotonic(), rows)
+        self._items.move_to_end(key)
+        if len(self._items) > self.max_entries:
+            self._items.popitem(last=False)
+        return rows
+
+
+async def main(path: str):
+    from database import get_sessionmaker, dispose_engine
+
+    async with get_sessionmaker()() as session:
+        total = await load_exercises(session, path)
+    await dispose_engine()
+    print(f"✅ Обработано упражнений: {total}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main(sys.argv[1] if len(sys.argv) > 1 else DEFAULT_PATH))
@@ -6,11 +6,15 @@ from aiogram.types import Message, CallbackQuery, InlineKeyboardButton, InlineKe
 from aiogram.filters import Command
 from aiogram.enums.chat_member_status import ChatMemberStatus
 from aiogram.utils.keyboard import InlineKeyboardBuilder
-from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from models.users_tasks import User
-from states import TimeZoneSetup
+from states import TimeZoneSetup, TaskSetup
+from local_time import local_date
+from caches import leaderboard_cache, get_user_place
+from daily_tasks import ensure_user_tasks, toggle_task, add_custom_task
+from learning_stats import get_day_stats
+from replica import read_session, replica_router
 
 router = Router()
 
@@ -20,6 +24,8 @@ INVITE_LINK = "https://t.me/+DyydsMuO8vA5ZTJi"
 # URL вашего мини-приложения - измените на свой
 WEBAPP_URL = "https://f260-82-215-100-140.ngrok-free.app/static/index.html"
 
+TASKS_HEADER = "<b>Задачи, которые ты должен выполнить за день:</b>"
+
 
 def get_invite_keyboard():
     return InlineKeyboardMarkup(
@@ -39,26 +45,9 @@ def get_start_keyboard():
     )
 
 
-def parse_timezone_offset(time_line: str) -> int:
-    """Парсит часовой пояс и возвращает смещение в минутах"""
-    import re
-    match = re.match(r'UTC([+-])(\d{1,2}):?(\d{0,2})', time_line)
-    if not match:
-        return 180  # UTC+3 по умолчанию
-
-    sign = 1 if match.group(1) == '+' else -1
-    hours = int(match.group(2))
-    minutes = int(match.group(3)) if match.group(3) else 0
-
-    return sign * (hours * 60 + minutes)
-
-
 def get_user_local_date(user: User) -> date:
     """Получает локальную дату пользователя"""
-    offset_minutes = parse_timezone_offset(user.time_line)
-    utc_now = datetime.utcnow()
-    user_time = utc_now + timedelta(minutes=offset_minutes)
-    return user_time.date()
+    return local_date(user.time_line)
 
 
 def is_new_day(user: User) -> bool:
@@ -68,20 +57,18 @@ def is_new_day(user: User) -> bool:
 
 
 async def get_leaderboard_text(session: AsyncSession, user_id: int) -> str:
-    top_result = await session.execute(
-        select(User).order_by(User.exp.desc()).limit(15)
-    )
-    top_users = top_result.scalars().all()
+    # Топ берётся из кэша процесса, место пользователя — одним запросом по индексу users.exp
+    top_users = await leaderboard_cache.top(session, limit=15)
 
-    def format_name(user: User) -> str:
-        first = user.first_name or ""
-        last = user.last_name or ""
+    def format_name(first_name, last_name) -> str:
+        first = first_name or ""
+        last = last_name or ""
         full = (first + " " + last).strip()
         return full if full else "Без имени"
 
     leaderboard_lines = [
-        f"{i + 1}. {format_name(user)} — {user.exp} XP"
-        for i, user in enumerate(top_users)
+        f"{i + 1}. {format_name(first_name, last_name)} — {exp} XP"
+        for i, (_, first_name, last_name, exp) in enumerate(top_users)
     ]
 
     leaderboard_block = (
@@ -91,9 +78,7 @@ async def get_leaderboard_text(session: AsyncSession, user_id: int) -> str:
             "</blockquote>"
     )
 
-    all_result = await session.execute(select(User).order_by(User.exp.desc()))
-    all_users = all_result.scalars().all()
-    user_place = next((i + 1 for i, u in enumerate(all_users) if u.telegram_id == user_id), None)
+    user_place = await get_user_place(session, user_id)
     user_place_block = (
         f"<blockquote>🔎 Твоё место в рейтинге: <b>#{user_place}</b></blockquote>"
         if user_place else
@@ -115,21 +100,17 @@ def get_main_menu_keyboard():
     )
 
 
-def get_user_stats_text(user: User) -> str:
+async def get_user_stats_text(session: AsyncSession, user: User) -> str:
     """Формирует текст со статистикой пользователя"""
     total_learned = len(user.eng_learned_words or [])
     streak = user.current_streak or 0
     exp = user.exp or 0
 
-    # Проверяем, изучал ли пользователь что-то сегодня
+    # Сколько слов изучено сегодня — из дневной сводки (одна строка по первичному ключу)
     today_progress = ""
-    if user.words_per_day and user.last_learning_date == get_user_local_date(user):
-        if is_new_day(user):
-            learned_today = 0
-        else:
-            # Здесь можно добавить более точный подсчет слов, изученных сегодня
-            learned_today = min(user.words_per_day, total_learned)
-
+    if user.words_per_day:
+        today_stats = await get_day_stats(session, user.telegram_id, get_user_local_date(user))
+        learned_today = today_stats.words_learned if today_stats else 0
         today_progress = f"\n📚 Сегодня изучено: {learned_today}/{user.words_per_day} слов"
 
     stats_text = (
@@ -161,8 +142,9 @@ async def cmd_start(message: Message, bot, state: FSMContext, session: AsyncSess
     existing_user = await session.get(User, user_id)
     if existing_user:
         # Показываем статистику и главное меню
-        stats_text = get_user_stats_text(existing_user)
-        leaderboard_text = await get_leaderboard_text(session, user_id)
+        async with read_session(user_id, primary=session) as read:
+            stats_text = await get_user_stats_text(read, existing_user)
+            leaderboard_text = await get_leaderboard_text(read, user_id)
 
         full_text = f"{stats_text}\n\n{leaderboard_text}"
 
@@ -264,6 +246,7 @@ async def handle_user_local_time(message: Message, state: FSMContext, session: A
             existing_user.time_line = tz_string
 
         await session.commit()
+        replica_router.mark_write(telegram_id)
         await state.clear()
 
         await message.answer(
@@ -275,8 +258,9 @@ async def handle_user_local_time(message: Message, state: FSMContext, session: A
 
         # Показываем главное меню
         user = existing_user if existing_user else await session.get(User, telegram_id)
-        stats_text = get_user_stats_text(user)
-        leaderboard_text = await get_leaderboard_text(session, telegram_id)
+        async with read_session(telegram_id, primary=session) as read:
+            stats_text = await get_user_stats_text(read, user)
+            leaderboard_text = await get_leaderboard_text(read, telegram_id)
 
         full_text = f"{stats_text}\n\n{leaderboard_text}"
 
@@ -293,6 +277,29 @@ async def handle_user_local_time(message: Message, state: FSMContext, session: A
         )
 
 
+@router.message(TaskSetup.waiting_for_task_text)
+async def handle_task_text(message: Message, state: FSMContext, session: AsyncSession):
+    text = (message.text or "").strip()
+    if not text:
+        await message.answer("Напиши задачу текстом.")
+        return
+
+    user = await session.get(User, message.from_user.id)
+    if not user:
+        await state.clear()
+        return
+
+    await add_custom_task(session, user.telegram_id, text, get_user_local_date(user))
+    await state.clear()
+
+    tasks = await ensure_user_tasks(session, user.telegram_id)
+    await message.answer(
+        TASKS_HEADER,
+        parse_mode="HTML",
+        reply_markup=get_tasks_keyboard(tasks)
+    )
+
+
 @router.message()
 async def show_main_menu(message: Message, session: AsyncSession):
     user_id = message.from_user.id
@@ -307,8 +314,9 @@ async def show_main_menu(message: Message, session: AsyncSession):
         return
 
     # Показываем статистику и главное меню
-    stats_text = get_user_stats_text(existing_user)
-    leaderboard_text = await get_leaderboard_text(session, user_id)
+    async with read_session(user_id, primary=session) as read:
+        stats_text = await get_user_stats_text(read, existing_user)
+        leaderboard_text = await get_leaderboard_text(read, user_id)
 
     full_text = f"{stats_text}\n\n{leaderboard_text}"
 
@@ -319,29 +327,48 @@ async def show_main_menu(message: Message, session: AsyncSession):
     )
 
 
-COMMON_TASKS = [
-    {"id": "wake_up", "text": "⏰ Подъём до 7:00"},
-    {"id": "learn_words", "text": "📘 Учить 5 слов"},
-    {"id": "workout", "text": "🏋️ Тренировка"},
-]
-
-
-@router.callback_query(F.data == "my_tasks")
-async def show_common_tasks(callback: CallbackQuery):
+def get_tasks_keyboard(tasks):
     builder = InlineKeyboardBuilder()
 
-    for task in COMMON_TASKS:
+    for task in tasks:
+        mark = "✅" if task.is_done else "⬜"
         builder.button(
-            text=task["text"],
-            callback_data=f"task_{task['id']}"
+            text=f"{mark} {task.text}",
+            callback_data=f"task_toggle:{task.id}"
         )
 
     builder.button(text="+ Добавить задачу", callback_data="add_task")
     builder.adjust(1)  # каждая задача на отдельной строке
+    return builder.as_markup()
+
+
+@router.callback_query(F.data == "my_tasks")
+async def show_common_tasks(callback: CallbackQuery, session: AsyncSession):
+    tasks = await ensure_user_tasks(session, callback.from_user.id)
 
     await callback.message.edit_text(
-        "<b>Задачи, которые ты должен выполнить за день:</b>",
+        TASKS_HEADER,
         parse_mode="HTML",
-        reply_markup=builder.as_markup()
+        reply_markup=get_tasks_keyboard(tasks)
     )
-    await callback.answer()
\ No newline at end of file
+    await callback.answer()
+
+
+@router.callback_query(F.data.startswith("task_toggle:"))
+async def toggle_user_task(callback: CallbackQuery, session: AsyncSession):
+    task_id = int(callback.data.split(":", 1)[1])
+
+    if not await toggle_task(session, callback.from_user.id, task_id):
+        await callback.answer("Задача не найдена", show_alert=True)
+        return
+
+    tasks = await ensure_user_tasks(session, callback.from_user.id)
+    await callback.message.edit_reply_markup(reply_markup=get_tasks_keyboard(tasks))
+    await callback.answer()
+
+
+@router.callback_query(F.data == "add_task")
+async def ask_task_text(callback: CallbackQuery, state: FSMContext):
+    await callback.message.answer("✏️ Напиши текст задачи на сегодня:")
+    await callback.answer()
+    await state.set_state(TaskSetup.waiting_for_task_text)
@@ -0,0 +1,104 @@
+"""
+Журнал изучения слов и дневная сводка.
+
+learn_words добавляет строки в learning_events и в той же транзакции
+увеличивает счётчики user_daily_stats за локальную дату пользователя
+(INSERT ... ON CONFLICT DO UPDATE). Статистика читается из сводки: день —
+по первичному ключу, неделя и история — по диапазону ключа.
+"""
+from datetime import date, timedelta
+from typing import Iterable, List, Optional, Tuple
+
+from sqlalchemy import select, func
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from models import LearningEvent, UserDailyStats
+
+EVENT_LEARNED = "learned"
+EXP_PER_WORD = 10  # очков опыта за новое слово
+MAX_HISTORY_DAYS = 90
+
+
+def _insert(dialect_name: str):
+    return sqlite_insert if dialect_name == "sqlite" else pg_insert
+
+
+def advance_streak(last_learning_date: Optional[date], streak: int, day: date) -> Tuple[date, int]:
+    """Streak после занятия в day: +1 за занятие на следующий день, сброс после пропуска"""
+    if last_learning_date == day:
+        return day, streak
+    if last_learning_date == day - timedelta(days=1):
+        return day, (streak or 0) + 1
+    return day, 1
+
+
+def learning_event_rows(telegram_id: int, word_ids: Iterable[int], exp_per_word: int, for_date: date) -> List[dict]:
+    return [
+        {"telegram_id": telegram_id, "word_id": word_id, "event_type": EVENT_LEARNED,
+         "exp": exp_per_word, "local_date": for_date}
+        for word_id in word_ids
+    ]
+
+
+async def upsert_daily_stats(session: AsyncSession, rows: List[dict]):
+    """Прибавляет счётчики к сводке; строки — telegram_id, local_date, words_learned, exp_gained, trainings"""
+    statement = _insert(session.bind.dialect.name)(UserDailyStats)
+    await session.execute(statement.on_conflict_do_update(
+        index_elements=["telegram_id", "local_date"],
+        set_={
+            "words_learned": UserDailyStats.words_learned + statement.excluded.words_learned,
+            "exp_gained": UserDailyStats.exp_gained + statement.excluded.exp_gained,
+            "trainings": UserDailyStats.trainings + statement.excluded.trainings,
+        },
+    ), rows)
+
+
+async def record_learning(session: AsyncSession, telegram_id: int, word_ids: Iterable[int],
+                          exp_per_word: int, for_date: date):
+    """Записывает изученные слова и обновляет сводку за день; commit делает вызывающий код"""
+    word_ids = list(word_ids)
+    if word_ids:
+        await session.execute(
+            LearningEvent.__table__.insert(), learning_event_rows(telegram_id, word_ids, exp_per_word, for_date)
+        )
+
+    words = len(word_ids)
+    await upsert_daily_stats(session, [{
+        "telegram_id": telegram_id,
+        "local_date": for_date,
+        "words_learned": words,
+        "exp_gained": words * exp_per_word,
+        "trainings": 1,
+    }])
+
+
+async def get_day_stats(session: AsyncSession, telegram_id: int, day: date) -> Optional[UserDailyStats]:
+    result = await session.execute(
+        select(UserDailyStats).where(UserDailyStats.telegram_id == telegram_id, UserDailyStats.local_date == day)
+    )
+    return result.scalar_one_or_none()
+
+
+async def get_history(session: AsyncSession, telegram_id: int, today: date, days: int = 7) -> List[UserDailyStats]:
+    """Сводка за последние days дней включая today (дни без занятий не возвращаются)"""
+    days = max(1, min(days, MAX_HISTORY_DAYS))
+    result = await session.execute(
+        select(UserDailyStats)
+        .where(
+            UserDailyStats.telegram_id == telegram_id,
+            UserDailyStats.local_date > today - timedelta(days=days),
+            UserDailyStats.local_date <= today,
+        )
+        .order_by(UserDailyStats.local_date)
+    )
+    return list(result.scalars().all())
+
+
+async def get_training_count(session: AsyncSession, telegram_id: int) -> int:
+    result = await session.execute(
+        select(func.coalesce(func.sum(UserDailyStats.trainings), 0))
+        .where(UserDailyStats.telegram_id == telegram_id)
+    )
+    return result.scalar_one()
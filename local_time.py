@@ -0,0 +1,22 @@
+import re
+from datetime import date, datetime, timedelta
+from typing import Optional
+
+
+def parse_timezone_offset(time_line: str) -> int:
+    """Парсит часовой пояс и возвращает смещение в минутах"""
+    match = re.match(r'UTC([+-])(\d{1,2}):?(\d{0,2})', time_line or "")
+    if not match:
+        return 180  # UTC+3 по умолчанию
+
+    sign = 1 if match.group(1) == '+' else -1
+    hours = int(match.group(2))
+    minutes = int(match.group(3)) if match.group(3) else 0
+
+    return sign * (hours * 60 + minutes)
+
+
+def local_date(time_line: str, utc_now: Optional[datetime] = None) -> date:
+    """Локальная дата для часового пояса вида UTC+03:00"""
+    utc_now = utc_now or datetime.utcnow()
+    return (utc_now + timedelta(minutes=parse_timezone_offset(time_line))).date()
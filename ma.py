@@ -1,34 +1,45 @@
 import os
+import json
+import base64
 import random
-from datetime import date
-from typing import List, Optional
+from datetime import date, datetime, timedelta
+from typing import List, Literal, Optional
 from contextlib import asynccontextmanager
 
-from fastapi import FastAPI, HTTPException, Depends
+from fastapi import FastAPI, HTTPException, Depends, Request
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import FileResponse
-from sqlalchemy import select, func
-from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine, async_sessionmaker
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import FileResponse, StreamingResponse, JSONResponse, Response
+from sqlalchemy import select, func, case
+from sqlalchemy.ext.asyncio import AsyncSession
 from pydantic import BaseModel
-from dotenv import load_dotenv
 import mimetypes
 
-from models import User, Word, Base
-
-# Загрузка переменных окружения
-load_dotenv()
-
-DATABASE_URL = os.getenv("DATABASE_URL")
-if not DATABASE_URL:
-    raise ValueError("DATABASE_URL not set in environment variables")
-
-# Настройка асинхронного движка
-async_engine = create_async_engine(DATABASE_URL, echo=False)
-AsyncSessionLocal = async_sessionmaker(
-    bind=async_engine,
-    expire_on_commit=False,
-)
+from models import User, Word, Exercise, WordTombstone
+from models.eng_words import current_catalog_version_query
+from exercise_catalog import ExerciseCatalogCache, GENDERS, MUSCLE_GROUPS
+from query_stats import QueryBudgetMiddleware
+from admission import AdmissionMiddleware
+from metrics import PrometheusMiddleware, metrics_response_body, archive_process_file
+from database import get_sessionmaker, dispose_engine
+from caches import word_id_index, word_cache, json_array
+from startup import startup, cache_warmer
+from replica import replica_router, READ_YOUR_WRITES_COOKIE
+from distractors import distractor_index
+from word_search import word_search_index, pg_search_query, normalize as normalize_query
+from local_time import local_date
+from learning_stats import MAX_HISTORY_DAYS, EXP_PER_WORD, advance_streak, record_learning, get_history, get_training_count
+from write_behind import learn_buffer, BufferFull, PendingProgress
+from reviews import MAX_DUE_ITEMS, MAX_GRADES, schedule_reviews, unschedule_reviews, get_due_reviews, grade_reviews
+
+
+# Движок и сессии создаются лениво (database.py) — импорт модуля не подключается к БД
+def __getattr__(name):
+    if name in ("async_engine", "AsyncSessionLocal"):
+        import database
+        return getattr(database, name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 
 # Pydantic модели
@@ -51,6 +62,82 @@ class UserUpdate(BaseModel):
     exp: Optional[int] = None
 
 
+class WordSetPatch(BaseModel):
+    add: List[int] = []
+    remove: List[int] = []
+
+
+class ProgressOp(BaseModel):
+    op: Literal["add", "remove"]
+    field: Literal["learned", "skipped"]
+    word_ids: List[int]
+
+
+class ProgressRequest(BaseModel):
+    ops: List[ProgressOp]
+
+
+class ProgressResponse(BaseModel):
+    learned_words: int
+    skipped_words: int
+    version: int
+
+
+class QuizOption(BaseModel):
+    id: int
+    text: str
+
+
+class QuizItem(BaseModel):
+    word_id: int
+    question: str
+    options: List[QuizOption]
+    answer_id: int
+
+
+class QuizResponse(BaseModel):
+    direction: str
+    items: List[QuizItem]
+
+
+class ReviewItem(BaseModel):
+    word_id: int
+    eng: str
+    rus: str
+    transcript: Optional[str]
+    due_at: datetime
+    interval_days: int
+    ease: float
+    repetitions: int
+
+
+class ReviewsDueResponse(BaseModel):
+    items: List[ReviewItem]
+    next_due_at: Optional[datetime]  # ближайшее повторение после выданных, если всё выдано
+
+
+class ReviewGrade(BaseModel):
+    word_id: int
+    grade: int  # 0–5, как в SM-2
+
+
+class ReviewGradesRequest(BaseModel):
+    grades: List[ReviewGrade]
+
+
+class ReviewState(BaseModel):
+    word_id: int
+    due_at: datetime
+    interval_days: int
+    ease: float
+    repetitions: int
+
+
+class ReviewGradesResponse(BaseModel):
+    updated: List[ReviewState]
+    missing: List[int]  # слова без записи в очереди (не изучены или удалены из изученных)
+
+
 class UserResponse(BaseModel):
     telegram_id: int
     username: Optional[str]
@@ -83,27 +170,77 @@ class WordsByIdsRequest(BaseModel):
     ids: List[int]
 
 
+class WordsPageResponse(BaseModel):
+    items: List[WordResponse]
+    next_cursor: Optional[str]
+
+
+class ExerciseResponse(BaseModel):
+    id: int
+    name: str
+    gender: str
+    muscle_group: str
+    gif_url: Optional[str]
+    description: Optional[str]
+    url: str
+
+    class Config:
+        from_attributes = True
+
+
 # Dependency для получения асинхронной сессии БД
 async def get_db() -> AsyncSession:
-    async with AsyncSessionLocal() as session:
+    async with get_sessionmaker()() as session:
         try:
             yield session
         finally:
             await session.close()
 
 
+# Сессия для чтения: реплика, если она не отстаёт больше REPLICA_MAX_LAG,
+# кроме пользователей, которые только что писали (read-your-writes)
+async def get_read_db(request: Request) -> AsyncSession:
+    telegram_id = request.path_params.get("telegram_id")
+    telegram_id = int(telegram_id) if telegram_id and telegram_id.lstrip("-").isdigit() else None
+    pinned = READ_YOUR_WRITES_COOKIE in request.cookies
+    if telegram_id is not None:
+        # Отложенный learn-words этого пользователя (write-behind) записывается до чтения
+        await learn_buffer.wait_written(telegram_id)
+
+    async with replica_router.read_session(telegram_id, pin_primary=pinned) as session:
+        yield session
+
+
+def mark_write(response: Response, telegram_id: int):
+    """После записи чтения клиента на время допустимого отставания идут на основную базу"""
+    replica_router.mark_write(telegram_id)
+    response.set_cookie(
+        READ_YOUR_WRITES_COOKIE, "1",
+        max_age=max(1, int(replica_router.max_lag + 0.999)), httponly=True, samesite="lax",
+    )
+
+
 # Контекстный менеджер для жизненного цикла приложения
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    # Startup
-    async with async_engine.begin() as conn:
-        await conn.run_sync(Base.metadata.create_all)
+    # Startup: create_all в разработке, проверка ревизии Alembic в production;
+    # пул и кэши прогреваются параллельно
+    await startup("api", warmers=[
+        ("word_ids", cache_warmer(word_id_index.get)),
+        # Индекс дистракторов собирается в фоне, квиз до этого берёт случайные варианты
+        ("distractors", cache_warmer(lambda session: distractor_index.check(session, replica_router.read_session))),
+    ])
+    # Буфер learn-words (LEARN_WRITE_BEHIND=1): сначала дописывает журналы упавших процессов
+    await learn_buffer.start()
     print("✅ База данных инициализирована")
 
     yield
 
     # Shutdown
-    await async_engine.dispose()
+    await learn_buffer.stop()
+    await distractor_index.stop()
+    await dispose_engine()
+    archive_process_file()
     print("🔌 Соединение с базой данных закрыто")
 
 
@@ -114,6 +251,9 @@ app = FastAPI(
     lifespan=lifespan
 )
 
+# Rate limit и ограничение нагрузки на базу (внутри CORS, чтобы 429/503 читались браузером)
+app.add_middleware(AdmissionMiddleware)
+
 # CORS
 app.add_middleware(
     CORSMiddleware,
@@ -123,10 +263,15 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Метрики Prometheus
+app.add_middleware(PrometheusMiddleware)
+
+# Учёт SQL-запросов на каждый HTTP-запрос
+app.add_middleware(QueryBudgetMiddleware)
+
 
 app.mount("/static", StaticFiles(directory="static"), name="static")
 
-from fastapi.responses import Response
 @app.get("/static/{file_path:path}")
 async def serve_static_file(file_path: str):
     file_location = f"static/{file_path}"
@@ -171,6 +316,13 @@ async def health_check():
     return {"status": "healthy", "message": "Language Learning API is running"}
 
 
+@app.get("/metrics")
+async def metrics():
+    """Метрики в формате Prometheus"""
+    body, content_type = metrics_response_body()
+    return Response(content=body, media_type=content_type)
+
+
 # Проверка статических файлов
 @app.get("/check-static")
 async def check_static():
@@ -199,35 +351,88 @@ async def check_static():
     }
 
 
+# Условные GET: ETag строится из users.version, повторный запрос с If-None-Match
+# проверяется одним чтением версии по первичному ключу
+PROFILE_CACHE_CONTROL = "private, no-cache"
+
+
+def make_etag(*parts) -> str:
+    return '"' + "-".join(str(part) for part in parts) + '"'
+
+
+def etag_matches(request: Request, etag: str) -> bool:
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    return etag in (tag.strip().removeprefix("W/") for tag in header.split(","))
+
+
+def not_modified(etag: str) -> Response:
+    return Response(status_code=304, headers={"ETag": etag, "Cache-Control": PROFILE_CACHE_CONTROL})
+
+
+def with_etag(payload, etag: str) -> JSONResponse:
+    return JSONResponse(jsonable_encoder(payload), headers={"ETag": etag, "Cache-Control": PROFILE_CACHE_CONTROL})
+
+
+async def get_or_create_default_user(session: AsyncSession, telegram_id: int):
+    """Пользователь с базовыми данными; возвращает (пользователь, создан ли он)"""
+    user = await session.get(User, telegram_id)
+    if user:
+        return user, False
+    user = User(
+        telegram_id=telegram_id,
+        first_name="User",
+        exp=0,
+        words_per_day=None,
+        eng_learned_words=[],
+        eng_skipped_words=[],
+        current_streak=0
+    )
+    session.add(user)
+    await session.commit()
+    await session.refresh(user)
+    return user, True
+
+
 # Пользователи
 @app.get("/api/users/{telegram_id}", response_model=UserResponse)
-async def get_user(telegram_id: int, db: AsyncSession = Depends(get_db)):
+async def get_user(telegram_id: int, request: Request, db: AsyncSession = Depends(get_read_db)):
     """Получение данных пользователя по Telegram ID"""
+    if request.headers.get("if-none-match"):
+        version = (await db.execute(
+            select(User.version).where(User.telegram_id == telegram_id)
+        )).scalar_one_or_none()
+        if version is not None and etag_matches(request, make_etag("user", telegram_id, version)):
+            return not_modified(make_etag("user", telegram_id, version))
+
     result = await db.execute(
         select(User).where(User.telegram_id == telegram_id)
     )
     user = result.scalar_one_or_none()
 
+    created = False
     if not user:
-        # Создаем нового пользователя с базовыми данными
-        user = User(
-            telegram_id=telegram_id,
-            first_name="User",
-            exp=0,
-            words_per_day=None,
-            eng_learned_words=[],
-            eng_skipped_words=[],
-            current_streak=0
-        )
-        db.add(user)
-        await db.commit()
-        await db.refresh(user)
+        # Создаем нового пользователя с базовыми данными (запись — только в основную базу).
+        # Если чтение уже шло с основной базы, пишем через ту же сессию: второе
+        # соединение из того же пула при исчерпанном пуле ждало бы само себя
+        if replica_router.is_replica(db):
+            await db.close()
+            async with get_sessionmaker()() as primary:
+                user, created = await get_or_create_default_user(primary, telegram_id)
+        else:
+            user, created = await get_or_create_default_user(db, telegram_id)
 
-    return user
+    response = with_etag(UserResponse.model_validate(user), make_etag("user", telegram_id, user.version))
+    if created:
+        mark_write(response, telegram_id)
+    return response
 
 
 @app.post("/api/users", response_model=UserResponse)
-async def create_user(user_data: UserCreate, db: AsyncSession = Depends(get_db)):
+async def create_user(user_data: UserCreate, response: Response, db: AsyncSession = Depends(get_db)):
     """Создание нового пользователя"""
     # Проверяем, существует ли пользователь
     result = await db.execute(
@@ -251,55 +456,322 @@ async def create_user(user_data: UserCreate, db: AsyncSession = Depends(get_db))
     db.add(user)
     await db.commit()
     await db.refresh(user)
+    mark_write(response, user.telegram_id)
     return user
 
 
 @app.put("/api/users/{telegram_id}", response_model=UserResponse)
-async def update_user(telegram_id: int, user_data: UserUpdate, db: AsyncSession = Depends(get_db)):
+async def update_user(telegram_id: int, user_data: UserUpdate, response: Response,
+                      db: AsyncSession = Depends(get_db)):
     """Обновление данных пользователя"""
-    result = await db.execute(
-        select(User).where(User.telegram_id == telegram_id)
-    )
+    changes = user_data.model_dump(exclude_unset=True)
+    query = select(User).where(User.telegram_id == telegram_id)
+    if "eng_learned_words" in changes:
+        query = query.with_for_update()  # как в apply_progress_ops: очередь повторения считается по этой строке
+    result = await db.execute(query)
     user = result.scalar_one_or_none()
 
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
 
+    learned_before = set(user.eng_learned_words or [])
     # Обновляем только переданные поля
-    for field, value in user_data.model_dump(exclude_unset=True).items():
+    for field, value in changes.items():
         setattr(user, field, value)
 
+    # Очередь повторения следует за списком изученных
+    if "eng_learned_words" in changes:
+        learned_after = set(user.eng_learned_words or [])
+        await schedule_reviews(db, ((telegram_id, word_id) for word_id in learned_after - learned_before))
+        await unschedule_reviews(db, telegram_id, sorted(learned_before - learned_after))
+
     await db.commit()
     await db.refresh(user)
+    mark_write(response, telegram_id)
     return user
 
 
+# Изменения списков слов: клиент передаёт только добавленные и удалённые id
+MAX_PROGRESS_WORDS = 500  # id во всех операциях одного запроса
+WORD_SET_FIELDS = {"learned": "eng_learned_words", "skipped": "eng_skipped_words"}
+
+
+def apply_word_op(current: Optional[List[int]], op: str, word_ids: List[int]) -> List[int]:
+    """Добавление или удаление id с сохранением порядка списка"""
+    current = list(current or [])
+    if op == "remove":
+        removed = set(word_ids)
+        return [word_id for word_id in current if word_id not in removed]
+
+    present = set(current)
+    for word_id in word_ids:
+        if word_id not in present:
+            current.append(word_id)
+            present.add(word_id)
+    return current
+
+
+async def apply_progress_ops(db: AsyncSession, response: Response, telegram_id: int,
+                             ops: List[ProgressOp]) -> ProgressResponse:
+    """Применяет операции по порядку в одной транзакции"""
+    if sum(len(op.word_ids) for op in ops) > MAX_PROGRESS_WORDS:
+        raise HTTPException(status_code=400, detail="Too many words in one request")
+
+    # Строка блокируется до commit, чтобы параллельные изменения не затирали друг друга
+    result = await db.execute(
+        select(User).where(User.telegram_id == telegram_id).with_for_update()
+    )
+    user = result.scalar_one_or_none()
+
+    if not user:
+        raise HTTPException(status_code=404, detail="User not found")
+
+    learned_before = set(user.eng_learned_words or [])
+    for op in ops:
+        field = WORD_SET_FIELDS[op.field]
+        setattr(user, field, apply_word_op(getattr(user, field), op.op, op.word_ids))
+
+    # Очередь повторения следует за списком изученных
+    learned_after = set(user.eng_learned_words or [])
+    await schedule_reviews(db, ((telegram_id, word_id) for word_id in learned_after - learned_before))
+    await unschedule_reviews(db, telegram_id, sorted(learned_before - learned_after))
+
+    await db.commit()
+    await db.refresh(user)
+    mark_write(response, telegram_id)
+    return ProgressResponse(
+        learned_words=len(user.eng_learned_words or []),
+        skipped_words=len(user.eng_skipped_words or []),
+        version=user.version,
+    )
+
+
+def patch_ops(field: str, patch: WordSetPatch) -> List[ProgressOp]:
+    ops = []
+    if patch.add:
+        ops.append(ProgressOp(op="add", field=field, word_ids=patch.add))
+    if patch.remove:
+        ops.append(ProgressOp(op="remove", field=field, word_ids=patch.remove))
+    return ops
+
+
+@app.patch("/api/users/{telegram_id}/learned-words", response_model=ProgressResponse)
+async def patch_learned_words(telegram_id: int, patch: WordSetPatch, response: Response,
+                              db: AsyncSession = Depends(get_db)):
+    """Добавление/удаление изученных слов (сначала add, затем remove)"""
+    return await apply_progress_ops(db, response, telegram_id, patch_ops("learned", patch))
+
+
+@app.patch("/api/users/{telegram_id}/skipped-words", response_model=ProgressResponse)
+async def patch_skipped_words(telegram_id: int, patch: WordSetPatch, response: Response,
+                              db: AsyncSession = Depends(get_db)):
+    """Добавление/удаление пропущенных слов (сначала add, затем remove)"""
+    return await apply_progress_ops(db, response, telegram_id, patch_ops("skipped", patch))
+
+
+@app.post("/api/users/{telegram_id}/progress", response_model=ProgressResponse)
+async def update_progress(telegram_id: int, request: ProgressRequest, response: Response,
+                          db: AsyncSession = Depends(get_db)):
+    """Пакет операций над изученными и пропущенными словами одной транзакцией"""
+    return await apply_progress_ops(db, response, telegram_id, request.ops)
+
+
 # Слова
+EMOJI_MAX_LENGTH = 10  # image_data длиной до 10 символов — эмодзи, а не base64
+SOUND_KEYS = ("gtts", "voice", "audio")
+MEDIA_CACHE_CONTROL = "public, max-age=604800"
+
+
+def extract_sound_base64(sound_data) -> Optional[str]:
+    """base64 звука из sound_data (строка или {gtts|voice|audio: base64})"""
+    if isinstance(sound_data, str):
+        return sound_data
+    if isinstance(sound_data, dict):
+        for key in SOUND_KEYS:
+            if sound_data.get(key):
+                return sound_data[key]
+    return None
+
+
+def word_lite_query():
+    """Лёгкая проекция слова: без blob-ов, только признаки наличия медиа"""
+    return select(
+        Word.id,
+        Word.eng,
+        Word.rus,
+        Word.transcript,
+        case(
+            (func.length(Word.image_data) <= EMOJI_MAX_LENGTH, Word.image_data),
+            else_=None
+        ).label("image_emoji"),
+        (func.length(Word.image_data) > EMOJI_MAX_LENGTH).label("has_image"),
+        Word.sound_data.isnot(None).label("has_sound"),
+    )
+
+
+def word_lite_dict(row) -> dict:
+    return {
+        "id": row.id,
+        "eng": row.eng,
+        "rus": row.rus,
+        "transcript": row.transcript,
+        "image_emoji": row.image_emoji,
+        "image_url": f"/api/words/{row.id}/image" if row.has_image else None,
+        "sound_url": f"/api/words/{row.id}/sound" if row.has_sound else None,
+    }
+
+
 @app.get("/api/words", response_model=List[WordResponse])
-async def get_words(skip: int = 0, limit: int = 100, db: AsyncSession = Depends(get_db)):
-    """Получение списка слов с пагинацией"""
+async def get_words(skip: int = 0, limit: int = 100, db: AsyncSession = Depends(get_read_db)):
+    """Получение списка слов с пагинацией (устаревший вариант, см. /api/words/page)"""
     result = await db.execute(
-        select(Word).offset(skip).limit(limit)
+        select(Word).order_by(Word.id).offset(skip).limit(limit)
     )
     words = result.scalars().all()
     return words
 
 
-@app.get("/api/words/{word_id}", response_model=WordResponse)
-async def get_word(word_id: int, db: AsyncSession = Depends(get_db)):
-    """Получение конкретного слова по ID"""
-    result = await db.execute(
-        select(Word).where(Word.id == word_id)
+def encode_cursor(last_id: int) -> str:
+    """Непрозрачный курсор страницы: base64url от {"after": id}"""
+    raw = json.dumps({"after": last_id}, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> int:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        return int(json.loads(raw)["after"])
+    except (ValueError, KeyError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+@app.get("/api/words/page", response_model=WordsPageResponse)
+async def get_words_page(cursor: Optional[str] = None, limit: int = 100, db: AsyncSession = Depends(get_read_db)):
+    """Keyset-пагинация по Word.id: время ответа не зависит от глубины страницы"""
+    if limit <= 0:
+        raise HTTPException(status_code=400, detail="Limit must be positive")
+    limit = min(limit, 100)
+
+    query = select(Word).order_by(Word.id).limit(limit + 1)
+    if cursor:
+        query = query.where(Word.id > decode_cursor(cursor))
+
+    result = await db.execute(query)
+    words = result.scalars().all()
+
+    next_cursor = encode_cursor(words[limit - 1].id) if len(words) > limit else None
+    return {"items": words[:limit], "next_cursor": next_cursor}
+
+
+@app.get("/api/words/changes")
+async def get_word_changes(since: int = 0, db: AsyncSession = Depends(get_read_db)):
+    """Дельта каталога слов: добавленные, изменённые и удалённые после версии since.
+
+    Клиент сохраняет полученный version и передаёт его в следующий раз как since;
+    удаления применяются до изменений. since=0 — полный снимок каталога, включая
+    слова с version=0 (вставленные в обход ORM без insert_words()).
+    """
+    if since < 0:
+        raise HTTPException(status_code=400, detail="since must be non-negative")
+
+    version = (await db.execute(current_catalog_version_query())).scalar_one_or_none() or 0
+    if since == 0:
+        changed = await db.execute(
+            word_lite_query().where(Word.version <= version).order_by(Word.version, Word.id)
+        )
+        return {"version": version, "changed": [word_lite_dict(row) for row in changed], "deleted": []}
+    if since >= version:
+        return {"version": version, "changed": [], "deleted": []}
+
+    changed = await db.execute(
+        word_lite_query()
+        .where(Word.version > since, Word.version <= version)
+        .order_by(Word.version, Word.id)
     )
-    word = result.scalar_one_or_none()
+    deleted = await db.execute(
+        select(WordTombstone.word_id)
+        .where(WordTombstone.version > since, WordTombstone.version <= version)
+        .order_by(WordTombstone.version)
+    )
+
+    return {
+        "version": version,
+        "changed": [word_lite_dict(row) for row in changed],
+        "deleted": deleted.scalars().all(),
+    }
+
+
+MAX_SEARCH_RESULTS = 50
+
+
+@app.get("/api/words/search")
+async def search_words(q: str, limit: int = 20, db: AsyncSession = Depends(get_read_db)):
+    """Поиск по eng/rus: точное совпадение, префикс, затем похожие (триграммы)"""
+    q = normalize_query(q)
+    if not q:
+        raise HTTPException(status_code=400, detail="Empty query")
+    if len(q) > 100:
+        raise HTTPException(status_code=400, detail="Query too long")
+    limit = max(1, min(limit, MAX_SEARCH_RESULTS))
+
+    if db.bind.dialect.name == "postgresql":
+        result = await db.execute(pg_search_query(word_lite_query(), q, limit))
+        return [word_lite_dict(row) for row in result]
+
+    # SQLite: ранжирование по индексу в памяти, затем лёгкие строки по первичному ключу
+    index = await word_search_index.get(db)
+    ids = index.search(q, limit)
+    if not ids:
+        return []
+    result = await db.execute(word_lite_query().where(Word.id.in_(ids)))
+    rows = {row.id: row for row in result}
+    return [word_lite_dict(rows[word_id]) for word_id in ids if word_id in rows]
+
+
+@app.get("/api/words/{word_id}", response_model=WordResponse)
+async def get_word(word_id: int, db: AsyncSession = Depends(get_read_db)):
+    """Получение конкретного слова по ID (готовый JSON из кэша слов)"""
+    payload = await word_cache.get(db, word_id)
 
-    if not word:
+    if payload is None:
         raise HTTPException(status_code=404, detail="Word not found")
-    return word
+    return Response(content=payload, media_type="application/json")
+
+
+@app.get("/api/words/{word_id}/image")
+async def get_word_image(word_id: int, db: AsyncSession = Depends(get_read_db)):
+    """Картинка слова отдельным ресурсом (кэшируется клиентом)"""
+    result = await db.execute(select(Word.image_data).where(Word.id == word_id))
+    image_data = result.scalar_one_or_none()
+
+    if not image_data or len(image_data) <= EMOJI_MAX_LENGTH:
+        raise HTTPException(status_code=404, detail="Image not found")
+
+    return Response(
+        content=base64.b64decode(image_data.split(",")[-1]),
+        media_type="image/png",
+        headers={"Cache-Control": MEDIA_CACHE_CONTROL}
+    )
+
+
+@app.get("/api/words/{word_id}/sound")
+async def get_word_sound(word_id: int, db: AsyncSession = Depends(get_read_db)):
+    """Озвучка слова отдельным ресурсом (кэшируется клиентом)"""
+    result = await db.execute(select(Word.sound_data).where(Word.id == word_id))
+    sound_base64 = extract_sound_base64(result.scalar_one_or_none())
+
+    if not sound_base64:
+        raise HTTPException(status_code=404, detail="Sound not found")
+
+    return Response(
+        content=base64.b64decode(sound_base64.split(",")[-1]),
+        media_type="audio/mpeg",
+        headers={"Cache-Control": MEDIA_CACHE_CONTROL}
+    )
 
 
 @app.get("/api/words/random/{count}", response_model=List[WordResponse])
-async def get_random_words(count: int, exclude: Optional[str] = None, db: AsyncSession = Depends(get_db)):
+async def get_random_words(count: int, exclude: Optional[str] = None, db: AsyncSession = Depends(get_read_db)):
     """Получение случайных слов для изучения"""
     if count <= 0:
         raise HTTPException(status_code=400, detail="Count must be positive")
@@ -307,26 +779,27 @@ async def get_random_words(count: int, exclude: Optional[str] = None, db: AsyncS
     if count > 100:
         count = 100  # Ограничиваем максимальное количество
 
-    query = select(Word)
-
     # Исключаем указанные ID
+    exclude_ids = []
     if exclude:
         try:
             exclude_ids = [int(x) for x in exclude.split(',') if x.strip()]
-            if exclude_ids:
-                query = query.where(~Word.id.in_(exclude_ids))
         except ValueError:
             raise HTTPException(status_code=400, detail="Invalid exclude parameter")
 
-    # Получаем случайные слова
-    result = await db.execute(query.order_by(func.random()).limit(count))
-    words = result.scalars().all()
+    # Случайные id выбираем из индекса в памяти, а не ORDER BY random() по всей таблице
+    word_ids = await word_id_index.sample(db, count, exclude_ids)
+    if not word_ids:
+        return []
 
-    return words
+    payloads = list((await word_cache.get_many(db, word_ids)).values())
+    random.shuffle(payloads)
+
+    return Response(content=json_array(payloads), media_type="application/json")
 
 
 @app.post("/api/words/by-ids", response_model=List[WordResponse])
-async def get_words_by_ids(request: WordsByIdsRequest, db: AsyncSession = Depends(get_db)):
+async def get_words_by_ids(request: WordsByIdsRequest, db: AsyncSession = Depends(get_read_db)):
     """Получение слов по списку ID"""
     if not request.ids:
         return []
@@ -334,17 +807,231 @@ async def get_words_by_ids(request: WordsByIdsRequest, db: AsyncSession = Depend
     if len(request.ids) > 100:
         raise HTTPException(status_code=400, detail="Too many IDs requested")
 
+    # Из базы догружаются только промахи кэша; порядок — как в запросе
+    payloads = await word_cache.get_many(db, request.ids)
+    return Response(
+        content=json_array(payloads[word_id] for word_id in dict.fromkeys(request.ids) if word_id in payloads),
+        media_type="application/json"
+    )
+
+
+# Колода для офлайн-изучения
+DECK_YIELD_PER = 500
+DECK_CHUNK_SIZE = 64 * 1024
+
+
+async def stream_deck(learned_ids: set, skipped_ids: set, include_learned: bool):
+    """NDJSON по серверному курсору: в памяти не больше одной пачки строк"""
+    async with replica_router.read_session() as session:
+        result = await session.stream(
+            word_lite_query().order_by(Word.id).execution_options(yield_per=DECK_YIELD_PER)
+        )
+
+        buffer = []
+        size = 0
+        async for row in result:
+            if row.id in skipped_ids:
+                continue
+            learned = row.id in learned_ids
+            if learned and not include_learned:
+                continue
+
+            line = json.dumps({**word_lite_dict(row), "learned": learned}, ensure_ascii=False) + "\n"
+            buffer.append(line)
+            size += len(line)
+            if size >= DECK_CHUNK_SIZE:
+                yield "".join(buffer)
+                buffer = []
+                size = 0
+
+        if buffer:
+            yield "".join(buffer)
+
+
+@app.get("/api/users/{telegram_id}/deck")
+async def get_user_deck(telegram_id: int, include_learned: bool = False, db: AsyncSession = Depends(get_read_db)):
+    """Вся колода пользователя в формате NDJSON для кэширования и офлайн-изучения"""
     result = await db.execute(
-        select(Word).where(Word.id.in_(request.ids))
+        select(User.eng_learned_words, User.eng_skipped_words).where(User.telegram_id == telegram_id)
     )
-    words = result.scalars().all()
-    return words
+    row = result.one_or_none()
+
+    if not row:
+        raise HTTPException(status_code=404, detail="User not found")
+    await db.close()  # колода читается своей сессией, соединение запроса не держим
+
+    return StreamingResponse(
+        stream_deck(set(row.eng_learned_words or []), set(row.eng_skipped_words or []), include_learned),
+        media_type="application/x-ndjson"
+    )
+
+
+# Квиз: неправильные варианты — похожие слова из индекса дистракторов
+QUIZ_DIRECTIONS = {"eng_to_rus": ("eng", "rus"), "rus_to_eng": ("rus", "eng")}
+MAX_QUIZ_ITEMS = 50
+
+
+@app.get("/api/users/{telegram_id}/quiz", response_model=QuizResponse)
+async def get_quiz(
+        telegram_id: int,
+        count: int = 10,
+        options: int = 4,
+        direction: str = "eng_to_rus",
+        db: AsyncSession = Depends(get_read_db)
+):
+    """Вопросы с вариантами ответа по изученным словам пользователя"""
+    if direction not in QUIZ_DIRECTIONS:
+        raise HTTPException(status_code=400, detail="Invalid direction")
+    if count <= 0 or not 2 <= options <= 6:
+        raise HTTPException(status_code=400, detail="Invalid count or options")
+    count = min(count, MAX_QUIZ_ITEMS)
+    question_field, answer_field = QUIZ_DIRECTIONS[direction]
+
+    learned = (await db.execute(
+        select(User.eng_learned_words).where(User.telegram_id == telegram_id)
+    )).one_or_none()
+    if learned is None:
+        raise HTTPException(status_code=404, detail="User not found")
+
+    learned_ids = list(dict.fromkeys(learned.eng_learned_words or []))
+    question_ids = random.sample(learned_ids, min(count, len(learned_ids)))
+    if not question_ids:
+        return QuizResponse(direction=direction, items=[])
+
+    await distractor_index.check(db, replica_router.read_session)
+
+    # Случайные id — на случай, если у слова мало соседей или индекс ещё строится
+    fallback = await word_id_index.sample(db, count * (options - 1) + options, question_ids)
+
+    # Тексты слов, которых ещё нет в индексе, — одним запросом
+    missing = [word_id for word_id in question_ids + fallback if word_id not in distractor_index.words]
+    extra = {}
+    if missing:
+        result = await db.execute(select(Word.id, Word.eng, Word.rus).where(Word.id.in_(missing)))
+        extra = {row.id: (row.eng, row.rus) for row in result}
+
+    items = []
+    for word_id in question_ids:
+        question = distractor_index.text(word_id, question_field, extra)
+        if question is None:
+            continue  # слово удалено из каталога
+
+        option_ids = [word_id] + distractor_index.distractors(
+            word_id, answer_field, options - 1, random.sample(fallback, len(fallback)), extra
+        )
+        random.shuffle(option_ids)
+        items.append(QuizItem(
+            word_id=word_id,
+            question=question,
+            options=[QuizOption(id=option_id, text=distractor_index.text(option_id, answer_field, extra))
+                     for option_id in option_ids],
+            answer_id=word_id,
+        ))
+
+    return QuizResponse(direction=direction, items=items)
+
+
+# Интервальное повторение (SM-2)
+@app.get("/api/users/{telegram_id}/reviews/due", response_model=ReviewsDueResponse)
+async def get_due_reviews_endpoint(telegram_id: int, limit: int = 20, db: AsyncSession = Depends(get_read_db)):
+    """Следующие limit слов к повторению — диапазон индекса (telegram_id, due_at)"""
+    if limit <= 0:
+        raise HTTPException(status_code=400, detail="Limit must be positive")
+    limit = min(limit, MAX_DUE_ITEMS)
+
+    due, next_due_at = await get_due_reviews(db, telegram_id, datetime.utcnow(), limit)
+    if not due:
+        exists = (await db.execute(select(User.telegram_id).where(User.telegram_id == telegram_id))).first()
+        if exists is None:
+            raise HTTPException(status_code=404, detail="User not found")
+
+    return ReviewsDueResponse(
+        items=[
+            ReviewItem(
+                word_id=review.word_id, eng=eng, rus=rus, transcript=transcript, due_at=review.due_at,
+                interval_days=review.interval_days, ease=review.ease, repetitions=review.repetitions,
+            )
+            for review, eng, rus, transcript in due
+        ],
+        next_due_at=next_due_at,
+    )
+
+
+@app.post("/api/users/{telegram_id}/reviews", response_model=ReviewGradesResponse)
+async def grade_reviews_endpoint(telegram_id: int, request: ReviewGradesRequest, response: Response,
+                                 db: AsyncSession = Depends(get_db)):
+    """Оценки повторённых слов одной транзакцией"""
+    if not request.grades:
+        raise HTTPException(status_code=400, detail="No grades provided")
+    if len(request.grades) > MAX_GRADES:
+        raise HTTPException(status_code=400, detail="Too many grades in one request")
+    if any(not 0 <= item.grade <= 5 for item in request.grades):
+        raise HTTPException(status_code=400, detail="Grade must be between 0 and 5")
+
+    updated, missing = await grade_reviews(db, telegram_id, [(item.word_id, item.grade) for item in request.grades])
+    await db.commit()
+    if updated:
+        mark_write(response, telegram_id)
+
+    return ReviewGradesResponse(updated=[ReviewState(**state) for state in updated], missing=missing)
+
+
+# Упражнения
+exercise_cache = ExerciseCatalogCache()
+
+
+@app.get("/api/exercises", response_model=List[ExerciseResponse])
+async def get_exercises(
+        gender: Optional[str] = None,
+        muscle_group: Optional[str] = None,
+        limit: int = 100,
+        db: AsyncSession = Depends(get_read_db)
+):
+    """Получение упражнений с фильтром по полу и группе мышц"""
+    if limit <= 0:
+        raise HTTPException(status_code=400, detail="Limit must be positive")
+
+    gender = gender.lower() if gender else None
+    muscle_group = muscle_group.lower() if muscle_group else None
+    if gender is not None and gender not in GENDERS:
+        raise HTTPException(status_code=400, detail=f"Unknown gender, expected one of: {', '.join(sorted(GENDERS))}")
+    if muscle_group is not None and muscle_group not in MUSCLE_GROUPS:
+        raise HTTPException(status_code=400,
+                            detail=f"Unknown muscle_group, expected one of: {', '.join(sorted(MUSCLE_GROUPS))}")
+
+    exercises = await exercise_cache.get(db, gender=gender, muscle_group=muscle_group)
+    return exercises[:limit]
+
+
+@app.get("/api/exercises/{exercise_id}", response_model=ExerciseResponse)
+async def get_exercise(exercise_id: int, db: AsyncSession = Depends(get_read_db)):
+    """Получение конкретного упражнения по ID"""
+    result = await db.execute(
+        select(Exercise).where(Exercise.id == exercise_id)
+    )
+    exercise = result.scalar_one_or_none()
+
+    if not exercise:
+        raise HTTPException(status_code=404, detail="Exercise not found")
+    return exercise
 
 
 # Статистика
 @app.get("/api/users/{telegram_id}/stats")
-async def get_user_stats(telegram_id: int, db: AsyncSession = Depends(get_db)):
-    """Получение статистики пользователя"""
+async def get_user_stats(telegram_id: int, request: Request, days: int = 7, db: AsyncSession = Depends(get_read_db)):
+    """Получение статистики пользователя (из дневной сводки user_daily_stats)"""
+    days = max(1, min(days, MAX_HISTORY_DAYS))
+
+    # Статистика меняется только вместе с users.version и при смене локальной даты
+    if request.headers.get("if-none-match"):
+        row = (await db.execute(
+            select(User.version, User.time_line).where(User.telegram_id == telegram_id)
+        )).first()
+        if row is not None:
+            etag = make_etag("stats", telegram_id, row.version, local_date(row.time_line), days)
+            if etag_matches(request, etag):
+                return not_modified(etag)
+
     result = await db.execute(
         select(User).where(User.telegram_id == telegram_id)
     )
@@ -354,22 +1041,33 @@ async def get_user_stats(telegram_id: int, db: AsyncSession = Depends(get_db)):
         raise HTTPException(status_code=404, detail="User not found")
 
     total_words = len(user.eng_learned_words) if user.eng_learned_words else 0
-    training_count = total_words // 5  # Примерно 5 слов за тренировку
+    today = local_date(user.time_line)
+    # Одно чтение диапазона ключа покрывает и неделю, и запрошенную историю
+    rows = await get_history(db, telegram_id, today, max(days, 7))
+    today_stats = rows[-1] if rows and rows[-1].local_date == today else None
 
-    # Проверяем изучение на сегодня
-    today = date.today()
-    learned_today = 0
-    if user.last_learning_date == today and user.eng_learned_words:
-        # Для упрощения считаем количество слов, изученных сегодня
-        learned_today = min(total_words, user.words_per_day or 0)
+    week = [day for day in rows if day.local_date > today - timedelta(days=7)]
+    history = [day for day in rows if day.local_date > today - timedelta(days=days)]
 
-    return {
+    payload = {
         "streak": user.current_streak,
         "total_words": total_words,
-        "training_count": training_count,
-        "learned_today": learned_today,
-        "words_per_day": user.words_per_day or 0
+        "training_count": await get_training_count(db, telegram_id),
+        "learned_today": today_stats.words_learned if today_stats else 0,
+        "exp_today": today_stats.exp_gained if today_stats else 0,
+        "learned_week": sum(day.words_learned for day in week),
+        "words_per_day": user.words_per_day or 0,
+        "history": [
+            {
+                "date": day.local_date.isoformat(),
+                "words": day.words_learned,
+                "exp": day.exp_gained,
+                "trainings": day.trainings,
+            }
+            for day in history
+        ],
     }
+    return with_etag(payload, make_etag("stats", telegram_id, user.version, today, days))
 
 
 # Обновление прогресса изучения
@@ -377,6 +1075,7 @@ async def get_user_stats(telegram_id: int, db: AsyncSession = Depends(get_db)):
 async def learn_words(
         telegram_id: int,
         word_ids: List[int],
+        response: Response,
         db: AsyncSession = Depends(get_db)
 ):
     """Сохранение прогресса изучения слов"""
@@ -386,8 +1085,13 @@ async def learn_words(
     if len(word_ids) > 50:
         raise HTTPException(status_code=400, detail="Too many words in one request")
 
+    if learn_buffer.enabled:
+        return await learn_words_buffered(telegram_id, word_ids, response, db)
+
+    # Строка блокируется до commit, как в apply_progress_ops: иначе параллельные
+    # запросы читают одни и те же изученные слова и теряют слова и опыт друг друга
     result = await db.execute(
-        select(User).where(User.telegram_id == telegram_id)
+        select(User).where(User.telegram_id == telegram_id).with_for_update()
     )
     user = result.scalar_one_or_none()
 
@@ -405,33 +1109,81 @@ async def learn_words(
     user.eng_learned_words = all_learned
 
     # Обновляем streak только если это первое изучение сегодня
-    if user.last_learning_date != today:
-        from datetime import timedelta
-        yesterday = today - timedelta(days=1)
+    user.last_learning_date, user.current_streak = advance_streak(
+        user.last_learning_date, user.current_streak, today
+    )
 
-        if user.last_learning_date == yesterday:
-            user.current_streak += 1
-        else:
-            user.current_streak = 1
+    # Добавляем опыт за изученные слова
+    added_words = sorted(new_words - current_learned)
+    new_words_count = len(added_words)
+    user.exp += new_words_count * EXP_PER_WORD
 
-        user.last_learning_date = today
+    # Сводка меняется при каждой тренировке, даже без новых слов — версия профиля тоже
+    user.version = User.version + 1
 
-    # Добавляем опыт за изученные слова
-    new_words_count = len(new_words - current_learned)
-    user.exp += new_words_count * 10  # 10 очков опыта за новое слово
+    # Журнал и дневная сводка — в той же транзакции
+    await record_learning(db, telegram_id, added_words, EXP_PER_WORD, local_date(user.time_line))
+    await schedule_reviews(db, ((telegram_id, word_id) for word_id in added_words))
 
     await db.commit()
     await db.refresh(user)
+    mark_write(response, telegram_id)
 
     return {
         "success": True,
         "learned_words": len(all_learned),
         "new_words": new_words_count,
-        "exp_gained": new_words_count * 10,
+        "exp_gained": new_words_count * EXP_PER_WORD,
         "current_streak": user.current_streak
     }
 
 
+async def learn_words_buffered(telegram_id: int, word_ids: List[int], response: Response, db: AsyncSession):
+    """Write-behind: ответ считается по строке пользователя и его отложенной дельте, запись — пачкой"""
+    # Дельта берётся и до чтения строки: пачка, записанная во время чтения, попадёт
+    # хотя бы в одно из двух, а повтор в обоих безвреден (объединение слов и дней)
+    before_read = learn_buffer.pending_for(telegram_id)
+    result = await db.execute(
+        select(User.eng_learned_words, User.last_learning_date, User.current_streak, User.time_line)
+        .where(User.telegram_id == telegram_id)
+    )
+    row = result.one_or_none()
+    if row is None:
+        raise HTTPException(status_code=404, detail="User not found")
+    await db.close()  # соединение не держим, пока ждём fsync журнала
+
+    # ...и ещё раз прямо перед submit, без await между ними: одновременные отправки
+    # тех же слов видят друг друга, и опыт за слово получает только первая
+    pending = PendingProgress()
+    for delta in (before_read, learn_buffer.pending_for(telegram_id)):
+        if delta is not None:
+            pending.merge(delta)
+
+    today = date.today()
+    learned = set(row.eng_learned_words or []) | set(pending.words)
+    last_date, streak = row.last_learning_date, row.current_streak
+    for day in sorted(pending.days):
+        if last_date is None or day >= last_date:
+            last_date, streak = advance_streak(last_date, streak, day)
+    new_words_count = len(set(word_ids) - learned)
+    last_date, streak = advance_streak(last_date, streak, today)
+
+    try:
+        position = learn_buffer.submit(telegram_id, word_ids, today, local_date(row.time_line))
+    except BufferFull:
+        raise HTTPException(status_code=503, detail="Progress buffer is full", headers={"Retry-After": "1"})
+    await learn_buffer.sync(position)
+    mark_write(response, telegram_id)
+
+    return {
+        "success": True,
+        "learned_words": len(learned | set(word_ids)),
+        "new_words": new_words_count,
+        "exp_gained": new_words_count * EXP_PER_WORD,
+        "current_streak": streak
+    }
+
+
 # Дополнительный эндпоинт для тестирования API
 @app.get("/api/test")
 async def test_api():
@@ -442,8 +1194,17 @@ async def test_api():
         "endpoints": {
             "users": "/api/users/{telegram_id}",
             "words": "/api/words",
+            "words_page": "/api/words/page?cursor=...",
+            "words_changes": "/api/words/changes?since=<version>",
             "random_words": "/api/words/random/{count}",
-            "stats": "/api/users/{telegram_id}/stats"
+            "search": "/api/words/search?q=...",
+            "exercises": "/api/exercises",
+            "stats": "/api/users/{telegram_id}/stats",
+            "reviews_due": "/api/users/{telegram_id}/reviews/due",
+            "reviews": "/api/users/{telegram_id}/reviews",
+            "progress": "/api/users/{telegram_id}/progress",
+            "quiz": "/api/users/{telegram_id}/quiz",
+            "deck": "/api/users/{telegram_id}/deck"
         }
     }
 
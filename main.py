@@ -1,18 +1,34 @@
-from aiogram import Bot, Dispatcher
+from aiogram import Bot
 from config import BOT_TOKEN
 import asyncio
+import os
 
-from db import DbSessionMiddleware, AsyncSessionLocal
+from database import get_sessionmaker, dispose_engine
+from bot_metrics import start_metrics_server
+from dispatcher import build_dispatcher, instrument_bot
+from metrics import archive_process_file
+from daily_tasks import run_daily_tasks_scheduler
+from caches import leaderboard_cache
+from startup import startup, cache_warmer
 
-bot = Bot(token=BOT_TOKEN)
-dp = Dispatcher()
-dp.message.middleware(DbSessionMiddleware(AsyncSessionLocal))
-dp.callback_query.middleware(DbSessionMiddleware(AsyncSessionLocal))
-from handlers import start
-dp.include_router(start.router)
+bot = instrument_bot(Bot(token=BOT_TOKEN))
+dp = build_dispatcher()
 
 async def main():
-    await dp.start_polling(bot)
+    await startup("bot", warmers=[("leaderboard", cache_warmer(leaderboard_cache.top))])
+
+    metrics_port = os.getenv("METRICS_PORT")
+    if metrics_port:
+        await start_metrics_server(int(metrics_port))
+
+    # Ежедневные задачи создаются в локальную полночь каждого часового пояса
+    scheduler = asyncio.create_task(run_daily_tasks_scheduler(get_sessionmaker()))
+    try:
+        await dp.start_polling(bot)
+    finally:
+        scheduler.cancel()
+        await dispose_engine()
+        archive_process_file()
 
 if __name__ == "__main__":
     asyncio.run(main())
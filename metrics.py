@@ -0,0 +1,347 @@
+"""
+Метрики в формате Prometheus для API (ma.py) и бота (main.py).
+
+Сбор дешёвый: счётчики и гистограммы с заранее заданными бакетами — это
+обычные списки чисел, которые обновляются без блокировок в одном потоке
+event loop. Для нескольких процессов (несколько воркеров API + бот) задайте
+METRICS_DIR: каждый процесс сбрасывает снимок своих метрик в файл
+metrics-<pid>.json, а /metrics суммирует все файлы каталога.
+
+Когда процесс завершается (или мастер находит упавший воркер), его счётчики и
+гистограммы переносятся в metrics-archive.json, а gauge отбрасываются: суммы
+счётчиков не уменьшаются при перезапуске воркеров, а gauge мёртвых процессов
+не висят в выдаче. Перенос и чтение каталога идут под flock, поэтому /metrics
+не видит процесс ни дважды, ни ни разу.
+"""
+import bisect
+import fcntl
+import json
+import os
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from env import getenv
+
+ARCHIVE_FILE = "metrics-archive.json"
+LOCK_FILE = "metrics.lock"
+GAUGES_KEY = "_gauges"  # имена gauge в файле процесса: мастер не знает метрик, зарегистрированных в воркерах
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SIZE_BUCKETS = (128, 512, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+
+LabelValues = Tuple[str, ...]
+
+
+class Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+
+    def snapshot(self) -> dict:
+        raise NotImplementedError
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def __init__(self, name, documentation, labelnames=()):
+        super().__init__(name, documentation, labelnames)
+        self.values: Dict[LabelValues, float] = {}
+
+    def inc(self, *labels: str, amount: float = 1.0):
+        self.values[labels] = self.values.get(labels, 0.0) + amount
+
+    def snapshot(self):
+        return {"|".join(k): v for k, v in self.values.items()}
+
+
+class Gauge(Counter):
+    """Gauge суммируется между процессами (in-flight запросы, соединения пула)"""
+    kind = "gauge"
+
+    def dec(self, *labels: str, amount: float = 1.0):
+        self.values[labels] = self.values.get(labels, 0.0) - amount
+
+    def set(self, *labels: str, value: float):
+        self.values[labels] = value
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(buckets)
+        # labels -> [счётчики по бакетам..., +Inf, сумма]
+        self.values: Dict[LabelValues, List[float]] = {}
+
+    def observe(self, value: float, *labels: str):
+        series = self.values.get(labels)
+        if series is None:
+            series = self.values[labels] = [0] * (len(self.buckets) + 2)
+        series[bisect.bisect_left(self.buckets, value)] += 1
+        series[-1] += value
+
+    def snapshot(self):
+        return {"|".join(k): v for k, v in self.values.items()}
+
+
+class Registry:
+    def __init__(self):
+        self.metrics: Dict[str, Metric] = {}
+        self.collectors: List[Callable[[], None]] = []
+        self._last_flush = 0.0
+        self._settings: Optional[Tuple[Optional[str], float]] = None
+        self.archived = False  # снимок процесса уже в архиве — повторный файл удвоил бы счётчики
+
+    def _resolve_settings(self) -> Tuple[Optional[str], float]:
+        """METRICS_DIR и METRICS_FLUSH_INTERVAL — при первой выгрузке, после загрузки .env"""
+        if self._settings is None:
+            self._settings = (getenv("METRICS_DIR") or None, float(getenv("METRICS_FLUSH_INTERVAL", "1.0")))
+        return self._settings
+
+    @property
+    def directory(self) -> Optional[str]:
+        return self._resolve_settings()[0]
+
+    def register(self, metric: Metric) -> Metric:
+        self.metrics[metric.name] = metric
+        return metric
+
+    def add_collector(self, collector: Callable[[], None]):
+        """Функция, обновляющая gauge перед выгрузкой (например, статистика пула)"""
+        self.collectors.append(collector)
+
+    def snapshot(self) -> dict:
+        for collector in self.collectors:
+            collector()
+        return {name: metric.snapshot() for name, metric in self.metrics.items()}
+
+    def flush(self, force: bool = False):
+        """Сбрасывает снимок процесса в METRICS_DIR (не чаще METRICS_FLUSH_INTERVAL)"""
+        directory, interval = self._resolve_settings()
+        if not directory or self.archived:
+            return
+        now = time.monotonic()
+        if not force and now - self._last_flush < interval:
+            return
+        self._last_flush = now
+
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, f"metrics-{os.getpid()}.json")
+        gauges = [name for name, metric in self.metrics.items() if isinstance(metric, Gauge)]
+        _write_json(path, {**self.snapshot(), GAUGES_KEY: gauges})
+
+    def _collect_snapshots(self) -> List[dict]:
+        directory = self.directory
+        if not directory:
+            return [self.snapshot()]
+
+        self.flush(force=True)
+        snapshots = []
+        with _directory_lock(directory, exclusive=False):
+            for filename in os.listdir(directory):
+                if not (filename.startswith("metrics-") and filename.endswith(".json")):
+                    continue
+                try:
+                    with open(os.path.join(directory, filename)) as f:
+                        snapshots.append(json.load(f))
+                except (OSError, ValueError):
+                    continue
+        return snapshots
+
+    def render(self) -> str:
+        """Текстовый формат Prometheus с суммированием по всем процессам"""
+        merged = _merge_snapshots(self._collect_snapshots())
+
+        lines = []
+        for name, metric in self.metrics.items():
+            lines.append(f"# HELP {name} {metric.documentation}")
+            lines.append(f"# TYPE {name} {metric.kind}")
+            for key, value in sorted(merged.get(name, {}).items()):
+                labels = dict(zip(metric.labelnames, key.split("|"))) if metric.labelnames else {}
+                if isinstance(metric, Histogram):
+                    cumulative = 0
+                    for bound, count in zip(metric.buckets + (float("inf"),), value[:-1]):
+                        cumulative += count
+                        le = "+Inf" if bound == float("inf") else repr(bound)
+                        lines.append(f"{name}_bucket{_format_labels({**labels, 'le': le})} {cumulative}")
+                    lines.append(f"{name}_sum{_format_labels(labels)} {value[-1]}")
+                    lines.append(f"{name}_count{_format_labels(labels)} {cumulative}")
+                else:
+                    lines.append(f"{name}{_format_labels(labels)} {value}")
+        return "\n".join(lines) + "\n"
+
+
+def _merge_snapshots(snapshots: Iterable[dict]) -> Dict[str, Dict[str, object]]:
+    merged: Dict[str, Dict[str, object]] = {}
+    for snapshot in snapshots:
+        for name, series in snapshot.items():
+            if name == GAUGES_KEY:
+                continue
+            target = merged.setdefault(name, {})
+            for key, value in series.items():
+                if isinstance(value, list):
+                    current = target.get(key)
+                    target[key] = value if current is None else [a + b for a, b in zip(current, value)]
+                else:
+                    target[key] = target.get(key, 0.0) + value
+    return merged
+
+
+def _write_json(path: str, payload: dict):
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(payload, f)
+    os.replace(tmp_path, path)
+
+
+@contextmanager
+def _directory_lock(directory: str, exclusive: bool):
+    """flock каталога метрик: чтение для /metrics — shared, перенос в архив — exclusive"""
+    os.makedirs(directory, exist_ok=True)
+    with open(os.path.join(directory, LOCK_FILE), "a") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+        yield
+
+
+def _format_labels(labels: Dict[str, str]) -> str:
+    if not labels:
+        return ""
+    escaped = (f'{k}="{str(v).replace(chr(92), chr(92) * 2).replace(chr(34), chr(92) + chr(34))}"'
+               for k, v in labels.items())
+    return "{" + ",".join(escaped) + "}"
+
+
+registry = Registry()
+
+# HTTP API
+http_requests_total = registry.register(Counter(
+    "http_requests_total", "Количество HTTP запросов", ("method", "route", "status")))
+http_request_duration = registry.register(Histogram(
+    "http_request_duration_seconds", "Задержка HTTP запросов", ("method", "route")))
+http_requests_in_progress = registry.register(Gauge(
+    "http_requests_in_progress", "Запросы в обработке", ("method",)))
+http_response_size = registry.register(Histogram(
+    "http_response_size_bytes", "Размер ответа", ("route",), buckets=SIZE_BUCKETS))
+
+# Пул соединений БД
+db_pool_size = registry.register(Gauge("db_pool_size", "Размер пула соединений", ("engine",)))
+db_pool_checked_out = registry.register(Gauge("db_pool_checked_out", "Занятые соединения пула", ("engine",)))
+db_pool_overflow = registry.register(Gauge("db_pool_overflow", "Соединения сверх размера пула", ("engine",)))
+
+# Бот
+bot_update_duration = registry.register(Histogram(
+    "bot_update_duration_seconds", "Задержка обработки апдейта", ("handler",)))
+bot_update_errors = registry.register(Counter(
+    "bot_update_errors_total", "Ошибки в обработчиках", ("handler",)))
+telegram_api_calls = registry.register(Counter(
+    "telegram_api_calls_total", "Вызовы Telegram Bot API", ("method",)))
+telegram_api_errors = registry.register(Counter(
+    "telegram_api_errors_total", "Ошибки Telegram Bot API", ("method", "error")))
+
+
+def register_engine(engine, name: str):
+    """Добавляет статистику пула движка (sync или async) в метрики"""
+    pool = getattr(engine, "sync_engine", engine).pool
+
+    def collect():
+        for gauge, attr in ((db_pool_size, "size"), (db_pool_checked_out, "checkedout"),
+                            (db_pool_overflow, "overflow")):
+            getter = getattr(pool, attr, None)
+            if getter is not None:
+                # overflow() отрицателен, пока пул не заполнен
+                gauge.set(name, value=float(max(0, getter())))
+
+    registry.add_collector(collect)
+
+
+def _route_label(scope) -> str:
+    """Шаблон маршрута (/api/users/{telegram_id}), а не сырой путь — чтобы не раздувать кардинальность"""
+    route = scope.get("route")
+    path = getattr(route, "path", None)
+    if path is not None:
+        return path
+    endpoint = scope.get("endpoint")
+    return getattr(endpoint, "__name__", "unmatched")
+
+
+class PrometheusMiddleware:
+    """ASGI middleware: латентность, in-flight и размер ответов по маршрутам"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        method = scope["method"]
+        status = 500
+        size = 0
+
+        async def send_wrapper(message):
+            nonlocal status, size
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            elif message["type"] == "http.response.body":
+                size += len(message.get("body", b""))
+            await send(message)
+
+        http_requests_in_progress.inc(method)
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            route = _route_label(scope)
+            http_requests_in_progress.dec(method)
+            http_request_duration.observe(time.perf_counter() - started, method, route)
+            http_requests_total.inc(method, route, str(status))
+            http_response_size.observe(size, route)
+            registry.flush()
+
+
+def metrics_response_body() -> Tuple[bytes, str]:
+    return registry.render().encode(), "text/plain; version=0.0.4; charset=utf-8"
+
+
+def archive_process_file(pid: Optional[int] = None):
+    """Переносит счётчики и гистограммы процесса в архив и удаляет его файл.
+
+    Без pid — текущий процесс при остановке (сначала сбрасывается последний
+    снимок). С pid — завершившийся воркер, вызывается мастером.
+    """
+    directory = registry.directory
+    if not directory:
+        return
+    if pid is None:
+        registry.flush(force=True)
+        registry.archived = True
+        pid = os.getpid()
+
+    path = os.path.join(directory, f"metrics-{pid}.json")
+    archive_path = os.path.join(directory, ARCHIVE_FILE)
+    with _directory_lock(directory, exclusive=True):
+        try:
+            with open(path) as f:
+                snapshot = json.load(f)
+        except FileNotFoundError:
+            return  # процесс уже перенёс себя сам
+        except ValueError:
+            snapshot = {}
+
+        gauges = set(snapshot.pop(GAUGES_KEY, ()))
+        gauges.update(name for name, metric in registry.metrics.items() if isinstance(metric, Gauge))
+        try:
+            with open(archive_path) as f:
+                archive = json.load(f)
+        except FileNotFoundError:
+            archive = {}
+
+        kept = {name: series for name, series in snapshot.items() if name not in gauges}
+        _write_json(archive_path, _merge_snapshots([archive, kept]))
+        os.remove(path)
@@ -3,4 +3,6 @@ from sqlalchemy.orm import declarative_base
 Base = declarative_base()
 
 from .users_tasks import User, Task
-from .eng_words import Word
\ No newline at end of file
+from .eng_words import Word, CatalogVersion, WordTombstone, insert_words
+from .exercises import Exercise
+from .learning import LearningEvent, UserDailyStats, WordReview
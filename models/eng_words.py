@@ -1,10 +1,14 @@
-from sqlalchemy import Column, Integer, String, Text
+from sqlalchemy import Column, Integer, String, Text, BigInteger, DateTime, func, event, update, insert, select, Index, DDL, text
 from sqlalchemy.ext.declarative import declarative_base
+from sqlalchemy.orm import Session
 import json
 from sqlalchemy.dialects.postgresql import JSON
 
 from models import Base
 
+WORDS_CATALOG = "eng_words"
+
+
 class Word(Base):
     __tablename__ = "eng_words"
 
@@ -14,3 +18,90 @@ class Word(Base):
     transcript = Column(String(100))
     image_data = Column(Text, nullable=True)  # base64
     sound_data = Column(JSON, nullable=True)  # JSON { voice: base64 }
+
+    # Версия каталога, в которой слово добавлено или изменено последний раз
+    version = Column(BigInteger, nullable=False, default=0, server_default="0", index=True)
+    updated_at = Column(DateTime, server_default=func.now(), onupdate=func.now())
+
+    __table_args__ = (
+        # Поиск (/api/words/search): триграммные индексы pg_trgm для префикса и нечёткого совпадения;
+        # на SQLite вместо них работает индекс в памяти (word_search.py)
+        Index("ix_eng_words_eng_trgm", text("lower(eng) gin_trgm_ops"), postgresql_using="gin")
+        .ddl_if(dialect="postgresql"),
+        Index("ix_eng_words_rus_trgm", text("lower(rus) gin_trgm_ops"), postgresql_using="gin")
+        .ddl_if(dialect="postgresql"),
+    )
+
+
+event.listen(
+    Word.__table__, "before_create",
+    DDL("CREATE EXTENSION IF NOT EXISTS pg_trgm").execute_if(dialect="postgresql"),
+)
+
+
+class CatalogVersion(Base):
+    """Счётчик версий каталога: растёт на единицу при каждом изменении"""
+    __tablename__ = "catalog_versions"
+
+    name = Column(String(32), primary_key=True)
+    version = Column(BigInteger, nullable=False, default=0)
+
+
+class WordTombstone(Base):
+    """Удалённые слова — чтобы клиенты могли убрать их из своего кэша"""
+    __tablename__ = "eng_word_tombstones"
+
+    word_id = Column(Integer, primary_key=True)
+    version = Column(BigInteger, nullable=False, index=True)
+    deleted_at = Column(DateTime, server_default=func.now())
+
+
+def next_catalog_version(connection, name: str = WORDS_CATALOG) -> int:
+    """Увеличивает счётчик каталога; строка счётчика блокируется до конца транзакции,
+    поэтому версии фиксируются в порядке возрастания"""
+    result = connection.execute(
+        update(CatalogVersion)
+        .where(CatalogVersion.name == name)
+        .values(version=CatalogVersion.version + 1)
+        .returning(CatalogVersion.version)
+    )
+    version = result.scalar_one_or_none()
+    if version is None:
+        connection.execute(insert(CatalogVersion).values(name=name, version=1))
+        version = 1
+    return version
+
+
+def insert_words(connection, rows) -> int:
+    """Массовая вставка слов в обход ORM: все строки получают одну новую версию каталога,
+    поэтому попадают в /api/words/changes и сбрасывают кэши, как изменения через ORM.
+
+    Для AsyncConnection — через run_sync: await conn.run_sync(insert_words, rows).
+    """
+    version = next_catalog_version(connection)
+    connection.execute(insert(Word), [dict(row, version=version) for row in rows])
+    return version
+
+
+def current_catalog_version_query(name: str = WORDS_CATALOG):
+    return select(CatalogVersion.version).where(CatalogVersion.name == name)
+
+
+@event.listens_for(Session, "before_flush")
+def _bump_word_versions(session, flush_context, instances):
+    """Изменения слов через ORM получают новую версию каталога.
+
+    Массовые вставки — через insert_words(); другие insert()/update() в обход
+    ORM должны сами вызвать next_catalog_version() и проставить version.
+    """
+    changed = [obj for obj in session.new if isinstance(obj, Word)]
+    changed += [obj for obj in session.dirty if isinstance(obj, Word) and session.is_modified(obj)]
+    deleted = [obj for obj in session.deleted if isinstance(obj, Word)]
+    if not changed and not deleted:
+        return
+
+    version = next_catalog_version(session.connection())
+    for word in changed:
+        word.version = version
+    for word in deleted:
+        session.merge(WordTombstone(word_id=word.id, version=version))
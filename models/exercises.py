@@ -0,0 +1,24 @@
+from sqlalchemy import Column, Integer, String, Text, Index, UniqueConstraint
+
+from models import Base
+
+
+class Exercise(Base):
+    __tablename__ = "exercises"
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    name = Column(String(255), nullable=False)
+    gender = Column(String(16), nullable=False)  # male / female
+    muscle_group = Column(String(32), nullable=False)  # abs, biceps, chest ...
+    gif_url = Column(Text, nullable=True)
+    description = Column(Text, nullable=True)
+    url = Column(Text, nullable=False)  # ссылка на карточку musclewiki
+
+    __table_args__ = (
+        # Одно упражнение может встречаться в нескольких группах мышц
+        UniqueConstraint("url", "gender", "muscle_group", name="uq_exercises_url_gender_muscle_group"),
+        # Фильтр по полу + группе мышц (основной запрос плана тренировки)
+        Index("ix_exercises_gender_muscle_group", "gender", "muscle_group", "id"),
+        # Фильтр только по группе мышц
+        Index("ix_exercises_muscle_group_gender", "muscle_group", "gender"),
+    )
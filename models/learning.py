@@ -0,0 +1,50 @@
+from sqlalchemy import Column, BigInteger, Integer, Float, String, Date, DateTime, ForeignKey, Index, func
+
+from models import Base
+
+
+class LearningEvent(Base):
+    """Журнал изучения слов: строки только добавляются"""
+    __tablename__ = "learning_events"
+
+    id = Column(BigInteger().with_variant(Integer, "sqlite"), primary_key=True, autoincrement=True)
+    telegram_id = Column(BigInteger, ForeignKey("users.telegram_id"), nullable=False)
+    word_id = Column(Integer, nullable=False)
+    event_type = Column(String(16), nullable=False, default="learned")
+    exp = Column(Integer, nullable=False, default=0)
+    local_date = Column(Date, nullable=False)  # дата в часовом поясе пользователя
+    created_at = Column(DateTime, server_default=func.now())
+
+    __table_args__ = (
+        Index("ix_learning_events_telegram_id_local_date", "telegram_id", "local_date"),
+    )
+
+
+class UserDailyStats(Base):
+    """Сводка по дням, обновляется вместе с журналом; первичный ключ — индекс для чтения диапазона дат"""
+    __tablename__ = "user_daily_stats"
+
+    telegram_id = Column(BigInteger, ForeignKey("users.telegram_id"), primary_key=True)
+    local_date = Column(Date, primary_key=True)
+    words_learned = Column(Integer, nullable=False, default=0)
+    exp_gained = Column(Integer, nullable=False, default=0)
+    trainings = Column(Integer, nullable=False, default=0)
+
+
+class WordReview(Base):
+    """Состояние интервального повторения (SM-2) изученного слова"""
+    __tablename__ = "word_reviews"
+
+    telegram_id = Column(BigInteger, ForeignKey("users.telegram_id"), primary_key=True)
+    word_id = Column(Integer, primary_key=True)
+    repetitions = Column(Integer, nullable=False, default=0)  # успешных повторений подряд
+    interval_days = Column(Integer, nullable=False, default=0)
+    ease = Column(Float, nullable=False, default=2.5)
+    lapses = Column(Integer, nullable=False, default=0)
+    due_at = Column(DateTime, nullable=False)  # UTC
+    last_reviewed_at = Column(DateTime, nullable=True)
+
+    __table_args__ = (
+        # Очередь повторения: диапазон по (telegram_id, due_at) с LIMIT
+        Index("ix_word_reviews_telegram_id_due_at", "telegram_id", "due_at"),
+    )
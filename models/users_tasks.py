@@ -1,7 +1,7 @@
 from sqlalchemy import Column, BigInteger, String, Integer, Text, ForeignKey, JSON
 from sqlalchemy.ext.declarative import declarative_base
 from datetime import date
-from sqlalchemy import Column, Integer, BigInteger, Text, Date, Boolean, DateTime, ForeignKey, func
+from sqlalchemy import Column, Integer, BigInteger, Text, Date, Boolean, DateTime, ForeignKey, func, Index, literal_column
 
 from models import Base
 
@@ -14,9 +14,9 @@ class User(Base):
     first_name = Column(String(64), nullable=False)
     last_name = Column(String(64), nullable=True)
 
-    exp = Column(Integer, default=0)
+    exp = Column(Integer, default=0, index=True)  # индекс для лидерборда
     awards = Column(Text, default="")
-    time_line = Column(String(16), nullable=False, default="UTC+3:00")
+    time_line = Column(String(16), nullable=False, default="UTC+3:00", index=True)
 
     # Новые поля для изучения языков
     words_per_day = Column(Integer, nullable=True)  # 5, 10 или 15
@@ -25,12 +25,23 @@ class User(Base):
     last_learning_date = Column(Date, nullable=True)  # дата последнего изучения
     current_streak = Column(Integer, default=0)  # количество дней подряд
 
+    # Версия профиля для ETag: увеличивается при каждом UPDATE строки
+    version = Column(Integer, nullable=False, default=1, server_default="1",
+                     onupdate=literal_column("version + 1"))
+
 class Task(Base):
     __tablename__ = "tasks"
 
     id = Column(Integer, primary_key=True, autoincrement=True)
     telegram_id = Column(BigInteger, ForeignKey("users.telegram_id"), nullable=True)  # None для общих задач
+    task_key = Column(String(32), nullable=True)  # id из COMMON_TASKS, None для своих задач
     text = Column(Text, nullable=False)
-    date = Column(Date, default=date.today)
+    date = Column(Date, default=date.today)  # локальная дата пользователя
     is_done = Column(Boolean, default=False)
     created_at = Column(DateTime, server_default=func.now())
+
+    __table_args__ = (
+        # Список задач пользователя на день читается по префиксу (telegram_id, date);
+        # уникальность по task_key не даёт создать общие задачи дважды
+        Index("ix_tasks_telegram_id_date_task_key", "telegram_id", "date", "task_key", unique=True),
+    )
@@ -0,0 +1,161 @@
+"""
+Учёт SQL-запросов: количество и время запросов на каждый HTTP-запрос или апдейт бота.
+
+Запросы, превысившие бюджет (QUERY_BUDGET_COUNT / QUERY_BUDGET_MS), пишутся в лог
+вместе с самыми медленными выражениями. Повтор одного и того же выражения
+много раз подряд помечается как возможный N+1.
+
+В проверках (см. check_query_budgets в benchmarks/bench_bot.py):
+    with assert_max_queries(2):
+        await get_leaderboard_text(session, user_id)
+"""
+import logging
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+from sqlalchemy import event
+
+from env import getenv
+
+logger = logging.getLogger("query_stats")
+
+SLOWEST_LIMIT = 3
+
+
+class Budget(NamedTuple):
+    count: int
+    ms: float
+    n_plus_one: int
+
+
+_budget: Optional[Budget] = None
+
+
+def budget() -> Budget:
+    """QUERY_BUDGET_COUNT / QUERY_BUDGET_MS / N_PLUS_ONE_THRESHOLD — при первом отчёте, после загрузки .env"""
+    global _budget
+    if _budget is None:
+        _budget = Budget(int(getenv("QUERY_BUDGET_COUNT", "20")), float(getenv("QUERY_BUDGET_MS", "200")),
+                         int(getenv("N_PLUS_ONE_THRESHOLD", "5")))
+    return _budget
+
+
+class QueryStats:
+    """Статистика запросов одного HTTP-запроса / апдейта"""
+
+    def __init__(self, name: str = "unknown"):
+        self.name = name
+        self.count = 0
+        self.total_time = 0.0
+        self.statements: Dict[str, int] = {}
+        self.slowest: List[Tuple[float, str]] = []
+
+    def record(self, statement: str, duration: float):
+        self.count += 1
+        self.total_time += duration
+        self.statements[statement] = self.statements.get(statement, 0) + 1
+
+        self.slowest.append((duration, statement))
+        if len(self.slowest) > SLOWEST_LIMIT:
+            self.slowest.sort(reverse=True)
+            self.slowest.pop()
+
+    def repeated_statements(self, threshold: Optional[int] = None) -> Dict[str, int]:
+        threshold = budget().n_plus_one if threshold is None else threshold
+        return {s: n for s, n in self.statements.items() if n >= threshold}
+
+    def report(self):
+        """Пишет в лог превышение бюджета и подозрения на N+1"""
+        total_ms = self.total_time * 1000
+        limits = budget()
+        if self.count > limits.count or total_ms > limits.ms:
+            slowest = "\n".join(
+                f"  {duration * 1000:.1f} ms: {_shorten(statement)}"
+                for duration, statement in sorted(self.slowest, reverse=True)
+            )
+            logger.warning(
+                "%s: превышен бюджет запросов — %d запросов, %.1f ms (бюджет %d / %.0f ms)\n%s",
+                self.name, self.count, total_ms, limits.count, limits.ms, slowest,
+            )
+
+        for statement, times in self.repeated_statements().items():
+            logger.warning("%s: возможный N+1 — %d раз: %s", self.name, times, _shorten(statement))
+
+
+current_stats: ContextVar[Optional[QueryStats]] = ContextVar("current_query_stats", default=None)
+
+
+def _shorten(statement: str, limit: int = 300) -> str:
+    statement = " ".join(statement.split())
+    return statement if len(statement) <= limit else statement[:limit] + "..."
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_start_time", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info["query_start_time"].pop()
+    stats = current_stats.get()
+    if stats is not None:
+        stats.record(statement, time.perf_counter() - started)
+
+
+def _handle_error(exception_context):
+    connection = exception_context.connection
+    starts = connection.info.get("query_start_time") if connection is not None else None
+    if starts:
+        starts.pop()
+
+
+def instrument_engine(engine):
+    """Подключает учёт запросов к движку (sync или async)"""
+    sync_engine = getattr(engine, "sync_engine", engine)
+    if event.contains(sync_engine, "before_cursor_execute", _before_cursor_execute):
+        return
+
+    event.listen(sync_engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(sync_engine, "after_cursor_execute", _after_cursor_execute)
+    event.listen(sync_engine, "handle_error", _handle_error)
+
+
+@contextmanager
+def track_queries(name: str = "unknown"):
+    """Собирает статистику запросов внутри блока"""
+    stats = QueryStats(name)
+    token = current_stats.set(stats)
+    try:
+        yield stats
+    finally:
+        current_stats.reset(token)
+
+
+@contextmanager
+def assert_max_queries(limit: int, name: str = "block"):
+    """Тестовый помощник: блок должен выполнить не больше limit запросов"""
+    with track_queries(name) as stats:
+        yield stats
+    if stats.count > limit:
+        statements = "\n".join(f"  {n}x {_shorten(s)}" for s, n in stats.statements.items())
+        raise AssertionError(f"{name}: ожидалось не больше {limit} запросов, выполнено {stats.count}\n{statements}")
+
+
+class QueryBudgetMiddleware:
+    """ASGI middleware: статистика запросов на каждый HTTP-запрос"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        with track_queries() as stats:
+            try:
+                await self.app(scope, receive, send)
+            finally:
+                route = scope.get("route")
+                stats.name = f"{scope['method']} {getattr(route, 'path', scope['path'])}"
+                stats.report()
@@ -0,0 +1,139 @@
+"""
+Маршрутизация чтений на реплику.
+
+Чтения идут на реплику (REPLICA_DATABASE_URL), пока её отставание не больше
+REPLICA_MAX_LAG секунд; отставание проверяется не чаще REPLICA_CHECK_INTERVAL.
+Если реплика не задана, недоступна или отстаёт — читаем с основной базы.
+
+Read-your-writes: после записи пользователь закрепляется за основной базой на
+REPLICA_MAX_LAG секунд — в памяти процесса (бот, тот же воркер API) и cookie
+(другие воркеры API). За это время реплика с допустимым отставанием успевает
+получить запись.
+
+Локально достаточно двух баз, например:
+    DATABASE_URL=sqlite+aiosqlite:///primary.db REPLICA_DATABASE_URL=sqlite+aiosqlite:///replica.db
+(или два экземпляра Postgres); метрика db_read_sessions_total{target} показывает,
+куда ушли чтения.
+"""
+import asyncio
+import logging
+import time
+from contextlib import asynccontextmanager
+from typing import Dict, Optional
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession
+
+from database import get_replica_engine, get_replica_sessionmaker, get_sessionmaker
+from env import getenv
+from metrics import registry, Counter
+
+logger = logging.getLogger("replica")
+
+REPLICA_CHECK_TIMEOUT = 1.0
+READ_YOUR_WRITES_COOKIE = "vloya_rw"
+
+read_sessions_total = registry.register(Counter(
+    "db_read_sessions_total", "Сессии чтения по базе", ("target",)))
+
+PG_LAG_QUERY = text("""
+    SELECT CASE
+        WHEN NOT pg_is_in_recovery() THEN 0
+        WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+        ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0)
+    END
+""")
+
+
+async def measure_lag(engine: AsyncEngine) -> float:
+    """Отставание реплики в секундах; без догоняемой WAL отставание 0"""
+    async with engine.connect() as conn:
+        if engine.dialect.name != "postgresql":
+            await conn.execute(text("SELECT 1"))
+            return 0.0
+        return float((await conn.execute(PG_LAG_QUERY)).scalar_one())
+
+
+class ReplicaRouter:
+    def __init__(self, max_lag: Optional[float] = None, check_interval: Optional[float] = None):
+        # Не заданные явно — из окружения при первом обращении, как и REPLICA_DATABASE_URL
+        self._max_lag = max_lag
+        self._check_interval = check_interval
+        self.lag: Optional[float] = None
+        self._checked_at: Optional[float] = None
+        self._recent_writes: Dict[int, float] = {}
+
+    @property
+    def max_lag(self) -> float:
+        if self._max_lag is None:
+            self._max_lag = float(getenv("REPLICA_MAX_LAG", "5"))
+        return self._max_lag
+
+    @property
+    def check_interval(self) -> float:
+        if self._check_interval is None:
+            self._check_interval = float(getenv("REPLICA_CHECK_INTERVAL", "5"))
+        return self._check_interval
+
+    async def replica_available(self) -> bool:
+        engine = get_replica_engine()
+        if engine is None:
+            return False
+
+        now = time.monotonic()
+        if self._checked_at is None or now - self._checked_at >= self.check_interval:
+            # Время проверки ставится до await, чтобы параллельные запросы не проверяли повторно
+            self._checked_at = now
+            try:
+                self.lag = await asyncio.wait_for(measure_lag(engine), REPLICA_CHECK_TIMEOUT)
+            except Exception as error:
+                logger.warning("Реплика недоступна: %s", error)
+                self.lag = None
+
+        return self.lag is not None and self.lag <= self.max_lag
+
+    @staticmethod
+    def is_replica(session: AsyncSession) -> bool:
+        replica = get_replica_engine()
+        return replica is not None and session.bind is replica
+
+    def mark_write(self, telegram_id: int):
+        """Запоминает запись пользователя: его чтения идут на основную базу max_lag секунд"""
+        now = time.monotonic()
+        self._recent_writes[telegram_id] = now + self.max_lag
+        if len(self._recent_writes) > 10000:
+            self._recent_writes = {key: until for key, until in self._recent_writes.items() if until > now}
+
+    def wrote_recently(self, telegram_id: Optional[int]) -> bool:
+        if telegram_id is None:
+            return False
+        until = self._recent_writes.get(telegram_id)
+        return until is not None and until > time.monotonic()
+
+    async def use_replica(self, telegram_id: Optional[int] = None) -> bool:
+        if self.wrote_recently(telegram_id):
+            return False
+        return await self.replica_available()
+
+    @asynccontextmanager
+    async def read_session(self, telegram_id: Optional[int] = None, pin_primary: bool = False,
+                           primary: Optional[AsyncSession] = None):
+        """Сессия только для чтения: реплика, если она свежая, иначе основная база.
+
+        primary — уже открытая сессия вызывающего на основной базе: если чтение
+        идёт туда же, используется она, а не второе соединение из того же пула
+        (иначе при исчерпанном пуле параллельные запросы ждут друг друга).
+        """
+        use_replica = not pin_primary and await self.use_replica(telegram_id)
+        read_sessions_total.inc("replica" if use_replica else "primary")
+        if not use_replica and primary is not None:
+            yield primary
+            return
+        sessionmaker = get_replica_sessionmaker() if use_replica else get_sessionmaker()
+        async with sessionmaker() as session:
+            yield session
+
+
+replica_router = ReplicaRouter()
+
+read_session = replica_router.read_session
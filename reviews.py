@@ -0,0 +1,130 @@
+"""
+Интервальное повторение изученных слов по SM-2.
+
+Для каждого изученного слова в word_reviews хранится интервал, коэффициент
+лёгкости и время следующего повторения (due_at, UTC). Слово ставится в
+очередь при изучении (первое повторение — через FIRST_REVIEW_DELAY) и
+убирается, если его удалили из изученных.
+
+Очередь читается диапазоном индекса (telegram_id, due_at) с LIMIT, поэтому
+запрос стоит одинаково при любом числе изученных слов. Оценки (0–5) одного
+запроса применяются пачкой: один SELECT ... FOR UPDATE и один UPDATE по
+первичному ключу.
+"""
+from datetime import datetime, timedelta
+from typing import Iterable, List, Optional, Sequence, Tuple
+
+from sqlalchemy import select, update, delete, func
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from models import Word, WordReview
+
+DEFAULT_EASE = 2.5
+MIN_EASE = 1.3
+PASSING_GRADE = 3  # оценка ниже — слово забыто, повторения начинаются заново
+FIRST_REVIEW_DELAY = timedelta(days=1)
+MAX_DUE_ITEMS = 50
+MAX_GRADES = 100
+
+
+def sm2(repetitions: int, interval_days: int, ease: float, grade: int) -> Tuple[int, int, float]:
+    """Следующее состояние SM-2: (repetitions, interval_days, ease)"""
+    ease = round(max(MIN_EASE, ease + 0.1 - (5 - grade) * (0.08 + (5 - grade) * 0.02)), 2)
+    if grade < PASSING_GRADE:
+        return 0, 1, ease
+    if repetitions == 0:
+        interval_days = 1
+    elif repetitions == 1:
+        interval_days = 6
+    else:
+        interval_days = max(1, round(interval_days * ease))
+    return repetitions + 1, interval_days, ease
+
+
+def _insert(dialect_name: str):
+    return sqlite_insert if dialect_name == "sqlite" else pg_insert
+
+
+async def schedule_reviews(session: AsyncSession, pairs: Iterable[Tuple[int, int]],
+                           now: Optional[datetime] = None):
+    """Ставит в очередь пары (telegram_id, word_id); уже запланированные не трогает. commit — у вызывающего"""
+    due_at = (now or datetime.utcnow()) + FIRST_REVIEW_DELAY
+    rows = [
+        {"telegram_id": telegram_id, "word_id": word_id, "repetitions": 0, "interval_days": 0,
+         "ease": DEFAULT_EASE, "lapses": 0, "due_at": due_at}
+        for telegram_id, word_id in dict.fromkeys(pairs)
+    ]
+    if rows:
+        statement = _insert(session.bind.dialect.name)(WordReview).on_conflict_do_nothing(
+            index_elements=["telegram_id", "word_id"]
+        )
+        await session.execute(statement, rows)
+
+
+async def unschedule_reviews(session: AsyncSession, telegram_id: int, word_ids: Sequence[int]):
+    if word_ids:
+        await session.execute(
+            delete(WordReview).where(WordReview.telegram_id == telegram_id, WordReview.word_id.in_(word_ids))
+        )
+
+
+async def get_due_reviews(session: AsyncSession, telegram_id: int, now: datetime, limit: int):
+    """Первые limit слов с наступившим due_at и время следующего повторения после них.
+
+    Время следующего повторения запрашивается, только если очередь короче limit.
+    """
+    result = await session.execute(
+        select(WordReview, Word.eng, Word.rus, Word.transcript)
+        .join(Word, Word.id == WordReview.word_id)
+        .where(WordReview.telegram_id == telegram_id, WordReview.due_at <= now)
+        .order_by(WordReview.due_at)
+        .limit(limit)
+    )
+    due = result.all()
+    if len(due) == limit:
+        return due, None  # очередь не исчерпана — следующее повторение уже наступило
+
+    next_due_at = (await session.execute(
+        select(func.min(WordReview.due_at))
+        .where(WordReview.telegram_id == telegram_id, WordReview.due_at > now)
+    )).scalar_one_or_none()
+    return due, next_due_at
+
+
+async def grade_reviews(session: AsyncSession, telegram_id: int, grades: Sequence[Tuple[int, int]],
+                        now: Optional[datetime] = None) -> Tuple[List[dict], List[int]]:
+    """Применяет оценки (word_id, grade) пачкой; возвращает новые состояния и id слов без записи.
+
+    Если слово оценено в запросе несколько раз, учитывается последняя оценка.
+    """
+    now = now or datetime.utcnow()
+    latest = dict(grades)
+    result = await session.execute(
+        select(WordReview)
+        .where(WordReview.telegram_id == telegram_id, WordReview.word_id.in_(sorted(latest)))
+        .order_by(WordReview.word_id)
+        .with_for_update()
+    )
+    reviews = list(result.scalars())
+
+    updates = []
+    for review in reviews:
+        grade = latest[review.word_id]
+        repetitions, interval_days, ease = sm2(review.repetitions, review.interval_days, review.ease, grade)
+        updates.append({
+            "telegram_id": telegram_id,
+            "word_id": review.word_id,
+            "repetitions": repetitions,
+            "interval_days": interval_days,
+            "ease": ease,
+            "lapses": review.lapses + (1 if grade < PASSING_GRADE else 0),
+            "due_at": now + timedelta(days=interval_days),
+            "last_reviewed_at": now,
+        })
+    if updates:
+        await session.execute(update(WordReview), updates)
+
+    found = {review.word_id for review in reviews}
+    return updates, [word_id for word_id in latest if word_id not in found]
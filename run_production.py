@@ -0,0 +1,210 @@
+#!/usr/bin/env python3
+"""
+Продакшн-запуск API: несколько процессов uvicorn с предзагрузкой приложения.
+
+Мастер один раз импортирует ma.py (код разделяется воркерами через
+copy-on-write), открывает сокет и делает fork нужного числа воркеров.
+Соединения с БД до fork не создаются — движок в database.py ленивый,
+поэтому каждый воркер открывает свой пул.
+
+- Размер пула воркера считается из общего бюджета соединений
+  (DB_CONNECTION_BUDGET минус резерв для бота и миграций).
+- SIGTERM/SIGINT: воркеры перестают принимать соединения и дорабатывают
+  текущие запросы (--graceful-timeout), затем мастер завершается.
+- Воркер перезапускается после --max-requests запросов (со случайным
+  разбросом, чтобы воркеры не перезапускались одновременно) и при падении.
+- Кэши процессов (индекс id слов, каталог упражнений) сверяются с версией
+  каталога в БД или живут ограниченный TTL, поэтому остаются корректными
+  при любом числе воркеров; метрики собираются через общий METRICS_DIR.
+
+Запуск:
+    APP_ENV=production python run_production.py --workers 4 --db-budget 60
+"""
+import argparse
+import os
+import random
+import shutil
+import signal
+import socket
+import sys
+import tempfile
+import time
+
+from env import load_env
+from metrics import archive_process_file
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Продакшн-запуск Language Learning API")
+    parser.add_argument("--host", default=os.getenv("HOST", "0.0.0.0"))
+    parser.add_argument("--port", type=int, default=int(os.getenv("PORT", "8000")))
+    parser.add_argument("--workers", type=int, default=int(os.getenv("WEB_CONCURRENCY", os.cpu_count() or 1)))
+    parser.add_argument("--db-budget", type=int, default=int(os.getenv("DB_CONNECTION_BUDGET", "40")),
+                        help="сколько соединений с БД может открыть API суммарно")
+    parser.add_argument("--db-reserve", type=int, default=int(os.getenv("DB_CONNECTION_RESERVE", "5")),
+                        help="соединения, оставляемые боту и миграциям")
+    parser.add_argument("--max-requests", type=int, default=int(os.getenv("MAX_REQUESTS", "10000")),
+                        help="перезапуск воркера после N запросов (0 — не перезапускать)")
+    parser.add_argument("--max-requests-jitter", type=int, default=int(os.getenv("MAX_REQUESTS_JITTER", "1000")))
+    parser.add_argument("--graceful-timeout", type=int, default=int(os.getenv("GRACEFUL_TIMEOUT", "30")))
+    parser.add_argument("--log-level", default="info")
+    return parser.parse_args()
+
+
+def pool_sizes(budget: int, reserve: int, workers: int):
+    """Делит бюджет соединений между воркерами: 3/4 — постоянный пул, остальное — overflow.
+
+    Возвращает (воркеры, пул, overflow). Если бюджета не хватает на одно
+    соединение каждому воркеру, воркеров становится меньше; сумма по всем
+    воркерам никогда не превышает budget - reserve.
+    """
+    if workers < 1:
+        raise ValueError(f"число воркеров должно быть положительным, а не {workers}")
+    available = budget - reserve
+    if available < 1:
+        raise ValueError(f"бюджет соединений {budget} не покрывает резерв {reserve}")
+    workers = min(workers, available)
+    per_worker = available // workers
+    pool_size = max(1, per_worker * 3 // 4)
+    return workers, pool_size, per_worker - pool_size
+
+
+def bind_socket(host: str, port: int) -> socket.socket:
+    sock = socket.socket(socket.AF_INET6 if ":" in host else socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(2048)
+    sock.set_inheritable(True)
+    return sock
+
+
+class Master:
+    def __init__(self, args, sock, app):
+        self.args = args
+        self.sock = sock
+        self.app = app
+        self.workers = {}  # pid -> время запуска
+        self.stopping = False
+
+    def spawn(self):
+        pid = os.fork()
+        if pid == 0:
+            self.run_worker()
+            os._exit(0)
+        self.workers[pid] = time.monotonic()
+
+    def run_worker(self):
+        import uvicorn
+
+        # Воркер обрабатывает сигналы сам (uvicorn делает graceful shutdown)
+        for sig in (signal.SIGTERM, signal.SIGINT, signal.SIGALRM):
+            signal.signal(sig, signal.SIG_DFL)
+
+        max_requests = None
+        if self.args.max_requests:
+            max_requests = self.args.max_requests + random.randint(0, self.args.max_requests_jitter)
+
+        config = uvicorn.Config(
+            self.app,
+            log_level=self.args.log_level,
+            limit_max_requests=max_requests,
+            timeout_graceful_shutdown=self.args.graceful_timeout,
+        )
+        uvicorn.Server(config).run(sockets=[self.sock])
+
+    def handle_stop(self, signum, frame):
+        if self.stopping:
+            return
+        self.stopping = True
+        print(f"⏹️  Получен сигнал {signal.Signals(signum).name}, завершаем воркеры...")
+        for pid in list(self.workers):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+        # Воркеры, не успевшие завершиться, будут убиты
+        signal.alarm(self.args.graceful_timeout + 5)
+
+    def handle_alarm(self, signum, frame):
+        for pid in list(self.workers):
+            try:
+                os.kill(pid, signal.SIGKILL)
+            except ProcessLookupError:
+                pass
+
+    def run(self):
+        signal.signal(signal.SIGTERM, self.handle_stop)
+        signal.signal(signal.SIGINT, self.handle_stop)
+        signal.signal(signal.SIGALRM, self.handle_alarm)
+
+        for _ in range(self.args.workers):
+            self.spawn()
+
+        while self.workers:
+            try:
+                pid, status = os.waitpid(-1, 0)
+            except ChildProcessError:
+                break
+
+            started = self.workers.pop(pid, None)
+            if started is None:
+                continue
+            # Воркер, завершившийся штатно, уже перенёс свои метрики в архив сам;
+            # за упавшим (или убитым по таймауту) это делает мастер
+            archive_process_file(pid)
+            if self.stopping:
+                continue
+
+            # Перезапуск после max_requests или падения; при падении сразу после старта — с паузой
+            if os.waitstatus_to_exitcode(status) != 0 and time.monotonic() - started < 1:
+                time.sleep(1)
+            self.spawn()
+
+
+def main():
+    load_env()  # .env до чтения настроек: значения по умолчанию аргументов и METRICS_DIR ниже
+    args = parse_args()
+    os.environ.setdefault("APP_ENV", "production")
+
+    # Бюджет соединений делится между воркерами до импорта приложения
+    try:
+        workers, pool_size, max_overflow = pool_sizes(args.db_budget, args.db_reserve, args.workers)
+    except ValueError as e:
+        sys.exit(f"❌ Не удаётся разделить соединения БД: {e}")
+    if workers < args.workers:
+        print(f"⚠️  Бюджета {args.db_budget} - {args.db_reserve} не хватает на {args.workers} воркеров, "
+              f"запускаем {workers}")
+        args.workers = workers
+    if max_overflow == 0:
+        print(f"⚠️  Пул воркера без overflow: при {pool_size} занятых соединениях запросы ждут в очереди пула")
+    print(f"🔌 Соединения БД: {workers} воркеров × ({pool_size} пул + {max_overflow} overflow) = "
+          f"{workers * (pool_size + max_overflow)} из {args.db_budget - args.db_reserve} "
+          f"(бюджет {args.db_budget}, резерв {args.db_reserve})")
+    os.environ["DB_POOL_SIZE"] = str(pool_size)
+    os.environ["DB_MAX_OVERFLOW"] = str(max_overflow)
+    os.environ["WEB_CONCURRENCY"] = str(args.workers)  # лимиты admission.py делятся между воркерами
+
+    # Общий каталог метрик для всех воркеров
+    metrics_dir = os.environ.setdefault(
+        "METRICS_DIR", os.path.join(tempfile.gettempdir(), f"vloya-metrics-{os.getpid()}")
+    )
+    shutil.rmtree(metrics_dir, ignore_errors=True)
+
+    # Предзагрузка приложения в мастере
+    import database
+    import ma
+
+    if database._engine is not None or database._replica_engine is not None:
+        sys.exit("❌ Движок БД создан до fork — соединения нельзя делить между процессами")
+
+    sock = bind_socket(args.host, args.port)
+    print(f"🚀 {args.workers} воркеров на {args.host}:{args.port}, "
+          f"пул БД на воркер: {pool_size} + {max_overflow} overflow (бюджет {args.db_budget})")
+
+    Master(args, sock, ma.app).run()
+    sock.close()
+    print("👋 Сервер остановлен")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,129 @@
+"""
+Запуск процессов API и бота.
+
+В режиме разработки (APP_ENV != production) схема создаётся через create_all,
+как раньше. В production схема не трогается: проверяется только, что ревизия
+Alembic в базе совпадает с head, а пул соединений и горячие кэши прогреваются
+параллельно до приёма трафика. Время каждой фазы печатается и попадает в
+метрику app_startup_phase_seconds.
+
+APP_ENV и DB_POOL_WARM читаются при запуске, после загрузки .env, а не при
+импорте модуля — иначе APP_ENV=production из .env не действовал бы.
+"""
+import asyncio
+import os
+import time
+from typing import Awaitable, Callable, Dict, Iterable
+
+from sqlalchemy import text
+
+from database import get_engine, get_replica_engine, get_sessionmaker
+from env import load_env
+from metrics import registry, Gauge, register_engine
+from models import Base
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+
+startup_phase_seconds = registry.register(Gauge(
+    "app_startup_phase_seconds", "Длительность фаз запуска", ("process", "phase")))
+
+
+class SchemaRevisionMismatch(RuntimeError):
+    pass
+
+
+def app_env() -> str:
+    load_env()
+    return os.getenv("APP_ENV", "development")
+
+
+def expected_alembic_heads() -> set:
+    from alembic.config import Config
+    from alembic.script import ScriptDirectory
+
+    config = Config(os.path.join(ROOT, "alembic.ini"))
+    return set(ScriptDirectory.from_config(config).get_heads())
+
+
+async def check_alembic_revision():
+    """Проверяет, что миграции применены; схему не меняет"""
+    from alembic.runtime.migration import MigrationContext
+
+    async with get_engine().connect() as conn:
+        current = await conn.run_sync(lambda sync_conn: set(MigrationContext.configure(sync_conn).get_current_heads()))
+
+    expected = expected_alembic_heads()
+    if current != expected:
+        raise SchemaRevisionMismatch(
+            f"Ревизия базы {sorted(current) or 'пусто'} не совпадает с head {sorted(expected)}. "
+            f"Выполните: alembic upgrade head"
+        )
+
+
+async def create_schema():
+    async with get_engine().begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+
+
+async def warm_pool(connections: int):
+    """Открывает соединения пула заранее, чтобы первые запросы не ждали подключения"""
+    engine = get_engine()
+    size = getattr(engine.sync_engine.pool, "size", lambda: 1)()
+    count = connections or size
+
+    opened = await asyncio.gather(*(engine.connect() for _ in range(count)))
+    try:
+        await asyncio.gather(*(conn.execute(text("SELECT 1")) for conn in opened))
+    finally:
+        await asyncio.gather(*(conn.close() for conn in opened))
+
+
+def cache_warmer(cache_get: Callable) -> Callable[[], Awaitable]:
+    """Обёртка: прогрев кэша в собственной сессии"""
+    async def warm():
+        async with get_sessionmaker()() as session:
+            await cache_get(session)
+    return warm
+
+
+async def _timed(timings: Dict[str, float], phase: str, coro: Awaitable):
+    started = time.perf_counter()
+    try:
+        return await coro
+    finally:
+        timings[phase] = time.perf_counter() - started
+
+
+async def startup(process: str, warmers: Iterable[tuple] = ()) -> Dict[str, float]:
+    """Готовит процесс к приёму трафика и возвращает длительность фаз в секундах.
+
+    warmers — пары (название, функция без аргументов), выполняются параллельно
+    с прогревом пула.
+    """
+    timings: Dict[str, float] = {}
+    started = time.perf_counter()
+    env = app_env()
+
+    engine_started = time.perf_counter()
+    register_engine(get_engine(), process)
+    if get_replica_engine() is not None:
+        register_engine(get_replica_engine(), f"{process}_replica")
+    timings["engine"] = time.perf_counter() - engine_started
+
+    if env == "production":
+        await _timed(timings, "alembic_check", check_alembic_revision())
+    else:
+        await _timed(timings, "create_all", create_schema())
+
+    await asyncio.gather(
+        _timed(timings, "pool_warm", warm_pool(int(os.getenv("DB_POOL_WARM", "0")))),
+        *(_timed(timings, f"cache_{name}", warmer()) for name, warmer in warmers),
+    )
+
+    timings["total"] = time.perf_counter() - started
+    for phase, seconds in timings.items():
+        startup_phase_seconds.set(process, phase, value=seconds)
+
+    breakdown = ", ".join(f"{phase} {seconds * 1000:.0f} ms" for phase, seconds in timings.items())
+    print(f"⏱  Запуск {process} ({env}): {breakdown}")
+    return timings
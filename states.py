@@ -2,3 +2,7 @@ from aiogram.fsm.state import State, StatesGroup
 
 class TimeZoneSetup(StatesGroup):
     waiting_for_local_time = State()
+
+
+class TaskSetup(StatesGroup):
+    waiting_for_task_text = State()
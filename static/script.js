@@ -186,12 +186,14 @@ async function loadUserData() {
     }
 }
 
-// Сохранение данных пользователя
+// Сохранение настроек пользователя (списки слов меняются отдельными операциями)
 async function saveUserData() {
     if (!userData || !telegramUser) return;
 
     try {
-        await apiRequest(`/users/${telegramUser.id}`, 'PUT', userData);
+        await apiRequest(`/users/${telegramUser.id}`, 'PUT', {
+            words_per_day: userData.words_per_day
+        });
         console.log('✅ Данные пользователя сохранены в БД');
     } catch (error) {
         console.error('❌ Ошибка сохранения в БД:', error);
@@ -0,0 +1,302 @@
+#!/usr/bin/env python3
+"""
+Экспорт и восстановление пользователей (users вместе с eng_learned_words и
+eng_skipped_words) в сжатый NDJSON.
+
+Экспорт читает таблицу keyset-страницами по telegram_id (каждая — отдельный
+короткий запрос с серверным курсором) и пишет строки сразу в gzip, поэтому
+память не зависит от числа пользователей. Выгрузка делится на части
+<path>.part0001, <path>.part0002, ... по --part-rows строк. Часть пишется во
+временный файл и переименовывается, только когда дописана. Первая строка
+части — заголовок (колонки и telegram_id, после которого она начинается),
+последняя — число строк, последний telegram_id и признак последней части.
+
+Прерванный экспорт продолжается с --resume: готовые части остаются, выгрузка
+идёт с последнего telegram_id последней готовой части.
+
+Восстановление читает части по порядку и проверяет, что они идут подряд и
+набор полный; строки вставляются пачками (multi-row INSERT ... ON CONFLICT)
+по транзакции на пачку. Существующие пользователи обновляются
+(--on-conflict update) или остаются как есть (skip); version при обновлении
+увеличивается, чтобы ETag профиля не совпал со старым. Восстановление
+идемпотентно: после ошибки его можно просто запустить повторно.
+
+Примеры:
+    python users_backup.py export users.ndjson.gz
+    python users_backup.py export users.ndjson.gz --resume  # продолжить прерванный экспорт
+    python users_backup.py restore users.ndjson.gz --on-conflict skip
+"""
+import argparse
+import asyncio
+import glob
+import gzip
+import json
+import os
+import time
+from datetime import date, datetime
+from typing import Iterator, List, Optional, Tuple
+
+from sqlalchemy import select, Date, DateTime
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+from database import get_engine, dispose_engine
+from models import User
+
+FORMAT_VERSION = 1
+CHUNK_SIZE = 10000  # строк в keyset-странице экспорта
+PARTITION_SIZE = 1000  # строк, забираемых из курсора за раз
+BATCH_SIZE = 5000  # строк в транзакции восстановления
+PART_ROWS = 1000000  # строк в части выгрузки (округляется вверх до страниц)
+
+users_table = User.__table__
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Экспорт и восстановление пользователей")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    export = commands.add_parser("export", help="выгрузить users в части <path>.partNNNN")
+    export.add_argument("path")
+    export.add_argument("--resume", action="store_true", help="продолжить прерванный экспорт в те же части")
+    export.add_argument("--chunk-size", type=int, default=CHUNK_SIZE)
+    export.add_argument("--part-rows", type=int, default=PART_ROWS)
+    export.add_argument("--compress-level", type=int, default=6)
+
+    restore = commands.add_parser("restore", help="загрузить users из частей <path>.partNNNN")
+    restore.add_argument("path")
+    restore.add_argument("--on-conflict", choices=("update", "skip"), default="update")
+    restore.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    return parser.parse_args()
+
+
+def encode_value(value):
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    raise TypeError(f"Не удаётся сериализовать {type(value).__name__}")
+
+
+def decoder_for(column):
+    if isinstance(column.type, DateTime):
+        return datetime.fromisoformat
+    if isinstance(column.type, Date):
+        return date.fromisoformat
+    return None
+
+
+def report(action: str, rows: int, started: float, last_id=None):
+    elapsed = time.perf_counter() - started
+    suffix = f", последний telegram_id {last_id}" if last_id is not None else ""
+    print(f"  {action}: {rows} строк, {rows / max(elapsed, 1e-9):.0f} строк/с{suffix}")
+
+
+def part_path(path: str, number: int) -> str:
+    return f"{path}.part{number:04d}"
+
+
+def list_parts(path: str) -> List[str]:
+    return sorted(glob.glob(glob.escape(path) + ".part[0-9][0-9][0-9][0-9]"))
+
+
+def read_trailer(part: str) -> dict:
+    """Итоговая строка готовой части (часть небольшая относительно всей выгрузки — читается потоково)"""
+    trailer = None
+    with gzip.open(part, "rt", encoding="utf-8") as source:
+        for line in source:
+            trailer = line
+    record = json.loads(trailer) if trailer else {}
+    if "_end" not in record:
+        raise ValueError(f"{part}: нет итоговой строки")
+    return record["_end"]
+
+
+def resume_point(path: str, resume: bool) -> Tuple[int, Optional[int]]:
+    """Номер следующей части и telegram_id, после которого продолжать"""
+    parts = list_parts(path)
+    if not parts:
+        return 1, None
+    if not resume:
+        raise SystemExit(f"Части {path}.part* уже есть: продолжите с --resume или удалите их")
+
+    trailer = read_trailer(parts[-1])
+    if trailer.get("complete"):
+        raise SystemExit(f"Экспорт {path} уже завершён")
+    return len(parts) + 1, trailer["last_id"]
+
+
+async def export_part(conn, path: str, number: int, after: Optional[int], part_rows: int, chunk_size: int,
+                      compress_level: int) -> Tuple[int, Optional[int], bool]:
+    """Пишет одну часть; возвращает (строк, последний telegram_id, последняя ли часть)"""
+    columns = list(users_table.columns)
+    target = part_path(path, number)
+    tmp_path = target + ".tmp"
+    rows, last_id, complete = 0, after, False
+
+    with gzip.open(tmp_path, "wt", encoding="utf-8", compresslevel=compress_level) as output:
+        header = {"table": "users", "format": FORMAT_VERSION, "columns": [column.name for column in columns],
+                  "part": number, "after": after, "exported_at": datetime.utcnow().isoformat()}
+        output.write(json.dumps({"_meta": header}) + "\n")
+
+        while rows < part_rows:
+            query = select(*columns).order_by(users_table.c.telegram_id).limit(chunk_size)
+            if last_id is not None:
+                query = query.where(users_table.c.telegram_id > last_id)
+
+            # Каждая страница — короткая транзакция, а не один снимок на весь экспорт
+            chunk_rows = 0
+            result = await conn.stream(query)
+            async for partition in result.partitions(PARTITION_SIZE):
+                for row in partition:
+                    output.write(json.dumps(dict(row._mapping), default=encode_value,
+                                            ensure_ascii=False, separators=(",", ":")) + "\n")
+                chunk_rows += len(partition)
+                last_id = partition[-1].telegram_id
+            await conn.rollback()
+
+            rows += chunk_rows
+            if chunk_rows < chunk_size:
+                complete = True
+                break
+
+        output.write(json.dumps({"_end": {"rows": rows, "last_id": last_id, "complete": complete}}) + "\n")
+
+    os.replace(tmp_path, target)
+    return rows, last_id, complete
+
+
+async def export_users(path: str, resume: bool = False, chunk_size: int = CHUNK_SIZE,
+                       part_rows: int = PART_ROWS, compress_level: int = 6) -> int:
+    """Выгружает users частями; возвращает число строк, выгруженных этим запуском"""
+    number, last_id = resume_point(path, resume)
+    for stale in glob.glob(glob.escape(path) + ".part*.tmp"):
+        os.unlink(stale)  # недописанная часть прерванного запуска
+
+    started = time.perf_counter()
+    total = 0
+    async with get_engine().connect() as conn:
+        while True:
+            rows, last_id, complete = await export_part(
+                conn, path, number, last_id, part_rows, chunk_size, compress_level
+            )
+            total += rows
+            report(f"часть {number}", total, started, last_id)
+            if complete:
+                return total
+            number += 1
+
+
+def read_part(part: str, after: Optional[int]) -> Iterator[dict]:
+    """Строки одной части; первая — заголовок, ошибка, если часть обрезана или не по порядку"""
+    with gzip.open(part, "rt", encoding="utf-8") as source:
+        first = source.readline()
+        meta = json.loads(first).get("_meta") if first else None
+        if not meta or meta.get("table") != "users":
+            raise ValueError(f"{part}: не бэкап пользователей")
+        if meta.get("format") != FORMAT_VERSION:
+            raise ValueError(f"{part}: неподдерживаемый формат {meta.get('format')}")
+        if meta.get("after") != after:
+            raise ValueError(f"{part}: начинается после {meta.get('after')}, а предыдущая часть кончается на {after}")
+        yield meta
+
+        rows = 0
+        for line in source:
+            record = json.loads(line)
+            if "_end" in record:
+                if record["_end"]["rows"] != rows:
+                    raise ValueError(f"{part}: ожидалось {record['_end']['rows']} строк, прочитано {rows}")
+                yield record
+                return
+            rows += 1
+            yield record
+    raise ValueError(f"{part}: файл обрезан, прочитано {rows} строк")
+
+
+def read_backup(path: str) -> Iterator[dict]:
+    """Заголовок первой части, затем строки всех частей по порядку"""
+    parts = list_parts(path)
+    if not parts:
+        raise ValueError(f"{path}: нет частей {path}.part*")
+    if not read_trailer(parts[-1]).get("complete"):
+        raise ValueError(f"{path}: экспорт не завершён, продолжите его с --resume")
+
+    after, columns = None, None
+    for part in parts:
+        records = read_part(part, after)
+        meta = next(records)
+        if columns is None:
+            columns = meta["columns"]
+            yield meta
+        elif meta["columns"] != columns:
+            raise ValueError(f"{part}: колонки отличаются от первой части (схема менялась между запусками)")
+        for record in records:
+            if "_end" in record:
+                after = record["_end"]["last_id"]
+            else:
+                yield record
+
+
+def upsert_statement(dialect_name: str, column_names: List[str], on_conflict: str):
+    insert = sqlite_insert if dialect_name == "sqlite" else pg_insert
+    statement = insert(users_table)
+    if on_conflict == "skip":
+        return statement.on_conflict_do_nothing(index_elements=[users_table.c.telegram_id])
+
+    updated = {name: statement.excluded[name] for name in column_names if name not in ("telegram_id", "version")}
+    updated["version"] = users_table.c.version + 1
+    return statement.on_conflict_do_update(index_elements=[users_table.c.telegram_id], set_=updated)
+
+
+async def restore_users(path: str, on_conflict: str = "update", batch_size: int = BATCH_SIZE) -> int:
+    records = read_backup(path)
+    meta = next(records)
+
+    known = {column.name: column for column in users_table.columns}
+    column_names = [name for name in meta["columns"] if name in known]
+    unknown = [name for name in meta["columns"] if name not in known]
+    if unknown:
+        print(f"⚠️  Колонки, которых нет в схеме, пропущены: {', '.join(unknown)}")
+    decoders = {name: decoder for name in column_names if (decoder := decoder_for(known[name]))}
+
+    engine = get_engine()
+    statement = upsert_statement(engine.dialect.name, column_names, on_conflict)
+    started = time.perf_counter()
+    total = 0
+
+    async def flush(batch):
+        async with engine.begin() as conn:
+            await conn.execute(statement, batch)
+
+    batch = []
+    for record in records:
+        row = {name: record.get(name) for name in column_names}
+        for name, decoder in decoders.items():
+            if row[name] is not None:
+                row[name] = decoder(row[name])
+        batch.append(row)
+        if len(batch) >= batch_size:
+            await flush(batch)
+            total += len(batch)
+            batch = []
+            report("восстановление", total, started)
+    if batch:
+        await flush(batch)
+        total += len(batch)
+    return total
+
+
+async def main():
+    args = parse_args()
+    started = time.perf_counter()
+    try:
+        if args.command == "export":
+            total = await export_users(args.path, args.resume, args.chunk_size, args.part_rows, args.compress_level)
+            print(f"💾 Выгружено {total} пользователей в {args.path} за {time.perf_counter() - started:.1f} с")
+        else:
+            total = await restore_users(args.path, args.on_conflict, args.batch_size)
+            print(f"✅ Восстановлено {total} пользователей из {args.path} за {time.perf_counter() - started:.1f} с")
+    finally:
+        await dispose_engine()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
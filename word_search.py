@@ -0,0 +1,156 @@
+"""
+Поиск по каталогу слов (eng и rus): префикс и нечёткое совпадение.
+
+Postgres: триграммные GIN-индексы pg_trgm (LIKE 'q%' и оператор %), ранжирование
+в SQL. SQLite и тесты: индекс в памяти процесса — отсортированные тексты для
+префикса (bisect) и триграммы для опечаток, как в pg_trgm. Порядок выдачи в
+обоих случаях: точное совпадение, префикс, похожесть по триграммам, id.
+"""
+import asyncio
+import bisect
+import time
+from array import array
+from collections import Counter, defaultdict
+from typing import Dict, List, Optional, Set, Tuple
+
+from sqlalchemy import select, func, or_, literal
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from models import Word
+from models.eng_words import current_catalog_version_query
+
+FIELDS = ("eng", "rus")
+MIN_SIMILARITY = 0.3  # порог pg_trgm.similarity_threshold по умолчанию
+RAREST_TRIGRAMS = 4  # кандидаты берутся из самых редких триграмм запроса
+MAX_POSTING_SCAN = 2000  # элементов из каждого списка
+MAX_CANDIDATES = 100  # лучших по числу общих триграмм — для точной оценки
+
+
+def normalize(value: Optional[str]) -> str:
+    return " ".join((value or "").lower().split())
+
+
+def trigrams(value: str) -> Set[str]:
+    """Триграммы как в pg_trgm: слова дополняются двумя пробелами слева и одним справа"""
+    result = set()
+    for word in value.split():
+        padded = f"  {word} "
+        result.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return result
+
+
+def similarity(left: Set[str], right: Set[str]) -> float:
+    if not left or not right:
+        return 0.0
+    common = len(left & right)
+    return common / (len(left) + len(right) - common)
+
+
+def escape_like(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+def pg_search_query(base_query, q: str, limit: int):
+    """Ранжированный поиск для Postgres; условия WHERE используют триграммные индексы"""
+    pattern = escape_like(q) + "%"
+    eng, rus = func.lower(Word.eng), func.lower(Word.rus)
+    exact = or_(eng == q, rus == q)
+    prefix = or_(eng.like(pattern, escape="\\"), rus.like(pattern, escape="\\"))
+    score = func.greatest(func.similarity(eng, q), func.similarity(rus, q))
+    return (
+        base_query
+        .where(or_(prefix, eng.op("%")(literal(q)), rus.op("%")(literal(q))))
+        .order_by(exact.desc(), prefix.desc(), score.desc(), Word.id)
+        .limit(limit)
+    )
+
+
+class WordSearchIndex:
+    """Индекс в памяти для SQLite: пересобирается при смене версии каталога"""
+
+    def __init__(self, check_interval: float = 30.0):
+        self.check_interval = check_interval
+        self.version: Optional[int] = None
+        self.texts: Dict[int, Tuple[str, str]] = {}
+        self.sorted_keys: Dict[str, List[str]] = {field: [] for field in FIELDS}
+        self.sorted_ids: Dict[str, array] = {field: array("i") for field in FIELDS}
+        self.postings: Dict[str, array] = {}
+        self._checked_at = 0.0
+        self._lock = asyncio.Lock()
+
+    @staticmethod
+    def _build(rows):
+        texts = {word_id: (normalize(eng), normalize(rus)) for word_id, eng, rus in rows}
+
+        sorted_keys, sorted_ids = {}, {}
+        for position, field in enumerate(FIELDS):
+            pairs = sorted((value[position], word_id) for word_id, value in texts.items())
+            sorted_keys[field] = [key for key, _ in pairs]
+            sorted_ids[field] = array("i", (word_id for _, word_id in pairs))
+
+        postings = defaultdict(lambda: array("i"))
+        for word_id, (eng, rus) in texts.items():
+            for trigram in trigrams(eng) | trigrams(rus):
+                postings[trigram].append(word_id)
+        return texts, sorted_keys, sorted_ids, dict(postings)
+
+    async def get(self, session: AsyncSession) -> "WordSearchIndex":
+        now = time.monotonic()
+        if self.version is not None and now - self._checked_at < self.check_interval:
+            return self
+
+        async with self._lock:
+            if self.version is not None and time.monotonic() - self._checked_at < self.check_interval:
+                return self
+            version = (await session.execute(current_catalog_version_query())).scalar_one_or_none() or 0
+            if version != self.version:
+                rows = [tuple(row) for row in await session.execute(select(Word.id, Word.eng, Word.rus))]
+                built = await asyncio.to_thread(self._build, rows)
+                self.texts, self.sorted_keys, self.sorted_ids, self.postings = built
+                self.version = version
+            self._checked_at = time.monotonic()
+        return self
+
+    def _prefix_matches(self, q: str, limit: int) -> List[int]:
+        found = []
+        for field in FIELDS:
+            keys, ids = self.sorted_keys[field], self.sorted_ids[field]
+            position = bisect.bisect_left(keys, q)
+            while position < len(keys) and len(found) < limit * 2 and keys[position].startswith(q):
+                found.append(ids[position])
+                position += 1
+        return found
+
+    def _fuzzy_candidates(self, query_trigrams: Set[str]) -> Set[int]:
+        """Слова с наибольшим числом общих триграмм среди самых редких триграмм запроса"""
+        lists = sorted((self.postings[t] for t in query_trigrams if t in self.postings), key=len)
+        counts = Counter()
+        for posting in lists[:RAREST_TRIGRAMS]:
+            counts.update(posting[:MAX_POSTING_SCAN])
+        return {word_id for word_id, _ in counts.most_common(MAX_CANDIDATES)}
+
+    def search(self, q: str, limit: int = 20) -> List[int]:
+        """id слов, отсортированные по качеству совпадения"""
+        q = normalize(q)
+        if not q:
+            return []
+
+        query_trigrams = trigrams(q)
+        candidates = set(self._prefix_matches(q, limit))
+        if len(candidates) < limit:
+            candidates |= self._fuzzy_candidates(query_trigrams)
+
+        ranked = []
+        for word_id in candidates:
+            eng, rus = self.texts[word_id]
+            exact = q == eng or q == rus
+            prefix = eng.startswith(q) or rus.startswith(q)
+            score = max(similarity(query_trigrams, trigrams(eng)), similarity(query_trigrams, trigrams(rus)))
+            if exact or prefix or score >= MIN_SIMILARITY:
+                ranked.append((not exact, not prefix, -score, word_id))
+
+        ranked.sort()
+        return [word_id for *_, word_id in ranked[:limit]]
+
+
+word_search_index = WordSearchIndex()
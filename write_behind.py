@@ -0,0 +1,409 @@
+"""
+Write-behind для learn-words: прогресс копится в памяти и пишется пачками.
+
+Включается LEARN_WRITE_BEHIND=1 (настройки LEARN_* читаются при старте, в
+том числе из .env). Каждая отправка сначала дописывается в
+локальный журнал (fsync общий для одновременных запросов), затем сливается с
+отложенной дельтой пользователя: объединение id слов, дни занятий и счётчики
+тренировок. Ответ отдаётся сразу, без транзакции на строку users.
+
+Раз в LEARN_FLUSH_INTERVAL секунд или при LEARN_FLUSH_MAX_USERS пользователях
+в буфере дельты записываются одной транзакцией: SELECT ... FOR UPDATE всех
+пользователей пачки (в порядке telegram_id — без взаимных блокировок), один
+UPDATE по первичному ключу на всю пачку, multi-row INSERT в learning_events и
+upsert в user_daily_stats. Опыт и новые слова пересчитываются при записи по
+актуальной строке, поэтому повторная запись той же дельты слов не удваивает.
+
+Журнал — сегменты LEARN_JOURNAL_DIR/learn-<pid>-<n>.journal под flock.
+Сегмент удаляется только после commit дельт из него; при старте процесс
+дописывает в базу сегменты, которые никем не заблокированы (владелец упал).
+Если база при этом недоступна, старт не прерывается: сегмент остаётся, и
+попытка повторяется вместе с фоновой записью пачек.
+Если процесс упал между commit и удалением сегмента, при восстановлении
+счётчик тренировок за день может увеличиться повторно — слова и опыт нет.
+
+Ответ learn-words учитывает и буфер, и пачку, которая пишется прямо сейчас
+(inflight): она остаётся видимой до commit и при ошибке возвращается в буфер.
+Чтения пользователя с отложенной дельтой (get_read_db в ma.py) ждут записи
+его пачки: фоновая запись будится сразу, не дожидаясь интервала. Если база не
+принимает пачку дольше интервала, чтение отдаёт то, что уже записано. Другие
+воркеры видят отправку после записи пачки (не позже интервала).
+"""
+import asyncio
+import fcntl
+import glob
+import json
+import logging
+import os
+import tempfile
+import time
+from collections import Counter as Tally
+from datetime import date
+from typing import Dict, List, Optional
+
+from sqlalchemy import select, update
+
+from database import get_sessionmaker
+from env import getenv
+from learning_stats import EXP_PER_WORD, advance_streak, learning_event_rows, upsert_daily_stats
+from reviews import schedule_reviews
+from metrics import registry, Counter, Gauge
+from models import User, LearningEvent
+
+logger = logging.getLogger("write_behind")
+
+DEFAULT_JOURNAL_DIR = os.path.join(tempfile.gettempdir(), "vloya-learn-journal")
+MAX_BUFFERED_FACTOR = 100  # буфер больше max_users * 100 — 503, пока база не примет накопленное
+
+submissions_total = registry.register(Counter(
+    "learn_write_behind_submissions_total", "Отправки learn-words, принятые в буфер"))
+flushes_total = registry.register(Counter(
+    "learn_write_behind_flushes_total", "Записи пачек из буфера", ("result",)))
+flushed_users_total = registry.register(Counter(
+    "learn_write_behind_flushed_users_total", "Пользователи, записанные пачками"))
+pending_users = registry.register(Gauge(
+    "learn_write_behind_pending_users", "Пользователи с отложенным прогрессом"))
+
+
+class BufferFull(Exception):
+    pass
+
+
+class PendingProgress:
+    """Слитые отправки одного пользователя"""
+    __slots__ = ("words", "days", "trainings")
+
+    def __init__(self):
+        self.words: Dict[int, date] = {}  # id слова -> локальная дата первой отправки
+        self.days = set()  # даты занятий по серверу (для streak)
+        self.trainings: Tally = Tally()  # локальная дата -> число тренировок
+
+    def add(self, word_ids, day: date, local_day: date):
+        for word_id in word_ids:
+            self.words.setdefault(word_id, local_day)
+        self.days.add(day)
+        self.trainings[local_day] += 1
+
+    def merge(self, other: "PendingProgress"):
+        for word_id, local_day in other.words.items():
+            if self.words.get(word_id, local_day) >= local_day:
+                self.words[word_id] = local_day
+        self.days |= other.days
+        self.trainings.update(other.trainings)
+
+
+class Journal:
+    """Сегменты журнала: append + общий fsync, ротация при каждой записи пачки"""
+
+    def __init__(self, directory: Optional[str]):
+        self.directory = directory
+        self.sequence = 0
+        self.file = None
+        self.written = 0
+        self.synced = 0
+        self._sync_lock = asyncio.Lock()
+
+    def _segment_path(self) -> str:
+        self.sequence += 1
+        return os.path.join(self.directory, f"learn-{os.getpid()}-{self.sequence}.journal")
+
+    def open(self):
+        os.makedirs(self.directory, exist_ok=True)
+        self.file = open(self._segment_path(), "ab")
+        fcntl.flock(self.file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+
+    def append(self, record: dict) -> int:
+        self.file.write(json.dumps(record, separators=(",", ":")).encode() + b"\n")
+        self.written += 1
+        return self.written
+
+    async def sync(self, upto: int):
+        """Ждёт, пока запись upto окажется на диске; одновременные запросы делят один fsync"""
+        async with self._sync_lock:
+            if self.synced >= upto:
+                return
+            target, file = self.written, self.file
+            file.flush()
+            await asyncio.to_thread(os.fsync, file.fileno())
+            self.synced = max(self.synced, target)
+
+    def rotate(self):
+        """Закрывает текущий сегмент для записи и открывает новый; синхронно, без await"""
+        segment = self.file
+        segment.flush()
+        os.fsync(segment.fileno())
+        self.synced = self.written
+        self.open()
+        return segment
+
+    async def remove(self, segment):
+        async with self._sync_lock:
+            os.unlink(segment.name)
+            segment.close()
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+
+def read_segment(path: str) -> List[dict]:
+    records = []
+    with open(path, "rb") as source:
+        for line in source:
+            try:
+                records.append(json.loads(line))
+            except ValueError:
+                logger.warning("Оборванная запись в %s пропущена", path)
+    return records
+
+
+async def write_batch(batch: Dict[int, PendingProgress], exp_per_word: int = EXP_PER_WORD):
+    """Записывает дельты пачки одной транзакцией"""
+    if not batch:
+        return
+    async with get_sessionmaker()() as session:
+        rows = await session.execute(
+            select(User.telegram_id, User.eng_learned_words, User.exp, User.last_learning_date,
+                   User.current_streak, User.version)
+            .where(User.telegram_id.in_(sorted(batch)))
+            .order_by(User.telegram_id)
+            .with_for_update()
+        )
+
+        user_updates, events, daily = [], [], {}
+        for telegram_id, learned, exp, last_date, streak, version in rows:
+            delta = batch[telegram_id]
+            current = set(learned or [])
+            added = sorted(word_id for word_id in delta.words if word_id not in current)
+
+            for day in sorted(delta.days):
+                if last_date is None or day >= last_date:
+                    last_date, streak = advance_streak(last_date, streak, day)
+
+            user_updates.append({
+                "telegram_id": telegram_id,
+                "eng_learned_words": list(current | set(delta.words)),
+                "exp": (exp or 0) + len(added) * exp_per_word,
+                "last_learning_date": last_date,
+                "current_streak": streak,
+                "version": version + 1,
+            })
+
+            for local_day, trainings in delta.trainings.items():
+                daily[(telegram_id, local_day)] = {
+                    "telegram_id": telegram_id, "local_date": local_day,
+                    "words_learned": 0, "exp_gained": 0, "trainings": trainings,
+                }
+            for word_id in added:
+                local_day = delta.words[word_id]
+                events.extend(learning_event_rows(telegram_id, [word_id], exp_per_word, local_day))
+                stats = daily.setdefault((telegram_id, local_day), {
+                    "telegram_id": telegram_id, "local_date": local_day,
+                    "words_learned": 0, "exp_gained": 0, "trainings": 0,
+                })
+                stats["words_learned"] += 1
+                stats["exp_gained"] += exp_per_word
+
+        if user_updates:
+            await session.execute(update(User), user_updates)
+        if events:
+            await session.execute(LearningEvent.__table__.insert(), events)
+        if daily:
+            await upsert_daily_stats(session, list(daily.values()))
+        if events:
+            await schedule_reviews(session, ((event["telegram_id"], event["word_id"]) for event in events))
+        await session.commit()
+        flushed_users_total.inc(amount=len(user_updates))
+
+
+class LearnWriteBehind:
+    def __init__(self, enabled: Optional[bool] = None, interval: Optional[float] = None,
+                 max_users: Optional[int] = None, journal_dir: Optional[str] = None):
+        """Параметры, не заданные явно, берутся из окружения в configure()"""
+        self.enabled = enabled
+        self.interval = interval
+        self.max_users = max_users
+        self.max_buffered_users = 0
+        self.journal = Journal(journal_dir)
+        self.pending: Dict[int, PendingProgress] = {}
+        self.inflight: Dict[int, PendingProgress] = {}  # пачка, которая пишется сейчас
+        self.segments = []  # сегменты журнала, дельты из которых ещё не записаны
+        self.unrecovered = 0  # сегменты упавших процессов, которые не удалось записать при старте
+        self._wakeup: Optional[asyncio.Event] = None
+        self._flushed: Optional[asyncio.Event] = None  # заменяется новым после каждой попытки записи
+        self._task: Optional[asyncio.Task] = None
+
+    def configure(self):
+        """Настройки из окружения и .env: при старте, а не при импорте модуля"""
+        if self.enabled is None:
+            self.enabled = getenv("LEARN_WRITE_BEHIND", "0") == "1"
+        if self.interval is None:
+            self.interval = float(getenv("LEARN_FLUSH_INTERVAL", "1.0"))
+        if self.max_users is None:
+            self.max_users = int(getenv("LEARN_FLUSH_MAX_USERS", "500"))
+        if self.journal.directory is None:
+            self.journal.directory = getenv("LEARN_JOURNAL_DIR", DEFAULT_JOURNAL_DIR)
+        self.max_buffered_users = self.max_users * MAX_BUFFERED_FACTOR
+
+    async def start(self):
+        self.configure()
+        if not self.enabled:
+            return
+        self.unrecovered = await self.recover()
+        self.journal.open()
+        self._wakeup = asyncio.Event()
+        self._flushed = asyncio.Event()
+        self._task = asyncio.create_task(self._run())
+
+    async def recover(self) -> int:
+        """Дописывает в базу сегменты упавших процессов; возвращает число сегментов, оставленных на потом"""
+        failed = 0
+        for path in sorted(glob.glob(os.path.join(self.journal.directory, "learn-*.journal"))):
+            try:
+                segment = open(path, "rb")
+            except FileNotFoundError:
+                continue
+            try:
+                fcntl.flock(segment, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                segment.close()  # сегмент живого процесса
+                continue
+            try:
+                # Другой процесс мог успеть дописать и удалить сегмент между open и flock:
+                # тогда блокировка взята на уже удалённый файл
+                try:
+                    if os.stat(path).st_ino != os.fstat(segment.fileno()).st_ino:
+                        continue
+                except FileNotFoundError:
+                    continue
+
+                batch: Dict[int, PendingProgress] = {}
+                records = read_segment(path)
+                for record in records:
+                    batch.setdefault(record["t"], PendingProgress()).add(
+                        record["w"], date.fromisoformat(record["d"]), date.fromisoformat(record["l"]))
+                try:
+                    await write_batch(batch)
+                except Exception:
+                    failed += 1
+                    logger.exception("Журнал %s не записан, он останется до следующей попытки", path)
+                    continue
+                os.unlink(path)
+                logger.info("Журнал %s восстановлен: %d отправок", path, len(records))
+            finally:
+                segment.close()
+        return failed
+
+    def submit(self, telegram_id: int, word_ids: List[int], day: date, local_day: date) -> int:
+        """Принимает отправку в буфер; возвращает номер записи журнала для sync()"""
+        if len(self.pending) >= self.max_buffered_users and telegram_id not in self.pending:
+            raise BufferFull()
+        # Журнал и буфер меняются без await между ними: запись попадает в тот же
+        # сегмент, что и дельта, которую она описывает
+        position = self.journal.append({"t": telegram_id, "w": word_ids, "d": day.isoformat(), "l": local_day.isoformat()})
+        self.pending.setdefault(telegram_id, PendingProgress()).add(word_ids, day, local_day)
+        submissions_total.inc()
+        pending_users.set(value=len(self.pending))
+        if len(self.pending) >= self.max_users:
+            self._wakeup.set()
+        return position
+
+    async def sync(self, position: int):
+        await self.journal.sync(position)
+
+    def pending_for(self, telegram_id: int) -> Optional[PendingProgress]:
+        """Незаписанная дельта пользователя: пачка в записи плюс буфер"""
+        inflight, pending = self.inflight.get(telegram_id), self.pending.get(telegram_id)
+        if inflight is None or pending is None:
+            return inflight or pending
+        merged = PendingProgress()
+        merged.merge(inflight)
+        merged.merge(pending)
+        return merged
+
+    def has_pending(self, telegram_id: int) -> bool:
+        return telegram_id in self.pending or telegram_id in self.inflight
+
+    async def wait_written(self, telegram_id: int) -> bool:
+        """Ждёт записи дельты пользователя, не дольше интервала; False — дельта ещё в буфере"""
+        if not self.has_pending(telegram_id):
+            return True
+        try:
+            await asyncio.wait_for(self._wait_written(telegram_id), self.interval)
+        except asyncio.TimeoutError:
+            return False
+        return True
+
+    async def _wait_written(self, telegram_id: int):
+        while self.has_pending(telegram_id):
+            flushed = self._flushed
+            self._wakeup.set()
+            await flushed.wait()
+
+    async def flush(self):
+        if not self.pending:
+            return
+        batch, segments = self.pending, self.segments + [self.journal.rotate()]
+        self.pending, self.segments, self.inflight = {}, [], batch
+        pending_users.set(value=0)
+        try:
+            await write_batch(batch)
+        except Exception:
+            # Дельты возвращаются в буфер, сегменты остаются до следующей попытки
+            for telegram_id, delta in batch.items():
+                self.pending.setdefault(telegram_id, PendingProgress()).merge(delta)
+            self.segments = segments + self.segments
+            pending_users.set(value=len(self.pending))
+            flushes_total.inc("error")
+            raise
+        finally:
+            self.inflight = {}
+            if self._flushed is not None:
+                self._flushed.set()
+                self._flushed = asyncio.Event()
+        flushes_total.inc("ok")
+        for segment in segments:
+            await self.journal.remove(segment)
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self.interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            started = time.perf_counter()
+            try:
+                await self.flush()
+            except Exception:
+                logger.exception("Не удалось записать прогресс из буфера")
+            else:
+                logger.debug("Пачка записана за %.3f с", time.perf_counter() - started)
+            if self.unrecovered:
+                # Свои сегменты журнала держим под flock, поэтому recover() их не тронет
+                self.unrecovered = await self.recover()
+
+    async def stop(self):
+        """Останавливает фоновую запись и записывает остаток; при ошибке остаток ждёт в журнале"""
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+        try:
+            await self.flush()
+        except Exception:
+            logger.exception("Остаток буфера не записан, он будет восстановлен из журнала")
+        for segment in self.segments:
+            segment.close()
+        self.segments = []
+        if self.journal.file is not None and not self.pending:
+            os.unlink(self.journal.file.name)
+        self.journal.close()
+
+
+learn_buffer = LearnWriteBehind()